@@ -57,10 +57,6 @@ async def add_multiple_movies(movie_names: list):
                 print(f"✅ {movie.title} اضافه شد")
             else:
                 print(f"❌ خطا در اضافه کردن {movie_name}")
-            
-            # تاخیر کوتاه برای رعایت rate limit API
-            if i < len(movie_names):
-                await asyncio.sleep(0.5)
         
         print(f"\n{'='*60}")
         print("✅ تمام شد!")
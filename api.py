@@ -0,0 +1,380 @@
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import sys
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+from sqlalchemy import select, tuple_
+
+from database import db_manager
+from models import Movie, movie_loader
+from movie_search import search_local
+from recommender import RecommendationService
+from shared_cache import MovieCache, create_cache, movie_card
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 1000
+
+# Pages larger than this are streamed from a server-side cursor instead of
+# being built in memory (streamed responses carry no ETag)
+STREAM_THRESHOLD = 200
+STREAM_CHUNK_SIZE = 100
+
+# Smaller bodies are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+
+# Listing orders; each is paired with Movie.id for a unique keyset
+SORT_COLUMNS = {
+    "popularity": Movie.popularity,
+    "release_date": Movie.release_date,
+}
+
+CACHE_KEY = web.AppKey("cache", MovieCache)
+RECOMMENDER_KEY = web.AppKey("recommender", Optional[RecommendationService])
+
+
+def _dumps(payload: Any) -> bytes:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+
+def _error(error: type, message: str) -> web.HTTPException:
+    return error(text=_dumps({"error": message}).decode(), content_type="application/json")
+
+
+def json_response(request: web.Request, payload: Any) -> web.Response:
+    """
+    JSON response with a weak ETag of the body; a matching If-None-Match
+    gets 304 Not Modified. Bodies over COMPRESS_MIN_BYTES are compressed
+    when the client accepts it.
+    """
+    body = _dumps(payload)
+    etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    
+    if_none_match = request.headers.get("If-None-Match", "")
+    if if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(",")):
+        return web.Response(status=304, headers=headers)
+    
+    response = web.Response(body=body, content_type="application/json", headers=headers)
+    if len(body) >= COMPRESS_MIN_BYTES:
+        response.enable_compression()
+    return response
+
+
+def encode_cursor(sort: str, value: Any, movie_id: int) -> str:
+    """Opaque cursor of the last row of a page"""
+    if isinstance(value, date):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, movie_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """(sort value, movie id) of a cursor made by encode_cursor for the same sort"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, movie_id = json.loads(raw)
+        if cursor_sort != sort:
+            raise ValueError(f"cursor of sort '{cursor_sort}'")
+        if sort == "release_date":
+            value = date.fromisoformat(value)
+        elif isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"'{sort}' value must be a number")
+        if isinstance(movie_id, bool) or not isinstance(movie_id, int):
+            raise ValueError("movie id must be an integer")
+        return value, movie_id
+    except (ValueError, TypeError) as e:
+        raise _error(web.HTTPBadRequest, f"Invalid cursor: {e}")
+
+
+def _int_param(request: web.Request, name: str, default: Optional[int], low: int = 1, high: Optional[int] = None) -> Optional[int]:
+    value = request.query.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise _error(web.HTTPBadRequest, f"'{name}' must be an integer")
+    if value < low or (high is not None and value > high):
+        raise _error(web.HTTPBadRequest, f"'{name}' must be between {low} and {high}")
+    return value
+
+
+def _date_param(request: web.Request, name: str) -> Optional[date]:
+    value = request.query.get(name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise _error(web.HTTPBadRequest, f"'{name}' must be a YYYY-MM-DD date")
+
+
+def movie_detail(movie: Movie) -> Dict[str, Any]:
+    """Serializable movie page of a movie loaded with movie_loader("detail")"""
+    return {
+        **movie_card(movie),
+        "original_title": movie.original_title,
+        "original_language": movie.original_language,
+        "overview": movie.overview,
+        "tagline": movie.tagline,
+        "release_date": movie.release_date.isoformat() if movie.release_date else None,
+        "runtime": movie.runtime,
+        "budget": movie.budget,
+        "revenue": movie.revenue,
+        "vote_count": movie.vote_count,
+        "popularity": movie.popularity,
+        "status": movie.status,
+        "imdb_id": movie.imdb_id,
+        "homepage": movie.homepage,
+        "backdrop_path": movie.backdrop_path,
+        "collection": movie.collection.name if movie.collection else None,
+        "keywords": [keyword.name for keyword in movie.keywords],
+        "production_companies": [company.name for company in movie.production_companies],
+        "production_countries": [country.iso_code for country in movie.production_countries],
+        "spoken_languages": [language.iso_code for language in movie.spoken_languages],
+        "cast": [person.name for person in movie.cast],
+        "crew": [person.name for person in movie.crew],
+        "videos": [
+            {"site": video.site, "key": video.key, "type": video.type, "name": video.name}
+            for video in movie.videos
+        ],
+    }
+
+
+async def list_movies(request: web.Request) -> web.StreamResponse:
+    """
+    GET /movies?sort=popularity|release_date&order=desc|asc&limit=N&cursor=C&q=title
+    
+    Keyset pagination: the next page continues after the (sort value, id)
+    of the previous page's last row, which the composite indexes on
+    movies serve directly at any depth. Movies without a value for the
+    sort column are not listed.
+    """
+    sort = request.query.get("sort", "popularity")
+    if sort not in SORT_COLUMNS:
+        raise _error(web.HTTPBadRequest, f"'sort' must be one of {sorted(SORT_COLUMNS)}")
+    order = request.query.get("order", "desc")
+    if order not in ("asc", "desc"):
+        raise _error(web.HTTPBadRequest, "'order' must be 'asc' or 'desc'")
+    limit = _int_param(request, "limit", DEFAULT_PAGE_SIZE, high=MAX_PAGE_SIZE)
+    
+    column = SORT_COLUMNS[sort]
+    stmt = select(Movie).options(*movie_loader("card")).where(column.is_not(None))
+    if query := request.query.get("q", "").strip():
+        stmt = stmt.where(Movie.title.icontains(query, autoescape=True))
+    if cursor := request.query.get("cursor"):
+        value, movie_id = decode_cursor(cursor, sort)
+        position = tuple_(column, Movie.id)
+        stmt = stmt.where(position < tuple_(value, movie_id) if order == "desc" else position > tuple_(value, movie_id))
+    if order == "desc":
+        stmt = stmt.order_by(column.desc(), Movie.id.desc())
+    else:
+        stmt = stmt.order_by(column, Movie.id)
+    # One row past the page tells whether there is a next page
+    stmt = stmt.limit(limit + 1)
+    
+    if limit > STREAM_THRESHOLD:
+        return await _stream_movies(request, stmt, sort, limit)
+    
+    async with db_manager.get_session() as session:
+        movies = (await session.execute(stmt)).scalars().all()
+    page = movies[:limit]
+    next_cursor = None
+    if len(movies) > limit:
+        next_cursor = encode_cursor(sort, getattr(page[-1], sort), page[-1].id)
+    return json_response(request, {"results": [movie_card(movie) for movie in page], "next_cursor": next_cursor})
+
+
+async def _stream_movies(request: web.Request, stmt, sort: str, limit: int) -> web.StreamResponse:
+    """Write a listing page as it is read, STREAM_CHUNK_SIZE rows at a time"""
+    response = web.StreamResponse(headers={"Content-Type": "application/json", "Vary": "Accept-Encoding"})
+    response.enable_compression()
+    await response.prepare(request)
+    await response.write(b'{"results":[')
+    
+    written = 0
+    last = None
+    next_cursor = None
+    async with db_manager.get_session() as session:
+        result = await session.stream_scalars(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE))
+        async for chunk in result.partitions():
+            cards = []
+            for movie in chunk:
+                if written == limit:
+                    next_cursor = encode_cursor(sort, getattr(last, sort), last.id)
+                    break
+                cards.append(_dumps(movie_card(movie)))
+                written += 1
+                last = movie
+            if cards:
+                await response.write((b"," if written > len(cards) else b"") + b",".join(cards))
+    
+    await response.write(b'],"next_cursor":' + _dumps(next_cursor) + b"}")
+    await response.write_eof()
+    return response
+
+
+async def get_movie(request: web.Request) -> web.Response:
+    """GET /movies/{movie_id}"""
+    movie_id = int(request.match_info["movie_id"])
+    
+    async def load() -> Dict[str, Any]:
+        async with db_manager.get_session() as session:
+            movie = await session.get(Movie, movie_id, options=movie_loader("detail"))
+            if movie is not None:
+                return movie_detail(movie)
+        # Raised inside the loader so the miss is not cached: the movie may be imported later
+        raise _error(web.HTTPNotFound, f"Movie {movie_id} not found")
+    
+    return json_response(request, await request.app[CACHE_KEY].detail(movie_id, load))
+
+
+async def search_movies(request: web.Request) -> web.Response:
+    """
+    GET /search?q=text&year=YYYY&limit=N
+    
+    Accent-insensitive, typo-tolerant search of titles, original titles
+    and overviews of the warehouse's movies (see movie_search.py).
+    """
+    query = request.query.get("q", "").strip()
+    if not query:
+        raise _error(web.HTTPBadRequest, "'q' is required")
+    year = _int_param(request, "year", None, low=1870, high=2100)
+    limit = _int_param(request, "limit", DEFAULT_PAGE_SIZE, high=100)
+    hits = await search_local(query, year, limit)
+    items = [(hit.movie_id, hit.similarity) for hit in hits]
+    return json_response(request, {"query": query, "results": await _scored_cards(request, items)})
+
+
+def _recommender(request: web.Request, need_neighbors: bool = False) -> RecommendationService:
+    recommender = request.app[RECOMMENDER_KEY]
+    if recommender is None or (need_neighbors and recommender.neighbors is None):
+        raise _error(web.HTTPServiceUnavailable, "Recommender artifacts are not loaded")
+    return recommender
+
+
+async def _scored_cards(request: web.Request, items: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+    """Cards of (movie_id, score) items, in order, with their scores"""
+    cards = await request.app[CACHE_KEY].cards(movie_id for movie_id, _ in items)
+    return [
+        {**cards[movie_id], "score": round(score, 4)}
+        for movie_id, score in items if movie_id in cards
+    ]
+
+
+async def similar_movies(request: web.Request) -> web.Response:
+    """GET /movies/{movie_id}/similar?k=N"""
+    neighbors = _recommender(request, need_neighbors=True).neighbors
+    movie_id = int(request.match_info["movie_id"])
+    k = _int_param(request, "k", 20, high=neighbors.k)
+    items = neighbors.lookup(movie_id, k)
+    return json_response(request, {"movie_id": movie_id, "results": await _scored_cards(request, items)})
+
+
+async def user_recommendations(request: web.Request) -> web.Response:
+    """
+    GET /users/{user_id}/recommendations?k=N&providers=8,9&country=US
+        &released_after=YYYY-MM-DD&released_before=YYYY-MM-DD
+    
+    Results are cached per user and parameters until the user's ratings
+    change (see MovieCache).
+    """
+    recommender = _recommender(request)
+    user_id = int(request.match_info["user_id"])
+    providers = request.query.get("providers")
+    try:
+        provider_ids = [int(value) for value in providers.split(",")] if providers else None
+    except ValueError:
+        raise _error(web.HTTPBadRequest, "'providers' must be comma-separated integers")
+    params = {
+        "k": _int_param(request, "k", 20, high=MAX_PAGE_SIZE),
+        "provider_ids": provider_ids,
+        "country_code": request.query.get("country", "US").upper(),
+        "released_after": _date_param(request, "released_after"),
+        "released_before": _date_param(request, "released_before"),
+    }
+    
+    async def compute() -> List[Tuple[int, float]]:
+        # Vectorized numpy work; keep it off the event loop
+        result = await asyncio.to_thread(recommender.recommend, user_id=user_id, **params)
+        return result.items()
+    
+    items = await request.app[CACHE_KEY].recommendations(user_id, params, compute)
+    return json_response(request, {"user_id": user_id, "results": await _scored_cards(request, items)})
+
+
+async def _load_recommender(app: web.Application):
+    try:
+        app[RECOMMENDER_KEY] = await asyncio.to_thread(RecommendationService.load)
+        print("✅ Recommender artifacts loaded")
+    except FileNotFoundError as e:
+        app[RECOMMENDER_KEY] = None
+        print(f"⚠️  Recommender artifacts not found, recommendation endpoints disabled: {e}")
+
+
+async def _close(app: web.Application):
+    await app[CACHE_KEY].cache.close()
+    await db_manager.close()
+
+
+def create_app(
+    cache: Optional[MovieCache] = None,
+    recommender: Optional[RecommendationService] = None,
+) -> web.Application:
+    """
+    Read-only HTTP API over the warehouse.
+    
+    Requests share the `db_manager` pool (POOL_SIZE / MAX_OVERFLOW from
+    Settings). Movie cards and recommendation lists go through the shared
+    cache; with CACHE_BACKEND=redis several API processes (and the
+    importers that invalidate it) share one cache. Without `recommender`
+    the artifacts are memory-mapped from the configured directories at
+    startup.
+    """
+    app = web.Application()
+    app[CACHE_KEY] = cache or MovieCache(create_cache())
+    if recommender is not None:
+        app[RECOMMENDER_KEY] = recommender
+    else:
+        app.on_startup.append(_load_recommender)
+    app.on_cleanup.append(_close)
+    
+    app.router.add_get("/movies", list_movies)
+    app.router.add_get("/search", search_movies)
+    app.router.add_get(r"/movies/{movie_id:\d+}", get_movie)
+    app.router.add_get(r"/movies/{movie_id:\d+}/similar", similar_movies)
+    app.router.add_get(r"/users/{user_id:\d+}/recommendations", user_recommendations)
+    return app
+
+
+def main():
+    """
+    python3 api.py [--host HOST] [--port PORT]
+    
+    The socket is opened with SO_REUSEPORT, so several processes can be
+    started on the same port to use more cores (each has its own pool).
+    """
+    args = sys.argv[1:]
+    options = {"--host": "0.0.0.0", "--port": "8080"}
+    for option in options:
+        if option in args:
+            index = args.index(option)
+            options[option] = args[index + 1]
+            del args[index:index + 2]
+    
+    web.run_app(
+        create_app(),
+        host=options["--host"],
+        port=int(options["--port"]),
+        reuse_port=True,
+        access_log=None,
+    )
+
+
+if __name__ == "__main__":
+    main()
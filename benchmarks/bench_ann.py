@@ -0,0 +1,85 @@
+"""
+AnnIndex recall@10 and latency vs exact search on synthetic catalogs.
+    
+    python -m benchmarks.bench_ann                       # 100k, 500k
+    python -m benchmarks.bench_ann --sizes 50000 --nprobe 16 64 --rerank 100
+
+Movies get Zipf-distributed metadata tokens (see bench_neighbors) and are
+embedded with recommender.ann.embed. Ground truth is a brute-force dot
+product over all vectors with the same filters applied.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.bench_neighbors import synthetic_features
+from recommender.ann import AnnIndex, embed
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int, mask: np.ndarray, exclude: int) -> np.ndarray:
+    scores = vectors @ query
+    scores[~mask] = -np.inf
+    scores[exclude] = -np.inf
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.isfinite(scores[top])]
+
+
+def bench(n_movies: int, nprobes: list, queries: int, k: int, rerank: int) -> None:
+    features = synthetic_features(n_movies)
+    vectors = embed(features)
+    
+    start = time.perf_counter()
+    index = AnnIndex.build(features.movie_ids, vectors)
+    build_seconds = time.perf_counter() - start
+    
+    # Synthetic filter attribute: release years spread over a century
+    rng = np.random.default_rng(1)
+    years = rng.integers(1925, 2026, n_movies).astype(np.int16)
+    index.years = years[np.searchsorted(features.movie_ids, index.movie_ids)]
+    
+    print(f"{n_movies:>9,} movies  {len(index.centroids)} lists  build {build_seconds:6.1f}s")
+    sample = rng.choice(n_movies, queries, replace=False)
+    for filtered in (False, True):
+        mask = years >= 2000 if filtered else np.ones(n_movies, dtype=bool)
+        truth = [exact_top_k(vectors, vectors[row], k, mask, row) for row in sample]
+        
+        start = time.perf_counter()
+        for row in sample:
+            vectors @ vectors[row]
+        exact_ms = (time.perf_counter() - start) * 1000 / queries
+        
+        for nprobe in nprobes:
+            hits, total, elapsed = 0, 0, 0.0
+            for row, expected in zip(sample, truth):
+                start = time.perf_counter()
+                found = index.search(
+                    vectors[row], k, nprobe=nprobe, rerank=rerank, adult=None,
+                    years=(2000, 9999) if filtered else None,
+                    exclude_movie_ids=[features.movie_ids[row]],
+                )
+                elapsed += time.perf_counter() - start
+                hits += len(np.intersect1d([movie_id for movie_id, _ in found], features.movie_ids[expected]))
+                total += len(expected)
+            print(
+                f"    {'year>=2000' if filtered else 'no filter ':<10}  nprobe {nprobe:>3}  "
+                f"recall@{k} {hits / max(total, 1):.3f}  "
+                f"ann {elapsed * 1000 / queries:6.2f} ms  exact {exact_ms:6.2f} ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 500_000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=500)
+    args = parser.parse_args()
+    
+    for n_movies in args.sizes:
+        bench(n_movies, args.nprobe, args.queries, args.k, args.rerank)
+
+
+if __name__ == "__main__":
+    main()
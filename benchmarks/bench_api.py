@@ -0,0 +1,118 @@
+"""
+REST API throughput with concurrent clients against the configured database.
+    
+    DATABASE_URL=sqlite+aiosqlite:///bench.db python -m benchmarks.bench_api
+    python -m benchmarks.bench_api --movies 50000 --requests 20000 --concurrency 128
+
+Fills an empty database with synthetic movies, starts the app in-process
+and replays a request mix: listing pages followed by their cursors,
+movie detail pages and cached card lookups (similar movies from a
+synthetic neighbor index). Reports requests per second and latency
+percentiles per endpoint.
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List
+
+import numpy as np
+from aiohttp import ClientSession, TCPConnector
+from aiohttp.test_utils import TestServer
+from sqlalchemy import func, insert, select
+
+from api import create_app
+from database import db_manager
+from models import Movie
+from recommender import NeighborIndex
+
+
+class NeighborsOnly:
+    """Recommender stand-in serving only /similar"""
+    
+    def __init__(self, n_movies: int, k: int, rng: np.random.Generator):
+        self.neighbors = NeighborIndex(
+            np.arange(1, n_movies + 1, dtype=np.int64),
+            rng.integers(1, n_movies + 1, size=(n_movies, k)).astype(np.int64),
+            np.sort(rng.random((n_movies, k), dtype=np.float32), axis=1)[:, ::-1].copy(),
+        )
+
+
+async def fill(n_movies: int, rng: random.Random) -> None:
+    async with db_manager.get_session() as session:
+        if await session.scalar(select(func.count()).select_from(Movie)):
+            return
+        for start in range(1, n_movies + 1, 5000):
+            await session.execute(insert(Movie), [
+                {
+                    "tmdb_id": tmdb_id,
+                    "title": f"Film {tmdb_id}",
+                    "original_title": f"Film {tmdb_id}",
+                    "popularity": round(rng.paretovariate(1.2), 3),
+                    "release_date": date(1950, 1, 1) + timedelta(days=rng.randrange(27000)),
+                    "vote_average": round(rng.uniform(1, 10), 1),
+                }
+                for tmdb_id in range(start, min(start + 5000, n_movies + 1))
+            ])
+
+
+async def bench(args) -> None:
+    await db_manager.create_tables()
+    await fill(args.movies, random.Random(0))
+    
+    app = create_app(recommender=NeighborsOnly(args.movies, 20, np.random.default_rng(0)))
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    rng = random.Random(1)
+    
+    async with TestServer(app) as server:
+        async with ClientSession(connector=TCPConnector(limit=args.concurrency)) as client:
+            cursors: List[str] = []
+            
+            async def one() -> None:
+                roll = rng.random()
+                if roll < 0.4:
+                    endpoint, params = "list", {"limit": 20, "sort": rng.choice(["popularity", "release_date"])}
+                    if cursors and rng.random() < 0.5:
+                        params = {"limit": 20, "sort": "popularity", "cursor": rng.choice(cursors)}
+                    url = "/movies"
+                elif roll < 0.7:
+                    endpoint, params = "detail", {}
+                    url = f"/movies/{rng.randint(1, args.movies)}"
+                else:
+                    endpoint, params = "similar", {"k": 10}
+                    url = f"/movies/{rng.randint(1, min(args.movies, 1000))}/similar"
+                started = time.perf_counter()
+                async with client.get(server.make_url(url), params=params) as response:
+                    body = await response.json()
+                latencies[endpoint].append((time.perf_counter() - started) * 1000)
+                if endpoint == "list" and body.get("next_cursor") and params.get("sort") == "popularity" and len(cursors) < 1000:
+                    cursors.append(body["next_cursor"])
+            
+            queue = iter(range(args.requests))
+            
+            async def worker() -> None:
+                for _ in queue:
+                    await one()
+            
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+    
+    print(f"{args.requests} requests, {args.concurrency} concurrent: {args.requests / elapsed:,.0f} req/s")
+    for endpoint, values in sorted(latencies.items()):
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        print(f"  {endpoint:<8} n={len(values):<6} p50={p50:6.1f} ms  p95={p95:6.1f} ms  p99={p99:6.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    asyncio.run(bench(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
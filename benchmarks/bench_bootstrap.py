@@ -0,0 +1,110 @@
+"""
+CatalogBootstrap throughput offline, against a generated ID export and a stubbed TMDb.
+    
+    DATABASE_URL=sqlite+aiosqlite:///bench.db python -m benchmarks.bench_bootstrap
+    python -m benchmarks.bench_bootstrap --movies 20000 --workers 32 --latency 0.05
+
+Writes a gzipped export fixture (JSON Lines with Zipf popularity and a
+share of adult titles), serves movie details from an httpx.MockTransport
+with a fixed per-request latency (some ids answer 404), and runs the
+bootstrap into the configured database twice: the second run shows the
+resume path skipping everything already saved.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import re
+import tempfile
+from pathlib import Path
+
+import httpx
+
+from catalog_bootstrap import CatalogBootstrap
+from database import db_manager
+from rate_limiter import TokenBucket
+from tmdb_service import TMDbService
+
+
+def write_export(path: Path, n_movies: int, rng: random.Random) -> None:
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for tmdb_id in range(1, n_movies + 1):
+            f.write(json.dumps({
+                "adult": rng.random() < 0.05,
+                "id": tmdb_id,
+                "original_title": f"Film {tmdb_id}",
+                "popularity": round(rng.paretovariate(1.2) - 0.6, 3),
+                "video": False,
+            }) + "\n")
+
+
+def movie_payload(tmdb_id: int) -> dict:
+    return {
+        "id": tmdb_id,
+        "title": f"Film {tmdb_id}",
+        "original_title": f"Film {tmdb_id}",
+        "original_language": "en",
+        "release_date": f"{1950 + tmdb_id % 75}-01-01",
+        "overview": "Synthetic movie",
+        "popularity": 1.0,
+        "genres": [{"id": 1 + tmdb_id % 19, "name": f"Genre {1 + tmdb_id % 19}"}],
+        "keywords": {"keywords": [{"id": tmdb_id % 500, "name": f"keyword {tmdb_id % 500}"}]},
+        "credits": {
+            "cast": [{"id": tmdb_id % 5000 + i, "name": f"Person {tmdb_id % 5000 + i}", "order": i} for i in range(5)],
+            "crew": [],
+        },
+    }
+
+
+def mock_transport(latency: float, missing_every: int) -> httpx.MockTransport:
+    detail = re.compile(r"/3/movie/(\d+)$")
+    
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        match = detail.search(request.url.path)
+        if not match:
+            return httpx.Response(404, json={"status_code": 34})
+        tmdb_id = int(match.group(1))
+        if tmdb_id % missing_every == 0:
+            return httpx.Response(404, json={"status_code": 34})
+        return httpx.Response(200, json=movie_payload(tmdb_id))
+    
+    return httpx.MockTransport(handler)
+
+
+async def bench(args) -> None:
+    await db_manager.create_tables()
+    with tempfile.TemporaryDirectory() as directory:
+        export = Path(directory) / "movie_ids.json.gz"
+        write_export(export, args.movies, random.Random(0))
+        
+        for run in ("first run", "resumed run"):
+            service = TMDbService(
+                api_key="offline",
+                rate_limiter=TokenBucket(rate=1e6, capacity=10_000),
+                transport=mock_transport(args.latency, args.missing_every),
+            )
+            service.cache = None  # measure the request path, not TMDB_CACHE_DIR
+            bootstrap = CatalogBootstrap(service, workers=args.workers, batch_size=args.batch_size, progress_every=5)
+            try:
+                print(f"--- {run}")
+                await bootstrap.run(export, min_popularity=args.min_popularity)
+            finally:
+                await service.close()
+    await db_manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per mocked request")
+    parser.add_argument("--missing-every", type=int, default=50, help="every Nth id answers 404")
+    parser.add_argument("--min-popularity", type=float, default=0.0)
+    asyncio.run(bench(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
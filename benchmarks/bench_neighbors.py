@@ -0,0 +1,104 @@
+"""
+Neighbor index refresh vs full rebuild on synthetic catalogs.
+    
+    python -m benchmarks.bench_neighbors                 # 10k, 100k, 500k
+    python -m benchmarks.bench_neighbors --sizes 10000 --new 200 --full
+
+Full rebuilds above --full-limit movies are extrapolated from a sample of
+row blocks (rebuild cost is linear in the number of blocks), unless --full
+is given.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from recommender.features import FeatureMatrix, tfidf_matrix
+from recommender.neighbors import NeighborIndex, BLOCK_CELLS, top_k_rows
+
+
+def synthetic_features(n_movies: int, seed: int = 0) -> FeatureMatrix:
+    """Catalog with genre/keyword/cast/crew/company tokens and Zipf-like popularity"""
+    rng = np.random.default_rng(seed)
+    n_people = max(1000, n_movies // 2)
+    # (feature count, tokens per movie)
+    sources = ((19, 3), (20_000, 10), (n_people, 10), (n_people, 3), (5_000, 2))
+    
+    rows, cols, offset = [], [], 0
+    for n_tokens, per_movie in sources:
+        tokens = np.minimum(rng.zipf(1.3, size=(n_movies, per_movie)) - 1, n_tokens - 1)
+        rows.append(np.repeat(np.arange(n_movies), per_movie))
+        cols.append(tokens.ravel() + offset)
+        offset += n_tokens
+    
+    matrix, idf = tfidf_matrix(np.concatenate(rows), np.concatenate(cols), (n_movies, offset))
+    features = np.asarray([f"f:{i}" for i in range(offset)], dtype=str)
+    return FeatureMatrix(matrix, np.arange(1, n_movies + 1, dtype=np.int64), features, idf)
+
+
+def time_full_build(features: FeatureMatrix, k: int, sample_blocks: int = 0) -> tuple[float, bool]:
+    """Seconds for NeighborIndex.build, measured or extrapolated from sampled blocks"""
+    if not sample_blocks:
+        start = time.perf_counter()
+        NeighborIndex.build(features, k)
+        return time.perf_counter() - start, False
+    
+    n = features.shape[0]
+    block = max(1, BLOCK_CELLS // n)
+    n_blocks = -(-n // block)
+    transposed = features.matrix.T.tocsc()
+    
+    start = time.perf_counter()
+    for begin in np.linspace(0, n - block, sample_blocks).astype(int):
+        similarity = (features.matrix[begin:begin + block] @ transposed).toarray()
+        top_k_rows(similarity, k)
+    elapsed = time.perf_counter() - start
+    return elapsed * n_blocks / sample_blocks, True
+
+
+def bench(n_movies: int, n_new: int, k: int, full: bool, full_limit: int) -> None:
+    features = synthetic_features(n_movies + n_new)
+    old_ids = features.movie_ids[:n_movies]
+    new_ids = features.movie_ids[n_movies:]
+    
+    # Index over the old catalog, built on the old rows only
+    old_features = FeatureMatrix(features.matrix[:n_movies], old_ids, features.features, features.idf)
+    if full or n_movies <= full_limit:
+        index = NeighborIndex.build(old_features, k)
+    else:
+        index = NeighborIndex(
+            old_ids,
+            np.full((n_movies, k), -1, dtype=np.int64),
+            np.full((n_movies, k), -np.inf, dtype=np.float32),
+        )
+    
+    start = time.perf_counter()
+    index.refresh(features, new_ids.tolist())
+    refresh_seconds = time.perf_counter() - start
+    
+    rebuild_seconds, estimated = time_full_build(
+        features, k, sample_blocks=0 if full or n_movies <= full_limit else 5
+    )
+    print(
+        f"{n_movies:>9,} movies  +{n_new} new  "
+        f"refresh {refresh_seconds:8.2f}s  "
+        f"full rebuild {rebuild_seconds:9.2f}s{' (est.)' if estimated else '       '}  "
+        f"speedup x{rebuild_seconds / refresh_seconds:,.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    parser.add_argument("--new", type=int, default=100, help="movies added per refresh")
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--full", action="store_true", help="always run the full rebuild")
+    parser.add_argument("--full-limit", type=int, default=20_000)
+    args = parser.parse_args()
+    
+    for n_movies in args.sizes:
+        bench(n_movies, args.new, args.k, args.full, args.full_limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+RecommendationService latency on a synthetic catalog.
+    
+    python -m benchmarks.bench_recommend                   # 500k movies
+    python -m benchmarks.bench_recommend --movies 100000 --requests 5000
+
+Builds a catalog with Zipf popularity and provider offers, a random
+neighbor index and random ALS factors, then replays a mix of requests
+(with and without provider / release-date filters) and prints p50 / p99
+per stage.
+"""
+import argparse
+from datetime import date
+
+import numpy as np
+from scipy import sparse
+
+from recommender.als import ALSRecommender
+from recommender.catalog import Catalog, NO_DATE, _provider_index, country_key, to_days
+from recommender.neighbors import NeighborIndex
+from recommender.service import RecommendationService
+
+COUNTRIES = ("US", "GB", "DE", "FR", "IR")
+
+
+def synthetic_catalog(n_movies: int, n_providers: int, rng: np.random.Generator) -> Catalog:
+    movie_ids = np.arange(1, n_movies + 1, dtype=np.int64)
+    release_days = rng.integers(to_days(date(1920, 1, 1)), to_days(date(2026, 1, 1)), n_movies).astype(np.int32)
+    release_days[rng.random(n_movies) < 0.05] = NO_DATE
+    
+    # ~3 offers per movie, skewed towards popular providers
+    n_offers = n_movies * 3
+    rows = rng.integers(0, n_movies, n_offers)
+    providers = np.minimum(rng.zipf(1.5, n_offers), n_providers)
+    countries = rng.integers(0, len(COUNTRIES), n_offers)
+    country_bits = np.asarray([country_key(country, 0) for country in COUNTRIES], dtype=np.int64)
+    keys = country_bits[countries] | providers
+    offers = np.unique(np.stack([keys, rows]), axis=1)
+    provider_index = _provider_index(offers[1], offers[0], rng.integers(0, 5, offers.shape[1]))
+    
+    return Catalog(
+        movie_ids,
+        rng.pareto(1.5, n_movies).astype(np.float32),
+        rng.uniform(1, 10, n_movies).astype(np.float32),
+        np.minimum(rng.zipf(1.4, n_movies), 50_000).astype(np.int32),
+        release_days,
+        np.zeros(n_movies, dtype=bool),
+        np.zeros(n_movies, dtype=np.int16),
+        np.asarray(["en"]),
+        *provider_index,
+    )
+
+
+def synthetic_neighbors(movie_ids: np.ndarray, k: int, rng: np.random.Generator) -> NeighborIndex:
+    n = len(movie_ids)
+    neighbor_ids = movie_ids[rng.integers(0, n, (n, k))]
+    scores = -np.sort(-rng.random((n, k), dtype=np.float32), axis=1)
+    return NeighborIndex(movie_ids, neighbor_ids, scores)
+
+
+def synthetic_als(movie_ids: np.ndarray, n_users: int, factors: int, rng: np.random.Generator) -> ALSRecommender:
+    n = len(movie_ids)
+    per_user = 50
+    rows = np.repeat(np.arange(n_users), per_user)
+    cols = np.minimum(rng.zipf(1.2, n_users * per_user), n) - 1
+    rated = sparse.csr_matrix(
+        (rng.integers(1, 11, len(rows)).astype(np.float32), (rows, cols)), shape=(n_users, n)
+    )
+    rated.sum_duplicates()
+    return ALSRecommender(
+        rng.standard_normal((n_users, factors), dtype=np.float32),
+        rng.standard_normal((n, factors), dtype=np.float32),
+        np.arange(1, n_users + 1, dtype=np.int64),
+        movie_ids,
+        rated,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=500_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--providers", type=int, default=300)
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--k", type=int, default=50, help="neighbors per movie")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    catalog = synthetic_catalog(args.movies, args.providers, rng)
+    service = RecommendationService(
+        catalog,
+        synthetic_neighbors(catalog.movie_ids, args.k, rng),
+        synthetic_als(catalog.movie_ids, args.users, args.factors, rng),
+    )
+    
+    for i in range(args.requests):
+        kind = i % 4
+        service.recommend(
+            user_id=int(rng.integers(1, args.users + 1)),
+            k=20,
+            provider_ids=[1, 2, 8] if kind in (1, 3) else None,
+            country_code=COUNTRIES[i % len(COUNTRIES)],
+            released_after=date(2000, 1, 1) if kind in (2, 3) else None,
+        )
+    
+    print(f"{args.movies:,} movies, {args.users:,} users, {args.requests:,} requests (ms)")
+    for stage, stats in service.latency_report().items():
+        print(f"  {stage:<10} p50 {stats['p50']:6.2f}  p99 {stats['p99']:6.2f}  max {stats['max']:6.2f}")
+
+
+if __name__ == "__main__":
+    main()
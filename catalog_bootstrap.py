@@ -0,0 +1,296 @@
+import asyncio
+import gzip
+import json
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from database import db_manager
+from models import Movie
+from recommender import connect_neighbor_refresher
+from shared_cache import connect_movie_cache
+from tmdb_service import TMDbRequestError, TMDbService
+
+# Daily ID exports are published around 08:00 UTC and kept for three months
+EXPORT_URL = "https://files.tmdb.org/p/exports/movie_ids_{day:%m_%d_%Y}.json.gz"
+
+
+def iter_export(
+    path: str | Path,
+    min_popularity: float = 0.0,
+    include_adult: bool = False,
+) -> Iterator[Tuple[int, float]]:
+    """
+    Stream (tmdb_id, popularity) from a daily ID export.
+    
+    The export is gzipped JSON Lines, one
+    {"id", "original_title", "popularity", "adult", "video"} object per
+    movie. Lines that do not parse are skipped.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+                tmdb_id = int(item["id"])
+            except (ValueError, KeyError, TypeError):
+                continue
+            if item.get("adult") and not include_adult:
+                continue
+            popularity = float(item.get("popularity") or 0.0)
+            if popularity < min_popularity:
+                continue
+            yield tmdb_id, popularity
+
+
+async def download_export(service: TMDbService, destination: str | Path, day: Optional[date] = None) -> Path:
+    """Download the ID export of `day` (default: yesterday, which is always published)"""
+    day = day or date.today() - timedelta(days=1)
+    destination = Path(destination)
+    if destination.is_dir():
+        destination = destination / f"movie_ids_{day:%m_%d_%Y}.json.gz"
+    if destination.exists():
+        return destination
+    
+    partial = destination.with_name(destination.name + ".part")
+    async with service.client.stream("GET", EXPORT_URL.format(day=day)) as response:
+        response.raise_for_status()
+        with open(partial, "wb") as f:
+            async for chunk in response.aiter_bytes():
+                f.write(chunk)
+    partial.replace(destination)
+    return destination
+
+
+class CatalogBootstrap:
+    """
+    Populate the warehouse from a TMDb daily ID export.
+    
+    Ids passing the popularity / adult filters are fetched most popular
+    first by `workers` tasks (TMDb request rate is still enforced by the
+    service's shared rate limiter) and handed to a single writer that saves
+    them `batch_size` at a time with `TMDbService.save_movies`. Ids already
+    in the warehouse are skipped, so an interrupted bootstrap resumes
+    where it stopped by running it again.
+    """
+    
+    def __init__(
+        self,
+        service: Optional[TMDbService] = None,
+        workers: int = 16,
+        batch_size: int = 100,
+        progress_every: float = 10.0,
+    ):
+        self._owns_service = service is None
+        self.service = service or TMDbService()
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.progress_every = progress_every
+        
+        # Statistics
+        self.stats = {
+            "in_export": 0,  # ids passing the filters
+            "already_saved": 0,
+            "fetched": 0,
+            "saved": 0,
+            "missing": 0,  # in the export but no details on TMDb
+            "errors": 0,
+        }
+        self._pending = 0
+        self._started_at = 0.0
+        self._last_report = 0.0
+    
+    async def close(self):
+        """Close connections"""
+        if self._owns_service:
+            await self.service.close()
+    
+    async def saved_ids(self) -> Set[int]:
+        """TMDb ids already in the warehouse"""
+        async with db_manager.get_session() as session:
+            result = await session.stream_scalars(select(Movie.tmdb_id).execution_options(yield_per=10_000))
+            return {tmdb_id async for tmdb_id in result}
+    
+    async def pending_ids(self, path: str | Path, min_popularity: float, include_adult: bool, limit: Optional[int]) -> List[int]:
+        """Ids of the export still to fetch, most popular first"""
+        saved = await self.saved_ids()
+        candidates = []
+        for tmdb_id, popularity in iter_export(path, min_popularity, include_adult):
+            self.stats["in_export"] += 1
+            if tmdb_id in saved:
+                self.stats["already_saved"] += 1
+            else:
+                candidates.append((popularity, tmdb_id))
+        candidates.sort(reverse=True)
+        if limit is not None:
+            candidates = candidates[:limit]
+        return [tmdb_id for _, tmdb_id in candidates]
+    
+    def _report(self, force: bool = False):
+        """Print progress and throughput at most every `progress_every` seconds"""
+        now = time.monotonic()
+        if not force and now - self._last_report < self.progress_every:
+            return
+        self._last_report = now
+        elapsed = max(now - self._started_at, 1e-9)
+        done = self.stats["fetched"] + self.stats["missing"] + self.stats["errors"]
+        rate = done / elapsed
+        remaining = (self._pending - done) / rate if rate > 0 else float("inf")
+        print(
+            f"⏱️  {done:,}/{self._pending:,} "
+            f"({100 * done / max(self._pending, 1):.1f}%) | "
+            f"{rate:.1f} فیلم/ثانیه | ذخیره: {self.stats['saved']:,} | "
+            f"خطا: {self.stats['errors']:,} | باقی‌مانده: {remaining / 60:.1f} دقیقه"
+        )
+    
+    async def run(
+        self,
+        path: str | Path,
+        min_popularity: float = 0.0,
+        include_adult: bool = False,
+        limit: Optional[int] = None,
+    ):
+        """Fetch and save every pending id of the export"""
+        print(f"📂 خواندن فایل export: {path}")
+        tmdb_ids = await self.pending_ids(path, min_popularity, include_adult, limit)
+        self._pending = len(tmdb_ids)
+        print(
+            f"🎬 {self.stats['in_export']:,} فیلم در export، "
+            f"{self.stats['already_saved']:,} از قبل ذخیره شده، {self._pending:,} برای دریافت"
+        )
+        
+        self._started_at = self._last_report = time.monotonic()
+        id_queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        payload_queue: asyncio.Queue = asyncio.Queue(maxsize=self.batch_size * 2)
+        
+        async def produce():
+            for tmdb_id in tmdb_ids:
+                await id_queue.put(tmdb_id)
+            for _ in range(self.workers):
+                await id_queue.put(None)
+        
+        async def fetch_worker():
+            while (tmdb_id := await id_queue.get()) is not None:
+                try:
+                    # Each payload is read once: keep it out of the response cache
+                    movie_details = await self.service.get_movie_details(tmdb_id, fresh=True, store=False)
+                except TMDbRequestError as e:
+                    print(f"❌ {tmdb_id}: {e}")
+                    self.stats["errors"] += 1
+                    continue
+                if not movie_details:
+                    self.stats["missing"] += 1
+                    continue
+                self.stats["fetched"] += 1
+                await payload_queue.put(movie_details)
+                self._report()
+        
+        async def fetch_all():
+            await asyncio.gather(*(fetch_worker() for _ in range(self.workers)))
+            await payload_queue.put(None)
+        
+        async def writer():
+            batch: List[Dict] = []
+            while (movie_details := await payload_queue.get()) is not None:
+                batch.append(movie_details)
+                if len(batch) >= self.batch_size:
+                    await self._save(batch)
+                    batch = []
+            if batch:
+                await self._save(batch)
+        
+        await asyncio.gather(produce(), fetch_all(), writer())
+        self._report(force=True)
+        self.print_statistics()
+    
+    async def _save(self, batch: List[Dict]):
+        try:
+            results = await self.service.save_movies(batch)
+        except Exception as e:
+            print(f"❌ خطا در ذخیره {len(batch)} فیلم: {e}")
+            self.stats["errors"] += len(batch)
+            return
+        for result in results:
+            if result.error:
+                self.stats["errors"] += 1
+            elif result.created:
+                self.stats["saved"] += 1
+    
+    def print_statistics(self):
+        """Print bootstrap statistics"""
+        elapsed = time.monotonic() - self._started_at
+        print(f"\n{'='*70}")
+        print("📊 خلاصه بارگذاری کاتالوگ")
+        print(f"{'='*70}")
+        print(f"  📝 فیلم‌های export (پس از فیلتر): {self.stats['in_export']:,}")
+        print(f"  ⏭️  از قبل ذخیره شده:            {self.stats['already_saved']:,}")
+        print(f"  📥 دریافت شده:                  {self.stats['fetched']:,}")
+        print(f"  ✅ ذخیره شده:                   {self.stats['saved']:,}")
+        print(f"  🚫 بدون جزئیات در TMDb:          {self.stats['missing']:,}")
+        print(f"  ❌ خطاها:                       {self.stats['errors']:,}")
+        print(f"  ⏱️  زمان: {elapsed:.1f} ثانیه ({self.stats['fetched'] / max(elapsed, 1e-9):.1f} فیلم/ثانیه)")
+        print(f"{'='*70}\n")
+
+
+async def main():
+    """Main function"""
+    if len(sys.argv) < 2:
+        print("استفاده:")
+        print("  python3 catalog_bootstrap.py <movie_ids.json.gz | --download DIR> [--min-popularity X]")
+        print("        [--include-adult] [--limit N] [--workers N] [--batch-size N]")
+        print("\nمثال:")
+        print("  python3 catalog_bootstrap.py movie_ids_05_15_2026.json.gz --min-popularity 1 --workers 32")
+        print("  python3 catalog_bootstrap.py --download data/ --limit 100000")
+        return
+    
+    args = sys.argv[1:]
+    options = {
+        "--download": None,
+        "--min-popularity": "0",
+        "--limit": None,
+        "--workers": "16",
+        "--batch-size": "100",
+    }
+    for option in options:
+        if option in args:
+            index = args.index(option)
+            options[option] = args[index + 1]
+            del args[index:index + 2]
+    include_adult = "--include-adult" in args
+    args = [arg for arg in args if arg != "--include-adult"]
+    
+    bootstrap = CatalogBootstrap(
+        workers=int(options["--workers"]),
+        batch_size=int(options["--batch-size"]),
+    )
+    movie_cache = connect_movie_cache(bootstrap.service)
+    neighbor_refresher = connect_neighbor_refresher(bootstrap.service)
+    try:
+        if options["--download"]:
+            path = await download_export(bootstrap.service, options["--download"])
+        else:
+            path = Path(args[0])
+            if not path.exists():
+                print(f"❌ فایل پیدا نشد: {path}")
+                return
+        
+        await bootstrap.run(
+            path,
+            min_popularity=float(options["--min-popularity"]),
+            include_adult=include_adult,
+            limit=int(options["--limit"]) if options["--limit"] else None,
+        )
+    finally:
+        await bootstrap.close()
+        if movie_cache is not None:
+            await movie_cache.close()
+        if neighbor_refresher is not None:
+            await neighbor_refresher.flush()
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
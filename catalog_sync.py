@@ -0,0 +1,250 @@
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import func, select
+
+from database import db_manager, dialect_insert
+from models import Movie, SyncState
+from movie_search import local_search
+from recommender import connect_neighbor_refresher
+from shared_cache import connect_movie_cache
+from tmdb_service import TMDbRequestError, TMDbService
+
+SYNC_NAME = "tmdb_movie_changes"
+
+# TMDb accepts at most 14 days per movie/changes query
+CHANGES_WINDOW = timedelta(days=14)
+
+# Look-back of the first run, when no watermark is stored yet
+INITIAL_LOOKBACK = timedelta(days=1)
+
+
+class CatalogSync:
+    """
+    Incremental refresh of the warehouse from the TMDb change feed.
+    
+    Reads `movie/changes` from the stored watermark up to now, keeps the ids
+    already in the warehouse, re-fetches their details (bypassing the
+    response cache) with `concurrency` requests in flight, and applies them
+    through `TMDbService.update_movies` in batches of `batch_size`, which
+    writes only the columns and child rows that changed. The watermark
+    moves forward only when every changed movie was refreshed, so a failed
+    run is simply repeated by the next one.
+    """
+    
+    def __init__(
+        self,
+        service: Optional[TMDbService] = None,
+        concurrency: int = 8,
+        batch_size: int = 50,
+    ):
+        self._owns_service = service is None
+        self.service = service or TMDbService()
+        if local_search.add not in self.service.update_listeners:
+            # Re-indexes changed titles in the in-process search index (non-PostgreSQL databases)
+            self.service.update_listeners.append(local_search.add)
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        
+        # Statistics
+        self.stats = {
+            "changed": 0,  # ids in the change feed
+            "in_warehouse": 0,
+            "updated": 0,
+            "unchanged": 0,
+            "missing": 0,  # no longer on TMDb
+            "errors": 0,
+        }
+    
+    async def close(self):
+        """Close connections"""
+        if self._owns_service:
+            await self.service.close()
+    
+    async def get_watermark(self) -> Optional[datetime]:
+        async with db_manager.get_session() as session:
+            state = await session.get(SyncState, SYNC_NAME)
+            if state is None or state.watermark is None:
+                return None
+            watermark = state.watermark
+        # SQLite returns naive datetimes; watermarks are always stored in UTC
+        return watermark if watermark.tzinfo else watermark.replace(tzinfo=timezone.utc)
+    
+    async def set_watermark(self, watermark: datetime):
+        async with db_manager.get_session() as session:
+            stmt = dialect_insert(session, SyncState).values(name=SYNC_NAME, watermark=watermark)
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=["name"],
+                set_={"watermark": stmt.excluded.watermark, "updated_at": func.now()},
+            ))
+    
+    async def changed_ids(self, since: datetime, until: datetime) -> Set[int]:
+        """Movie ids in the change feed between `since` and `until`, 14-day window by window"""
+        ids: Set[int] = set()
+        start = since
+        while start < until:
+            end = min(start + CHANGES_WINDOW, until)
+            page, total_pages = 1, 1
+            while page <= total_pages:
+                data = await self.service.get_movie_changes(start.date(), end.date(), page)
+                if "results" not in data:
+                    # An empty answer is a failed request, not an empty feed
+                    raise TMDbRequestError(f"movie/changes {start.date()}..{end.date()} page {page} failed")
+                ids.update(item["id"] for item in data["results"])
+                total_pages = data.get("total_pages") or 1
+                page += 1
+            start = end
+        return ids
+    
+    async def warehouse_ids(self, tmdb_ids: Iterable[int], chunk_size: int = 1000) -> List[int]:
+        """The subset of `tmdb_ids` saved in the warehouse"""
+        tmdb_ids = sorted(tmdb_ids)
+        found: List[int] = []
+        async with db_manager.get_session() as session:
+            for start in range(0, len(tmdb_ids), chunk_size):
+                result = await session.execute(
+                    select(Movie.tmdb_id).where(Movie.tmdb_id.in_(tmdb_ids[start:start + chunk_size]))
+                )
+                found.extend(result.scalars())
+        return found
+    
+    async def refresh(self, tmdb_ids: List[int]):
+        """
+        Re-fetch and apply `tmdb_ids`: `concurrency` fetch tasks feed a single
+        writer, which applies the payloads in batches.
+        """
+        id_queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        payload_queue: asyncio.Queue = asyncio.Queue(maxsize=self.batch_size * 2)
+        
+        async def produce():
+            for tmdb_id in tmdb_ids:
+                await id_queue.put(tmdb_id)
+            for _ in range(self.concurrency):
+                await id_queue.put(None)
+        
+        async def fetch_worker():
+            while (tmdb_id := await id_queue.get()) is not None:
+                try:
+                    movie_details = await self.service.get_movie_details(tmdb_id, fresh=True)
+                except TMDbRequestError as e:
+                    print(f"❌ {tmdb_id}: {e}")
+                    self.stats["errors"] += 1
+                    continue
+                if not movie_details:
+                    self.stats["missing"] += 1
+                    continue
+                await payload_queue.put(movie_details)
+        
+        async def fetch_all():
+            await asyncio.gather(*(fetch_worker() for _ in range(self.concurrency)))
+            await payload_queue.put(None)
+        
+        async def writer():
+            batch: List[Dict] = []
+            while (movie_details := await payload_queue.get()) is not None:
+                batch.append(movie_details)
+                if len(batch) >= self.batch_size:
+                    await self._apply(batch)
+                    batch = []
+            if batch:
+                await self._apply(batch)
+        
+        await asyncio.gather(produce(), fetch_all(), writer())
+    
+    async def _apply(self, batch: List[Dict]):
+        try:
+            results = await self.service.update_movies(batch)
+        except Exception as e:
+            print(f"❌ خطا در اعمال تغییرات {len(batch)} فیلم: {e}")
+            self.stats["errors"] += len(batch)
+            return
+        
+        for result in results:
+            if result.error:
+                print(f"❌ {result.title} ({result.tmdb_id}): {result.error}")
+                self.stats["errors"] += 1
+            elif result.changed or result.created:
+                self.stats["updated"] += 1
+            else:
+                self.stats["unchanged"] += 1
+        print(f"🔄 {len(batch)} فیلم بررسی شد ({self.stats['updated']} به‌روزرسانی تا کنون)")
+    
+    async def run(self, since: Optional[datetime] = None):
+        """Sync from `since` (default: the stored watermark) up to now"""
+        until = datetime.now(timezone.utc)
+        if since is None:
+            since = await self.get_watermark()
+        if since is None:
+            since = until - INITIAL_LOOKBACK
+            print(f"ℹ️  watermark ذخیره نشده است، همگام‌سازی از {since:%Y-%m-%d %H:%M}")
+        
+        print(f"📡 دریافت تغییرات TMDb از {since:%Y-%m-%d %H:%M} تا {until:%Y-%m-%d %H:%M} (UTC)")
+        changed = await self.changed_ids(since, until)
+        local = await self.warehouse_ids(changed)
+        self.stats["changed"] = len(changed)
+        self.stats["in_warehouse"] = len(local)
+        
+        await self.refresh(local)
+        
+        if self.stats["errors"] == 0:
+            await self.set_watermark(until)
+            print(f"✅ watermark به {until:%Y-%m-%d %H:%M} (UTC) رسید")
+        else:
+            print("⚠️  به دلیل خطا watermark جلو نرفت؛ اجرای بعدی همین بازه را تکرار می‌کند")
+        
+        self.print_statistics()
+    
+    def print_statistics(self):
+        """Print sync statistics"""
+        print(f"\n{'='*70}")
+        print("📊 خلاصه همگام‌سازی")
+        print(f"{'='*70}")
+        print(f"  📡 فیلم‌های تغییر کرده در TMDb: {self.stats['changed']}")
+        print(f"  🗄️  موجود در دیتابیس:          {self.stats['in_warehouse']}")
+        print(f"  🔄 به‌روزرسانی شده:            {self.stats['updated']}")
+        print(f"  ✓ بدون تغییر:                 {self.stats['unchanged']}")
+        print(f"  🚫 حذف شده از TMDb:            {self.stats['missing']}")
+        print(f"  ❌ خطاها:                     {self.stats['errors']}")
+        print(f"{'='*70}\n")
+
+
+async def main():
+    """Main function"""
+    args = sys.argv[1:]
+    if "--help" in args or "-h" in args:
+        print("استفاده:")
+        print("  python3 catalog_sync.py [--since YYYY-MM-DD] [--concurrency N] [--batch-size N]")
+        return
+    
+    options = {"--since": None, "--concurrency": "8", "--batch-size": "50"}
+    for option in options:
+        if option in args:
+            index = args.index(option)
+            options[option] = args[index + 1]
+            del args[index:index + 2]
+    
+    since = None
+    if options["--since"]:
+        since = datetime.strptime(options["--since"], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    
+    sync = CatalogSync(
+        concurrency=int(options["--concurrency"]),
+        batch_size=int(options["--batch-size"]),
+    )
+    movie_cache = connect_movie_cache(sync.service)
+    neighbor_refresher = connect_neighbor_refresher(sync.service)
+    try:
+        await sync.run(since)
+    finally:
+        await sync.close()
+        if movie_cache is not None:
+            await movie_cache.close()
+        if neighbor_refresher is not None:
+            await neighbor_refresher.flush()
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -18,6 +18,34 @@ class Settings(BaseSettings):
     # TMDb API
     TMDB_API_KEY: str = ""
     TMDB_BASE_URL: str = "https://api.themoviedb.org/3"
+    TMDB_RATE_LIMIT: float = 40.0  # requests per second
+    TMDB_RATE_BURST: int = 20
+    TMDB_MAX_RETRIES: int = 5
+    TMDB_BACKOFF_BASE: float = 0.5  # seconds
+    TMDB_BACKOFF_MAX: float = 30.0  # seconds
+    
+    # TMDb response cache (empty dir disables it)
+    TMDB_CACHE_DIR: str = ".tmdb_cache"
+    TMDB_CACHE_MAX_MB: int = 512
+    TMDB_OFFLINE: bool = False  # serve only from cache, never hit the network
+    
+    # Shared cache for movie cards and recommendations ("memory" or "redis")
+    CACHE_BACKEND: str = "memory"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_MAX_ENTRIES: int = 100_000  # memory backend only
+    CACHE_CARD_TTL: int = 86400  # seconds
+    CACHE_RECOMMENDATION_TTL: int = 600  # seconds
+    
+    # Letterboxd matching: matches less confident than this are queued for review
+    MATCH_REVIEW_THRESHOLD: float = 0.7
+    
+    # Recommender artifacts
+    FEATURES_DIR: str = "data/features"
+    NEIGHBORS_DIR: str = "data/neighbors"
+    ITEM_ITEM_DIR: str = "data/item_item"
+    ALS_DIR: str = "data/als"
+    CATALOG_DIR: str = "data/catalog"
+    ANN_DIR: str = "data/ann"
     
     # Google Gemini API (optional)
     GEMINI_API_KEY: str = ""
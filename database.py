@@ -7,7 +7,8 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
     async_sessionmaker,
 )
-from sqlalchemy import text
+from sqlalchemy import text, Table
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import SQLAlchemyError
 
 from config import get_settings
@@ -92,6 +93,21 @@ class DatabaseManager:
                 await session.close()
 
 
+def dialect_insert(session: AsyncSession, table: Table | type[Base]):
+    """
+    INSERT construct for the session's dialect.
+    
+    PostgreSQL and SQLite inserts support ON CONFLICT clauses, which the
+    bulk writers use for idempotent inserts and upserts.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"ON CONFLICT inserts are not supported on {dialect}")
+
+
 # Global database manager instance
 db_manager = DatabaseManager()
 
@@ -0,0 +1,105 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class ImportCheckpoint:
+    """
+    Append-only JSONL journal of Letterboxd import outcomes.
+    
+    One line per processed entry, keyed by `letterboxd_id` (falling back to
+    the film slug, the Letterboxd URL of CSV exports, then the title). The last line for a key wins, so
+    retries simply append. Each line is flushed as soon as it is written,
+    so a crashed or killed import loses at most the entries in flight.
+    """
+    
+    FAILURE = ("not_found", "error", "review")
+    
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.records: Dict[str, Dict] = {}
+        torn = self._load()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        if torn:
+            # Terminate the partial line so the next record starts clean
+            self._file.write("\n")
+    
+    def _load(self) -> bool:
+        """
+        Read existing records. A torn last line from a crash is ignored;
+        returns whether the file ends without a newline.
+        """
+        if not self.path.exists():
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            content = f.read()
+        for line in content.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            self.records[record["key"]] = record
+        return bool(content) and not content.endswith("\n")
+    
+    @staticmethod
+    def key_for(entry: Dict) -> str:
+        return str(
+            entry.get("letterboxd_id")
+            or entry.get("film_slug")
+            or entry.get("letterboxd_url")
+            or entry.get("title_year", "")
+        )
+    
+    def get(self, entry: Dict) -> Optional[Dict]:
+        return self.records.get(self.key_for(entry))
+    
+    def is_done(self, entry: Dict, retry_failed: bool = False) -> bool:
+        """
+        Whether an entry can be skipped.
+        
+        Successful entries are done unless the export now carries a
+        different rating or like; failed entries are done unless
+        `retry_failed` is set, because most failures (no TMDb match) would
+        just fail again.
+        """
+        record = self.get(entry)
+        if record is None:
+            return False
+        if record["status"] in self.FAILURE:
+            return not retry_failed
+        return (
+            record.get("rating") == entry.get("user_rating")
+            and record.get("liked") == bool(entry.get("user_liked", False))
+        )
+    
+    def record(
+        self,
+        entry: Dict,
+        status: str,
+        tmdb_id: Optional[int] = None,
+        movie_id: Optional[int] = None,
+        error: Optional[str] = None,
+    ):
+        """Append the outcome of an entry and flush it to the OS"""
+        record = {
+            "key": self.key_for(entry),
+            "status": status,
+            "tmdb_id": tmdb_id,
+            "movie_id": movie_id,
+            "rating": entry.get("user_rating"),
+            "liked": bool(entry.get("user_liked", False)),
+            "error": error,
+            "at": time.time(),
+        }
+        self.records[record["key"]] = record
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+    
+    def close(self):
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
@@ -1,22 +1,88 @@
 import asyncio
-import json
 import sys
-from typing import List, Dict, Optional
+from dataclasses import replace
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
 from tmdb_service import TMDbService
-from database import db_manager
-from models import Movie, User, UserMovieRating
-from sqlalchemy import select
+from import_checkpoint import ImportCheckpoint
+from letterboxd_reader import ExportFormatError, read_entries
+from database import db_manager, dialect_insert
+from models import LetterboxdFilm, LetterboxdMatchReview, Movie, User, UserMovieRating, movie_loader
+from movie_search import local_search, normalize, search_local
+from recommender import connect_neighbor_refresher
+from shared_cache import connect_movie_cache
+from title_matcher import CandidateIndex, Match, TitleMatcher
+from sqlalchemy import func, or_, select
+
+# Entry fields that identify a Letterboxd film across users and runs: JSON
+# exports carry letterboxd_id / film_slug, CSV exports the Letterboxd URI
+# (film_slug is derived from it when it is a letterboxd.com film URL)
+FILM_KEYS = ("letterboxd_id", "film_slug", "letterboxd_url")
+
+class FilmRegistry:
+    """
+    Film state shared by the importers of one process.
+    
+    Resolutions and movie lookups are single-flight: when several entries
+    (of one user or of many) need the same film at once, one task does the
+    work and the others await its result, so each unique film is searched
+    and fetched once per run.
+    """
+    
+    def __init__(self):
+        self.mappings: Dict[str, int] = {}  # Letterboxd id / slug -> TMDb id
+        self.movies: Dict[int, Movie] = {}  # TMDb id -> saved movie
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+    
+    async def once(self, key: Tuple, factory: Callable[[], Awaitable]):
+        """Await the running task for `key`, starting `factory()` if there is none"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A cancelled waiter must not cancel the work other waiters share
+        return await asyncio.shield(task)
 
 
 class LetterboxdImporter:
     """Import movies from Letterboxd JSON export"""
     
-    def __init__(self, username: str = "letterboxd_user"):
-        self.service = TMDbService()
+    RATING_BATCH_SIZE = 1000
+    
+    def __init__(
+        self,
+        username: str = "letterboxd_user",
+        workers: int = 1,
+        checkpoint: Optional[ImportCheckpoint] = None,
+        retry_failed: bool = False,
+        service: Optional[TMDbService] = None,
+        films: Optional[FilmRegistry] = None,
+        matcher: Optional[TitleMatcher] = None,
+        prematch: bool = False,
+    ):
+        # A service passed in is shared with other importers and closed by its owner
+        self._owns_service = service is None
+        self.service = service or TMDbService()
+        self.films = films or FilmRegistry()
+        self.matcher = matcher or TitleMatcher()
+        # Keeps the in-process search index (non-PostgreSQL databases) current
+        for listeners in (self.service.save_listeners, self.service.update_listeners):
+            if local_search.add not in listeners:
+                listeners.append(local_search.add)
         self.username = username
         self.user = None
         
+        # Concurrency (workers > 1 enables the pipelined import)
+        self.workers = max(1, workers)
+        
+        # Resume support: entries already in the journal are skipped
+        self.checkpoint = checkpoint
+        self.retry_failed = retry_failed
+        
+        # Batch-match the export against the warehouse before importing (see `prematch_local`)
+        self.prematch = prematch
+        
         # Statistics
         self.stats = {
             "total": 0,
@@ -24,11 +90,69 @@ class LetterboxdImporter:
             "skipped": 0,
             "errors": 0,
             "ratings_added": 0,
+            "resumed": 0,
+            "mapped": 0,
+            "review": 0,
         }
+        
+        # Ratings waiting for the next batched upsert (movie_id -> row) and
+        # the journal records that wait with them
+        self._ratings: Dict[int, Dict] = {}
+        self._held_records: List[Tuple] = []
+        
+        # Called with (user_id, movie_ids) after each successful flush,
+        # e.g. MovieCache.invalidate_user
+        self.rating_listeners: List[Callable[[int, List[int]], Awaitable[None]]] = []
+    
     
     async def close(self):
         """Close connections"""
-        await self.service.close()
+        if self._owns_service:
+            await self.service.close()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+    
+    def _count(self, key: str, amount: int = 1):
+        """Update a statistics counter (safe across pipeline tasks)"""
+        # Runs without awaiting, so it never interleaves with other tasks
+        self.stats[key] += amount
+    
+    def _record(
+        self,
+        entry: Dict,
+        status: str,
+        movie: Optional[Movie] = None,
+        tmdb_id: Optional[int] = None,
+        error: Optional[str] = None,
+    ):
+        """
+        Journal the outcome of an entry when checkpointing is enabled.
+        
+        While ratings are queued, records wait for `flush_ratings` so the
+        journal never marks an entry done before its rating is committed.
+        """
+        if self.checkpoint is None:
+            return
+        if self._ratings:
+            self._held_records.append((entry, status, movie, tmdb_id, error))
+            return
+        self._write_record(entry, status, movie, tmdb_id, error)
+    
+    def _write_record(
+        self,
+        entry: Dict,
+        status: str,
+        movie: Optional[Movie],
+        tmdb_id: Optional[int],
+        error: Optional[str],
+    ):
+        self.checkpoint.record(
+            entry,
+            status,
+            tmdb_id=movie.tmdb_id if movie else tmdb_id,
+            movie_id=movie.id if movie else None,
+            error=error,
+        )
     
     async def get_or_create_user(self) -> User:
         """Get or create user for ratings"""
@@ -65,88 +189,297 @@ class LetterboxdImporter:
                 return title_year, None
         return title_year, None
     
-    async def find_best_match(self, title: str, year: Optional[int]) -> Optional[Dict]:
+    async def match_movie(self, title: str, year: Optional[int]) -> Optional[Tuple[Dict, Match]]:
         """
-        Find best matching movie from TMDb considering year
+        Find best matching movie considering year, in the warehouse first
+        and then on TMDb
+        Returns: (movie, match), the match carrying confidence and method
         """
+        local = await self.match_local(title, year)
+        if local:
+            return local
+        
         # Search for the movie
         results = await self.service.search_movie(title)
         
-        if not results:
+        # Score every result on title, original title, year and popularity
+        match = self.matcher.best(title, year, results or [])
+        if not match:
             return None
         
-        # If we have a year, try to find exact match
-        if year:
-            for movie in results:
-                movie_year = None
-                if movie.get('release_date'):
-                    try:
-                        movie_year = int(movie['release_date'][:4])
-                    except (ValueError, IndexError):
-                        continue
-                
-                # Exact year match
-                if movie_year == year:
-                    return movie
-            
-            # If no exact match, try ±1 year tolerance
-            for movie in results:
-                movie_year = None
-                if movie.get('release_date'):
-                    try:
-                        movie_year = int(movie['release_date'][:4])
-                    except (ValueError, IndexError):
-                        continue
-                
-                if movie_year and abs(movie_year - year) <= 1:
-                    print(f"  ⚠️  استفاده از فیلم با سال نزدیک: {movie['title']} ({movie_year}) به جای ({year})")
-                    return movie
+        movie = results[match.index]
+        if match.method == "near_year":
+            print(f"  ⚠️  استفاده از فیلم با سال نزدیک: {movie['title']} ({match.year}) به جای ({year})")
+        elif match.method == "other_year":
+            print(f"  ⚠️  فیلم با سال مطابق پیدا نشد. استفاده از: {movie['title']} ({match.year})")
+        return movie, match
+    
+    async def match_local(self, title: str, year: Optional[int]) -> Optional[Tuple[Dict, Match]]:
+        """
+        Match against the movies already in the warehouse.
         
-        # No year match, return first result (most popular)
-        if results:
-            movie = results[0]
-            movie_year = movie.get('release_date', '')[:4] if movie.get('release_date') else 'N/A'
-            if year:
-                print(f"  ⚠️  فیلم با سال مطابق پیدا نشد. استفاده از: {movie['title']} ({movie_year})")
-            return movie
+        Only a title equal to the movie's title or original title (ignoring
+        case and accents) is considered; with a year the movie must be within
+        ±1 year of it. The best of those is used when the matcher is
+        confident about it, anything else falls through to the TMDb search.
+        """
+        key = normalize(title)
+        hits = [
+            {
+                'id': hit.tmdb_id,
+                'title': hit.title,
+                'original_title': hit.original_title,
+                'release_date': str(hit.year) if hit.year else None,
+                'popularity': hit.popularity,
+            }
+            for hit in await search_local(title, year)
+            if key in (normalize(hit.title), normalize(hit.original_title))
+        ]
         
-        return None
+        match = self.matcher.best(title, year, hits)
+        if not match or self.matcher.needs_review(match) or match.method == "other_year":
+            return None
+        hit = hits[match.index]
+        return {'id': hit['id'], 'title': hit['title']}, replace(match, method=f"local_{match.method}")
     
-    async def add_rating(self, movie: Movie, rating: float, liked: bool):
-        """Add user rating for a movie"""
-        if not self.user:
-            self.user = await self.get_or_create_user()
+    async def find_best_match(self, title: str, year: Optional[int]) -> Optional[Dict]:
+        """
+        Find best matching movie from TMDb considering year
+        """
+        match = await self.match_movie(title, year)
+        return match[0] if match else None
+    
+    @staticmethod
+    def _film_keys(entry: Dict) -> Dict[str, Optional[str]]:
+        """FILM_KEYS of an entry (letterboxd_films / letterboxd_match_reviews columns), each may be None"""
+        return {key: str(entry[key]) if entry.get(key) else None for key in FILM_KEYS}
+    
+    async def lookup_mapping(self, entry: Dict) -> Optional[int]:
+        """TMDb id of an already resolved Letterboxd film, or None"""
+        keys = self._film_keys(entry)
+        if not any(keys.values()):
+            return None
         
+        for key in keys.values():
+            if key and key in self.films.mappings:
+                return self.films.mappings[key]
+        
+        conditions = [getattr(LetterboxdFilm, column) == key for column, key in keys.items() if key]
         async with db_manager.get_session() as session:
-            try:
-                # Check if rating already exists
+            result = await session.execute(
+                select(LetterboxdFilm.tmdb_id).where(or_(*conditions)).limit(1)
+            )
+            tmdb_id = result.scalar_one_or_none()
+        
+        if tmdb_id is not None:
+            self._remember(keys, tmdb_id)
+        return tmdb_id
+    
+    def _remember(self, keys: Dict[str, Optional[str]], tmdb_id: int):
+        for key in keys.values():
+            if key:
+                self.films.mappings[key] = tmdb_id
+    
+    async def save_mapping(self, entry: Dict, tmdb_id: int, confidence: float, method: str):
+        """Store the resolution of a Letterboxd film for later imports (first one wins)"""
+        keys = self._film_keys(entry)
+        if not any(keys.values()):
+            return
+        
+        async with db_manager.get_session() as session:
+            await session.execute(
+                dialect_insert(session, LetterboxdFilm).on_conflict_do_nothing(),
+                [{
+                    **keys,
+                    "tmdb_id": tmdb_id,
+                    "confidence": confidence,
+                    "match_method": method,
+                }],
+            )
+            await session.commit()
+        self._remember(keys, tmdb_id)
+    
+    async def resolve_entry(self, entry: Dict) -> Optional[Dict]:
+        """
+        TMDb match for a Letterboxd entry.
+        
+        Films resolved before (by any user's import) come from the
+        letterboxd_films table without calling search/movie; new
+        resolutions are stored there. Concurrent resolutions of the same
+        film share one lookup.
+        """
+        return await self.films.once(("resolve", ImportCheckpoint.key_for(entry)), lambda: self._resolve(entry))
+    
+    async def _resolve(self, entry: Dict) -> Optional[Dict]:
+        title, year = self.parse_title_year(entry.get('title_year', ''))
+        
+        tmdb_id = await self.lookup_mapping(entry)
+        if tmdb_id is not None:
+            self._count("mapped")
+            return {'id': tmdb_id, 'title': title}
+        
+        match = await self.match_movie(title, year)
+        if not match:
+            return None
+        movie_data, scored = match
+        if self.matcher.needs_review(scored):
+            if await self.save_review(entry, title, year, scored):
+                return {'id': movie_data['id'], 'title': movie_data['title'], 'review': True, 'confidence': scored.confidence}
+            # Without a stable key a review could never be resolved: import the best candidate
+            print(f"  ⚠️  تطابق نامطمئن ({scored.confidence:.2f}) بدون شناسه Letterboxd، استفاده از: {movie_data['title']}")
+        await self.save_mapping(entry, movie_data['id'], scored.confidence, scored.method)
+        return movie_data
+    
+    async def save_review(self, entry: Dict, title: str, year: Optional[int], match: Match) -> bool:
+        """
+        Queue a low-confidence match for review instead of importing it
+        (see `python3 title_matcher.py reviews`); an accepted review becomes
+        a mapping that the next import uses.
+        
+        Returns False, queueing nothing, for an entry without FILM_KEYS.
+        """
+        keys = self._film_keys(entry)
+        if not any(keys.values()):
+            return False
+        
+        async with db_manager.get_session() as session:
+            await session.execute(
+                dialect_insert(session, LetterboxdMatchReview).on_conflict_do_nothing(),
+                [{
+                    **keys,
+                    "title": title,
+                    "year": year,
+                    "tmdb_id": match.tmdb_id,
+                    "confidence": match.confidence,
+                    "candidates": match.ranked(),
+                }],
+            )
+            await session.commit()
+        return True
+    
+    async def prematch_local(self, entries: Iterable[Dict], chunk_size: int = 5000) -> int:
+        """
+        Resolve entries against the warehouse in batches before importing.
+        
+        Each chunk of entries is scored against a CandidateIndex of every
+        saved movie in one vectorized pass, and confident matches are
+        stored as mappings, so the import finds them without a search.
+        Entries already mapped, or matched with low confidence, are left to
+        the normal per-entry matching. Returns the number of new mappings.
+        """
+        index = await CandidateIndex.load()
+        if not len(index):
+            return 0
+        
+        saved = 0
+        chunk: List[Dict] = []
+        
+        async def flush():
+            nonlocal saved
+            keyed = [(entry, self._film_keys(entry)) for entry in chunk]
+            values = [key for _, keys in keyed for key in keys.values() if key]
+            if not values:
+                return
+            async with db_manager.get_session() as session:
                 result = await session.execute(
-                    select(UserMovieRating).where(
-                        UserMovieRating.user_id == self.user.id,
-                        UserMovieRating.movie_id == movie.id
+                    select(*(getattr(LetterboxdFilm, column) for column in FILM_KEYS)).where(
+                        or_(*(getattr(LetterboxdFilm, column).in_(values) for column in FILM_KEYS))
                     )
                 )
-                existing_rating = result.scalar_one_or_none()
-                
-                if existing_rating:
-                    # Update existing rating
-                    existing_rating.rating = int(rating * 2)  # Convert 5-star to 10-point scale
-                    print(f"  📝 رتبه‌بندی به‌روز شد: {rating} ستاره")
-                else:
-                    # Create new rating
-                    user_rating = UserMovieRating(
-                        user_id=self.user.id,
-                        movie_id=movie.id,
-                        rating=int(rating * 2)  # Convert 5-star to 10-point scale
-                    )
-                    session.add(user_rating)
-                    self.stats["ratings_added"] += 1
-                    print(f"  ⭐ رتبه‌بندی اضافه شد: {rating} ستاره → {int(rating * 2)}/10")
-                
-                await session.commit()
-                
+                mapped = {key for row in result for key in row if key}
+            
+            pending = [
+                (entry, keys) for entry, keys in keyed
+                if any(keys.values()) and not set(keys.values()) & mapped
+            ]
+            queries = [self.parse_title_year(entry.get('title_year', '')) for entry, _ in pending]
+            rows = []
+            for (_, keys), match in zip(pending, index.match(queries, self.matcher)):
+                if match is None or self.matcher.needs_review(match) or match.method == "other_year":
+                    continue
+                rows.append({
+                    **keys,
+                    "tmdb_id": match.tmdb_id,
+                    "confidence": match.confidence,
+                    "match_method": f"local_{match.method}",
+                })
+            if rows:
+                async with db_manager.get_session() as session:
+                    await session.execute(dialect_insert(session, LetterboxdFilm).on_conflict_do_nothing(), rows)
+                    await session.commit()
+                saved += len(rows)
+        
+        for entry in entries:
+            if isinstance(entry, dict):
+                chunk.append(entry)
+            if len(chunk) >= chunk_size:
+                await flush()
+                chunk = []
+        if chunk:
+            await flush()
+        return saved
+    
+    async def add_rating(self, movie: Movie, rating: float, liked: bool):
+        """
+        Queue a user rating for a movie.
+        
+        Ratings are written in batches of RATING_BATCH_SIZE by
+        `flush_ratings`; a later rating of the same movie replaces an
+        earlier one still in the queue.
+        """
+        self._ratings[movie.id] = {
+            "movie_id": movie.id,
+            "rating": int(rating * 2),  # Convert 5-star to 10-point scale
+            "liked": bool(liked),
+        }
+        print(f"  ⭐ رتبه‌بندی: {rating} ستاره → {int(rating * 2)}/10")
+        if len(self._ratings) >= self.RATING_BATCH_SIZE:
+            await self.flush_ratings()
+    
+    async def flush_ratings(self):
+        """
+        Upsert the queued ratings with one INSERT ... ON CONFLICT (user_id,
+        movie_id) DO UPDATE per chunk, then journal the entries that were
+        waiting for them.
+        """
+        if self._ratings:
+            if not self.user:
+                self.user = await self.get_or_create_user()
+            
+            rows = [{"user_id": self.user.id, **row} for row in self._ratings.values()]
+            try:
+                async with db_manager.get_session() as session:
+                    for start in range(0, len(rows), self.RATING_BATCH_SIZE):
+                        stmt = dialect_insert(session, UserMovieRating).values(rows[start:start + self.RATING_BATCH_SIZE])
+                        stmt = stmt.on_conflict_do_update(
+                            index_elements=["user_id", "movie_id"],  # unique_user_movie_rating
+                            set_={
+                                "rating": stmt.excluded.rating,
+                                "liked": stmt.excluded.liked,
+                                "updated_at": func.now(),
+                            },
+                        )
+                        await session.execute(stmt)
+                    await session.commit()
+                self._count("ratings_added", len(rows))
+                await self._notify_ratings([row["movie_id"] for row in rows])
+            except Exception as e:
+                print(f"  ❌ خطا در ثبت رتبه‌بندی‌ها: {e}")
+                self._count("errors", len(rows))
+                # Leave these entries out of the journal so a resume retries them
+                self._held_records.clear()
+            self._ratings.clear()
+        
+        held, self._held_records = self._held_records, []
+        for args in held:
+            self._write_record(*args)
+    
+    async def _notify_ratings(self, movie_ids: List[int]):
+        for listener in self.rating_listeners:
+            try:
+                await listener(self.user.id, movie_ids)
             except Exception as e:
-                print(f"  ❌ خطا در ثبت رتبه‌بندی: {e}")
+                print(f"  ⚠️  خطا در listener رتبه‌بندی: {e}")
     
     async def import_movie(self, entry: Dict) -> bool:
         """Import a single movie from Letterboxd entry"""
@@ -162,24 +495,35 @@ class LetterboxdImporter:
         
         try:
             # Find best match
-            movie_data = await self.find_best_match(title, year)
+            movie_data = await self.resolve_entry(entry)
             
             if not movie_data:
                 print(f"  ❌ فیلم پیدا نشد در TMDb")
-                self.stats["errors"] += 1
+                self._count("errors")
+                self._record(entry, "not_found")
+                return False
+            
+            if movie_data.get('review'):
+                print(f"  🔍 تطابق نامطمئن ({movie_data['confidence']:.2f}): {movie_data['title']}، در صف بازبینی")
+                self._count("review")
+                self._record(entry, "review", tmdb_id=movie_data['id'])
                 return False
             
             # Check if already in database
-            async with db_manager.get_session() as session:
-                result = await session.execute(
-                    select(Movie).where(Movie.tmdb_id == movie_data['id'])
-                )
-                existing_movie = result.scalar_one_or_none()
+            existing_movie = self.films.movies.get(movie_data['id'])
+            if existing_movie is None:
+                async with db_manager.get_session() as session:
+                    result = await session.execute(
+                        select(Movie)
+                        .options(*movie_loader("card"))
+                        .where(Movie.tmdb_id == movie_data['id'])
+                    )
+                    existing_movie = result.scalar_one_or_none()
             
             if existing_movie:
                 print(f"  ✓ فیلم از قبل در دیتابیس است")
                 movie = existing_movie
-                self.stats["skipped"] += 1
+                self._count("skipped")
             else:
                 # Get full details and save
                 print(f"  📥 دریافت اطلاعات کامل...")
@@ -187,63 +531,90 @@ class LetterboxdImporter:
                 
                 if not movie_details:
                     print(f"  ❌ خطا در دریافت جزئیات")
-                    self.stats["errors"] += 1
+                    self._count("errors")
+                    self._record(entry, "error", tmdb_id=movie_data['id'], error="details not available")
                     return False
                 
                 movie = await self.service.save_movie(movie_details)
                 
                 if not movie:
                     print(f"  ❌ خطا در ذخیره فیلم")
-                    self.stats["errors"] += 1
+                    self._count("errors")
+                    self._record(entry, "error", tmdb_id=movie_data['id'], error="save failed")
                     return False
                 
-                self.stats["imported"] += 1
+                self._count("imported")
+            self.films.movies[movie.tmdb_id] = movie
             
             # Add rating if exists
             if rating and rating > 0:
                 await self.add_rating(movie, rating, liked)
             
+            self._record(entry, "existing" if existing_movie else "imported", movie)
             return True
-            
+        
         except Exception as e:
             print(f"  ❌ خطا: {e}")
-            self.stats["errors"] += 1
+            self._count("errors")
+            self._record(entry, "error", error=str(e))
             import traceback
             traceback.print_exc()
             return False
     
+    async def import_concurrently(self, entries: Iterable[Dict]):
+        """Import entries through the pipelined flow (see `run_pipeline`)"""
+        await run_pipeline(((self, entry) for entry in entries), self.workers, self.films)
+    
+    def _pending(self, entries: Iterable) -> Iterator[Dict]:
+        """Count entries as they stream in and drop those the checkpoint has"""
+        for entry in entries:
+            self._count("total")
+            if not isinstance(entry, dict):
+                self._count("errors")
+                continue
+            if self.checkpoint is not None and self.checkpoint.is_done(entry, self.retry_failed):
+                self._count("resumed")
+                continue
+            yield entry
+    
     async def import_from_json(self, json_path: str):
-        """Import all movies from JSON file"""
+        """
+        Import all movies from a Letterboxd export.
+        
+        Accepts a JSON array, JSON Lines or the native ratings.csv /
+        diary.csv. The file is streamed, so memory stays flat and the first
+        movie is fetched before the rest of the file has been read.
+        """
         print(f"\n{'='*70}")
         print(f"📂 خواندن فایل: {json_path}")
         print(f"{'='*70}\n")
         
-        # Read JSON file
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception as e:
-            print(f"❌ خطا در خواندن فایل: {e}")
-            return
-        
-        if not isinstance(data, list):
-            print("❌ فرمت فایل نادرست است. باید یک آرایه JSON باشد")
-            return
+        if self.prematch:
+            try:
+                matched = await self.prematch_local(read_entries(json_path))
+                print(f"🔗 {matched} فیلم از دیتابیس تطبیق داده شد\n")
+            except (OSError, ExportFormatError) as e:
+                print(f"❌ خطا در خواندن فایل: {e}")
         
-        self.stats["total"] = len(data)
-        print(f"📊 تعداد فیلم‌ها: {self.stats['total']}\n")
+        entries = self._pending(read_entries(json_path))
         
         # Get or create user for ratings
         self.user = await self.get_or_create_user()
         
-        # Import each movie
-        for i, entry in enumerate(data, 1):
-            print(f"\n[{i}/{self.stats['total']}] ", end="")
-            await self.import_movie(entry)
-            
-            # Small delay to respect API rate limits
-            if i < self.stats['total']:
-                await asyncio.sleep(0.3)
+        try:
+            if self.workers > 1:
+                await self.import_concurrently(entries)
+            else:
+                # Import each movie
+                try:
+                    for i, entry in enumerate(entries, 1):
+                        print(f"\n[{i}] ", end="")
+                        await self.import_movie(entry)
+                except (OSError, ExportFormatError) as e:
+                    print(f"❌ خطا در خواندن فایل: {e}")
+        finally:
+            # Write the last partial batch of ratings
+            await self.flush_ratings()
         
         # Print final statistics
         self.print_statistics()
@@ -258,32 +629,232 @@ class LetterboxdImporter:
         print(f"  ⏭️  فیلم‌های تکراری:     {self.stats['skipped']}")
         print(f"  ❌ خطاها:               {self.stats['errors']}")
         print(f"  ⭐ رتبه‌بندی‌های ثبت شده: {self.stats['ratings_added']}")
+        print(f"  ⏭️  رد شده از checkpoint:  {self.stats['resumed']}")
+        print(f"  🔗 از جدول نگاشت:        {self.stats['mapped']}")
+        print(f"  🔍 در صف بازبینی:        {self.stats['review']}")
         print(f"{'='*70}\n")
 
 
+def default_checkpoint_path(json_path: str | Path, username: str) -> Path:
+    """One journal per export and user: <export>.<username>.checkpoint.jsonl"""
+    json_path = Path(json_path)
+    return json_path.with_name(f"{json_path.stem}.{username}.checkpoint.jsonl")
+
+
+async def run_pipeline(
+    items: Iterable[Tuple[LetterboxdImporter, Dict]],
+    workers: int,
+    films: FilmRegistry,
+):
+    """
+    Import (importer, entry) pairs through a pipelined search -> details -> write flow.
+    
+    Search and detail fetching each run `workers` tasks, while a single
+    writer task performs DB writes so inserts never race each other.
+    Stages are connected by bounded queues, so network latency overlaps DB
+    writes without reading ahead unboundedly. TMDb request rate is
+    enforced by the service's shared rate limiter.
+    
+    `items` may be a lazy iterator: it is consumed only as fast as the
+    search stage drains its queue. Entries of several importers (users)
+    may be interleaved; they share `films`, so a film rated by many users
+    is resolved, fetched and saved once.
+    """
+    queue_size = workers * 2
+    search_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    details_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    write_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    
+    # Details fetched but not saved yet, shared by queued entries of the same film
+    fetched: Dict[int, Dict] = {}
+    
+    async def produce():
+        try:
+            for i, (importer, entry) in enumerate(items, 1):
+                await search_queue.put((i, importer, entry))
+        except (OSError, ExportFormatError) as e:
+            print(f"❌ خطا در خواندن فایل: {e}")
+        finally:
+            for _ in range(workers):
+                await search_queue.put(None)
+    
+    async def search_worker():
+        while (item := await search_queue.get()) is not None:
+            i, importer, entry = item
+            title, year = importer.parse_title_year(entry.get('title_year', ''))
+            try:
+                movie_data = await importer.resolve_entry(entry)
+            except Exception as e:
+                print(f"[{i}] ❌ {title}: {e}")
+                importer._count("errors")
+                importer._record(entry, "error", error=str(e))
+                continue
+            
+            if not movie_data:
+                print(f"[{i}] ❌ فیلم پیدا نشد در TMDb: {title}")
+                importer._count("errors")
+                importer._record(entry, "not_found")
+                continue
+            
+            if movie_data.get('review'):
+                print(f"[{i}] 🔍 تطابق نامطمئن ({movie_data['confidence']:.2f}): {title} → {movie_data['title']}")
+                importer._count("review")
+                importer._record(entry, "review", tmdb_id=movie_data['id'])
+                continue
+            
+            await details_queue.put((i, importer, entry, movie_data))
+    
+    async def fetch(service: TMDbService, tmdb_id: int) -> Tuple[Optional[Movie], Optional[Dict]]:
+        """The saved movie, or else the TMDb details of a film"""
+        if tmdb_id in films.movies:
+            return films.movies[tmdb_id], None
+        if tmdb_id in fetched:
+            return None, fetched[tmdb_id]
+        
+        async with db_manager.get_session() as session:
+            result = await session.execute(
+                select(Movie)
+                .options(*movie_loader("card"))
+                .where(Movie.tmdb_id == tmdb_id)
+            )
+            existing_movie = result.scalar_one_or_none()
+        if existing_movie:
+            films.movies[tmdb_id] = existing_movie
+            return existing_movie, None
+        
+        movie_details = await service.get_movie_details(tmdb_id)
+        if movie_details:
+            fetched[tmdb_id] = movie_details
+        return None, movie_details
+    
+    async def details_worker():
+        while (item := await details_queue.get()) is not None:
+            i, importer, entry, movie_data = item
+            try:
+                existing_movie, movie_details = await films.once(
+                    ("details", movie_data['id']), lambda: fetch(importer.service, movie_data['id'])
+                )
+                if not existing_movie and not movie_details:
+                    print(f"[{i}] ❌ خطا در دریافت جزئیات: {movie_data['title']}")
+                    importer._count("errors")
+                    importer._record(entry, "error", tmdb_id=movie_data['id'], error="details not available")
+                    continue
+            except Exception as e:
+                print(f"[{i}] ❌ {movie_data['title']}: {e}")
+                importer._count("errors")
+                importer._record(entry, "error", tmdb_id=movie_data['id'], error=str(e))
+                continue
+            
+            await write_queue.put((i, importer, entry, existing_movie, movie_details))
+    
+    async def writer():
+        while (item := await write_queue.get()) is not None:
+            i, importer, entry, movie, movie_details = item
+            try:
+                if movie is None:
+                    # The same film may be queued for several entries / users
+                    movie = films.movies.get(movie_details['id'])
+                
+                if movie is not None:
+                    print(f"[{i}] ✓ فیلم از قبل در دیتابیس است: {movie.title}")
+                    importer._count("skipped")
+                    status = "existing"
+                else:
+                    movie = await importer.service.save_movie(movie_details)
+                    fetched.pop(movie_details['id'], None)
+                    if not movie:
+                        print(f"[{i}] ❌ خطا در ذخیره فیلم: {movie_details['title']}")
+                        importer._count("errors")
+                        importer._record(entry, "error", tmdb_id=movie_details['id'], error="save failed")
+                        continue
+                    films.movies[movie.tmdb_id] = movie
+                    print(f"[{i}] ✅ {movie.title}")
+                    importer._count("imported")
+                    status = "imported"
+                
+                rating = entry.get('user_rating')
+                if rating and rating > 0:
+                    await importer.add_rating(movie, rating, entry.get('user_liked', False))
+                importer._record(entry, status, movie)
+            except Exception as e:
+                print(f"[{i}] ❌ خطا: {e}")
+                importer._count("errors")
+                importer._record(entry, "error", error=str(e))
+    
+    async def run_stage(worker, downstream: asyncio.Queue, downstream_workers: int):
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        for _ in range(downstream_workers):
+            await downstream.put(None)
+    
+    await asyncio.gather(
+        produce(),
+        run_stage(search_worker, details_queue, workers),
+        run_stage(details_worker, write_queue, 1),
+        writer(),
+    )
+
+
 async def main():
     """Main function"""
     if len(sys.argv) < 2:
         print("استفاده:")
-        print("  python3 import_letterboxd.py <path_to_json> [username]")
+        print("  python3 import_letterboxd.py <export.json|.jsonl|ratings.csv> [username] [--workers N]")
+        print("        [--checkpoint PATH | --no-checkpoint] [--retry-failed] [--prematch]")
         print("\nمثال:")
         print("  python3 import_letterboxd.py letterboxd_export.json")
         print("  python3 import_letterboxd.py letterboxd_export.json javad")
+        print("  python3 import_letterboxd.py letterboxd_export.json javad --workers 8")
+        print("  python3 import_letterboxd.py letterboxd_export.json javad --retry-failed")
+        print("  python3 import_letterboxd.py ratings.csv javad")
+        print("  python3 import_letterboxd.py ratings.csv javad --prematch   # تطبیق دسته‌ای با فیلم‌های دیتابیس")
         return
     
-    json_path = sys.argv[1]
-    username = sys.argv[2] if len(sys.argv) > 2 else "letterboxd_user"
+    args = sys.argv[1:]
+    workers = 1
+    if "--workers" in args:
+        index = args.index("--workers")
+        workers = int(args[index + 1])
+        del args[index:index + 2]
+    
+    checkpoint_path = None
+    if "--checkpoint" in args:
+        index = args.index("--checkpoint")
+        checkpoint_path = args[index + 1]
+        del args[index:index + 2]
+    use_checkpoint = "--no-checkpoint" not in args
+    retry_failed = "--retry-failed" in args
+    prematch = "--prematch" in args
+    args = [arg for arg in args if arg not in ("--no-checkpoint", "--retry-failed", "--prematch")]
+    
+    json_path = args[0]
+    username = args[1] if len(args) > 1 else "letterboxd_user"
     
     if not Path(json_path).exists():
         print(f"❌ فایل پیدا نشد: {json_path}")
         return
     
-    importer = LetterboxdImporter(username=username)
+    checkpoint = None
+    if use_checkpoint:
+        checkpoint = ImportCheckpoint(checkpoint_path or default_checkpoint_path(json_path, username))
+    
+    importer = LetterboxdImporter(
+        username=username,
+        workers=workers,
+        checkpoint=checkpoint,
+        retry_failed=retry_failed,
+        prematch=prematch,
+    )
+    movie_cache = connect_movie_cache(importer.service, [importer])
+    neighbor_refresher = connect_neighbor_refresher(importer.service)
     
     try:
         await importer.import_from_json(json_path)
     finally:
         await importer.close()
+        if movie_cache is not None:
+            await movie_cache.close()
+        if neighbor_refresher is not None:
+            await neighbor_refresher.flush()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from database import db_manager
+from import_checkpoint import ImportCheckpoint
+from import_letterbox_json import FilmRegistry, LetterboxdImporter, default_checkpoint_path, run_pipeline
+from letterboxd_reader import ExportFormatError, read_entries
+from recommender import connect_neighbor_refresher
+from shared_cache import connect_movie_cache
+from tmdb_service import TMDbService
+
+EXPORT_SUFFIXES = (".json", ".jsonl", ".ndjson", ".csv")
+
+
+@dataclass
+class ImportJob:
+    """One user's Letterboxd export"""
+    username: str
+    path: Path
+
+
+def discover_jobs(source: str | Path) -> List[ImportJob]:
+    """
+    Jobs from a directory or a manifest file.
+    
+    In a directory every export file is one user, named after the file
+    stem (`javad.json` -> javad). A manifest is a JSON object mapping
+    usernames to export paths, or a list of {"username", "path"} objects;
+    relative paths are resolved against the manifest's directory.
+    """
+    source = Path(source)
+    if source.is_dir():
+        return [
+            ImportJob(path.stem, path)
+            for path in sorted(source.iterdir())
+            if path.suffix.lower() in EXPORT_SUFFIXES and not path.name.endswith(".checkpoint.jsonl")
+        ]
+    
+    with open(source, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, dict):
+        manifest = [{"username": username, "path": path} for username, path in manifest.items()]
+    return [ImportJob(item["username"], source.parent / item["path"]) for item in manifest]
+
+
+def _entries(importer: LetterboxdImporter, path: Path) -> Iterator[Tuple[LetterboxdImporter, Dict]]:
+    """A user's pending entries; a broken file ends only that user's stream"""
+    try:
+        for entry in importer._pending(read_entries(path)):
+            yield importer, entry
+    except (OSError, ExportFormatError) as e:
+        print(f"❌ خطا در خواندن فایل {path} ({importer.username}): {e}")
+
+
+def _interleave(streams: Iterable[Iterator]) -> Iterator:
+    """Round-robin over the streams so every user makes progress at once"""
+    active = list(streams)
+    while active:
+        for stream in list(active):
+            try:
+                yield next(stream)
+            except StopIteration:
+                active.remove(stream)
+
+
+class MultiUserImporter:
+    """
+    Import many users' exports in one process.
+    
+    All users share one TMDbService (so one rate limiter and one response
+    cache), the global DB pool and one FilmRegistry. Their entries are
+    interleaved into a single search -> details -> write pipeline, so users
+    are imported concurrently and a film rated by many users is searched,
+    fetched and saved once: TMDb work grows with the number of unique films,
+    not with the number of ratings.
+    """
+    
+    def __init__(
+        self,
+        jobs: List[ImportJob],
+        workers: int = 8,
+        use_checkpoints: bool = True,
+        retry_failed: bool = False,
+    ):
+        self.jobs = jobs
+        self.workers = max(1, workers)
+        self.service = TMDbService()
+        self.films = FilmRegistry()
+        self.importers = [
+            LetterboxdImporter(
+                username=job.username,
+                workers=self.workers,
+                checkpoint=ImportCheckpoint(default_checkpoint_path(job.path, job.username)) if use_checkpoints else None,
+                retry_failed=retry_failed,
+                service=self.service,
+                films=self.films,
+            )
+            for job in jobs
+        ]
+    
+    async def close(self):
+        """Close the importers' journals and the shared service"""
+        for importer in self.importers:
+            await importer.close()
+        await self.service.close()
+    
+    async def run(self):
+        """Import every job and print per-user and overall statistics"""
+        for importer in self.importers:
+            importer.user = await importer.get_or_create_user()
+        
+        streams = (_entries(importer, job.path) for importer, job in zip(self.importers, self.jobs))
+        try:
+            await run_pipeline(_interleave(streams), self.workers, self.films)
+        finally:
+            for importer in self.importers:
+                await importer.flush_ratings()
+        
+        self.print_statistics()
+    
+    def print_statistics(self):
+        """Print one line per user and the totals"""
+        print(f"\n{'='*70}")
+        print(f"📊 خلاصه نتایج Import ({len(self.importers)} کاربر)")
+        print(f"{'='*70}")
+        totals: Dict[str, int] = {}
+        for importer in self.importers:
+            stats = importer.stats
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+            print(
+                f"  👤 {importer.username:<20} کل: {stats['total']:<6} "
+                f"⭐ {stats['ratings_added']:<6} ❌ {stats['errors']:<5} ⏭️  {stats['resumed']}"
+            )
+        print(f"{'-'*70}")
+        print(f"  📝 کل ورودی‌ها:          {totals.get('total', 0)}")
+        print(f"  🎬 فیلم‌های یکتا:         {len(self.films.movies)}")
+        print(f"  ✅ فیلم‌های جدید:        {totals.get('imported', 0)}")
+        print(f"  ⭐ رتبه‌بندی‌های ثبت شده: {totals.get('ratings_added', 0)}")
+        print(f"  ❌ خطاها:               {totals.get('errors', 0)}")
+        print(f"  🔍 در صف بازبینی:        {totals.get('review', 0)}")
+        print(f"{'='*70}\n")
+
+
+async def main():
+    """Main function"""
+    if len(sys.argv) < 2:
+        print("استفاده:")
+        print("  python3 import_orchestrator.py <exports_dir|manifest.json> [--workers N] [--no-checkpoint] [--retry-failed]")
+        print("\nمثال:")
+        print("  python3 import_orchestrator.py exports/ --workers 16")
+        print('  python3 import_orchestrator.py manifest.json    # {"javad": "javad.json", "sara": "sara/ratings.csv"}')
+        return
+    
+    args = sys.argv[1:]
+    workers = 8
+    if "--workers" in args:
+        index = args.index("--workers")
+        workers = int(args[index + 1])
+        del args[index:index + 2]
+    use_checkpoints = "--no-checkpoint" not in args
+    retry_failed = "--retry-failed" in args
+    args = [arg for arg in args if arg not in ("--no-checkpoint", "--retry-failed")]
+    
+    if not Path(args[0]).exists():
+        print(f"❌ فایل پیدا نشد: {args[0]}")
+        return
+    
+    jobs = discover_jobs(args[0])
+    if not jobs:
+        print(f"❌ فایل export پیدا نشد: {args[0]}")
+        return
+    
+    importer = MultiUserImporter(jobs, workers, use_checkpoints, retry_failed)
+    movie_cache = connect_movie_cache(importer.service, importer.importers)
+    neighbor_refresher = connect_neighbor_refresher(importer.service)
+    try:
+        await importer.run()
+    finally:
+        await importer.close()
+        if movie_cache is not None:
+            await movie_cache.close()
+        if neighbor_refresher is not None:
+            await neighbor_refresher.flush()
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,5 +1,31 @@
 import asyncio
+from typing import List
+
+from sqlalchemy import Table, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateIndex, CreateTable
+
 from database import db_manager
+from models import Base, movie_provider_association
+
+# Columns added to tables that already exist in older databases
+LIKED_COLUMN_DDL = "ALTER TABLE user_movie_ratings ADD COLUMN liked BOOLEAN NOT NULL DEFAULT false"
+
+
+def primary_key_ddl(conn: Connection, table: Table, constraint: str) -> List[str]:
+    """Replace the primary key of an existing table with the model's"""
+    columns = ", ".join(column.name for column in table.primary_key.columns)
+    if conn.dialect.name == "postgresql":
+        return [f"ALTER TABLE {table.name} DROP CONSTRAINT {constraint}, ADD PRIMARY KEY ({columns})"]
+    
+    # SQLite cannot alter a primary key: copy the rows into a rebuilt table
+    names = ", ".join(column.name for column in table.columns)
+    return [
+        f"ALTER TABLE {table.name} RENAME TO {table.name}_old",
+        str(CreateTable(table).compile(dialect=conn.dialect)).strip(),
+        f"INSERT INTO {table.name} ({names}) SELECT {names} FROM {table.name}_old",
+        f"DROP TABLE {table.name}_old",
+    ]
 
 
 async def initialize_database():
@@ -35,10 +61,66 @@ async def drop_and_recreate():
         print("❌ Operation cancelled")
 
 
+def pending_migrations(conn: Connection) -> List[str]:
+    """DDL that brings tables created by an earlier version up to the models"""
+    inspector = inspect(conn)
+    statements = []
+    
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in columns:
+                continue
+            if table.name == "user_movie_ratings" and column.name == "liked":
+                statements.append(LIKED_COLUMN_DDL)
+            elif column.nullable:
+                # Constraints of new columns come with their indexes below
+                statements.append(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+                )
+            else:
+                raise RuntimeError(f"No migration for the new NOT NULL column {table.name}.{column.name}")
+        
+        # Rows per watch provider offer: (movie, provider) -> (movie, provider, country, type)
+        if table is movie_provider_association:
+            primary_key = inspector.get_pk_constraint(table.name)
+            if set(primary_key["constrained_columns"]) != set(table.primary_key.columns.keys()):
+                statements.extend(primary_key_ddl(conn, table, primary_key["name"]))
+        
+        # e.g. the keyset pagination indexes on movies
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                statements.append(str(CreateIndex(index).compile(dialect=conn.dialect)))
+    
+    return statements
+
+
+async def migrate_database():
+    """
+    Upgrade an existing database: create missing tables, then apply the
+    changes create_all skips for tables that already exist
+    """
+    print("🚀 Migrating database...")
+    async with db_manager.get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        statements = await conn.run_sync(pending_migrations)
+        for statement in statements:
+            print(f"   {statement}")
+            await conn.execute(text(statement))
+    
+    if statements:
+        print(f"✅ {len(statements)} schema changes applied")
+    else:
+        print("✅ Database schema is up to date")
+
+
 if __name__ == "__main__":
     import sys
     
     if len(sys.argv) > 1 and sys.argv[1] == "--reset":
         asyncio.run(drop_and_recreate())
+    elif len(sys.argv) > 1 and sys.argv[1] == "--migrate":
+        asyncio.run(migrate_database())
     else:
         asyncio.run(initialize_database())
\ No newline at end of file
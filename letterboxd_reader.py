@@ -0,0 +1,150 @@
+import csv
+import json
+import re
+from pathlib import Path
+from typing import Dict, Iterator, Optional, TextIO
+
+CHUNK_SIZE = 64 * 1024
+
+# letterboxd.com/film/<slug>/ and the diary form letterboxd.com/<user>/film/<slug>/
+FILM_URL = re.compile(r"letterboxd\.com/(?:[^/]+/)?film/([^/]+)")
+
+
+class ExportFormatError(ValueError):
+    """The export file is not a JSON array, JSON Lines or Letterboxd CSV"""
+
+
+def _iter_json_array(f: TextIO) -> Iterator[Dict]:
+    """
+    Yield the elements of a top-level JSON array one at a time.
+    
+    The file is read in CHUNK_SIZE pieces and each element is decoded with
+    `raw_decode` as soon as it is complete, so memory holds one element
+    plus one chunk regardless of the file size.
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith("["):
+        raise ExportFormatError("Expected a JSON array")
+    position = 1
+    eof = False
+    
+    while True:
+        # Skip whitespace and the separating comma
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            chunk = f.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+        
+        if position >= len(buffer):
+            raise ExportFormatError("Unterminated JSON array")
+        if buffer[position] == "]":
+            return
+        
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise ExportFormatError(f"Invalid JSON element: {e}") from e
+            # Element not complete yet: keep the tail and read more
+            chunk = f.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        
+        # A bare number or literal is only complete once a delimiter follows
+        # ("12" may be the start of "12.5")
+        if (
+            not eof
+            and not isinstance(element, (dict, list, str))
+            and (end == len(buffer) or buffer[end] not in " \t\r\n,]")
+        ):
+            chunk = f.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        
+        yield element
+        position = end
+        if position > CHUNK_SIZE:
+            buffer, position = buffer[position:], 0
+
+
+def _iter_json_lines(f: TextIO) -> Iterator[Dict]:
+    for number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ExportFormatError(f"Invalid JSON on line {number}: {e}") from e
+
+
+def _csv_entry(row: Dict[str, str]) -> Optional[Dict]:
+    """Map a ratings.csv / diary.csv / watched.csv row to an import entry"""
+    name = (row.get("Name") or "").strip()
+    if not name:
+        return None
+    year = (row.get("Year") or "").strip()
+    rating = (row.get("Rating") or "").strip()
+    url = (row.get("Letterboxd URI") or "").strip() or None
+    slug = FILM_URL.search(url) if url else None
+    return {
+        "title_year": f"{name} ({year})" if year else name,
+        "letterboxd_url": url,
+        "film_slug": slug.group(1) if slug else None,
+        "user_rating": float(rating) if rating else None,
+        "user_liked": False,
+        "watched_date": (row.get("Watched Date") or row.get("Date") or "").strip() or None,
+    }
+
+
+def _iter_csv(f: TextIO) -> Iterator[Dict]:
+    reader = csv.DictReader(f)
+    if not reader.fieldnames or "Name" not in reader.fieldnames:
+        raise ExportFormatError("CSV export without a Name column")
+    for row in reader:
+        entry = _csv_entry(row)
+        if entry is not None:
+            yield entry
+
+
+def read_entries(path: str | Path) -> Iterator[Dict]:
+    """
+    Stream import entries from a Letterboxd export.
+    
+    Supports a JSON array of entries, JSON Lines (one entry per line) and
+    the native Letterboxd CSV files (ratings.csv, diary.csv, watched.csv).
+    The format is chosen by extension, falling back to the first
+    non-whitespace character. Entries are yielded as they are parsed.
+    """
+    path = Path(path)
+    with open(path, "r", encoding="utf-8-sig", newline="" if path.suffix.lower() == ".csv" else None) as f:
+        if path.suffix.lower() == ".csv":
+            yield from _iter_csv(f)
+            return
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            yield from _iter_json_lines(f)
+            return
+        
+        # Sniff: '[' starts an array, '{' starts JSON Lines
+        first = ""
+        while not first:
+            character = f.read(1)
+            if not character:
+                return
+            if not character.isspace():
+                first = character
+        f.seek(0)
+        
+        if first == "[":
+            yield from _iter_json_array(f)
+        elif first == "{":
+            yield from _iter_json_lines(f)
+        else:
+            raise ExportFormatError(f"Unrecognized export format: {path.name}")
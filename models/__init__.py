@@ -23,6 +23,14 @@ from .production import ProductionCompany, ProductionCountry, SpokenLanguage
 from .provider import Provider
 from .video import Video, MovieReleaseDate
 from .ratings import UserMovieRating
+from .letterboxd import LetterboxdFilm, LetterboxdMatchReview
+from .sync_state import SyncState
+
+# Loading policy
+from .loading import MOVIE_LOADERS, movie_loader
+
+# Search indexes (PostgreSQL)
+from .search import SEARCH_DOCUMENT, TITLE_KEY, ORIGINAL_TITLE_KEY, SEARCH_SETUP_DDL, SEARCH_INDEX_DDL
 
 __all__ = [
     # Base Classes
@@ -53,4 +61,18 @@ __all__ = [
     "Video",
     "MovieReleaseDate",
     "UserMovieRating",
+    "LetterboxdFilm",
+    "LetterboxdMatchReview",
+    "SyncState",
+    
+    # Loading Policy
+    "MOVIE_LOADERS",
+    "movie_loader",
+    
+    # Search Indexes
+    "SEARCH_DOCUMENT",
+    "TITLE_KEY",
+    "ORIGINAL_TITLE_KEY",
+    "SEARCH_SETUP_DDL",
+    "SEARCH_INDEX_DDL",
 ]
\ No newline at end of file
@@ -49,8 +49,8 @@ movie_provider_association = Table(
     Base.metadata,
     Column('movie_id', Integer, ForeignKey('movies.id', ondelete='CASCADE'), primary_key=True),
     Column('provider_id', Integer, ForeignKey('providers.id', ondelete='CASCADE'), primary_key=True),
-    Column('country_code', String(2), nullable=False),
-    Column('type', String(20), nullable=False),  # 'flatrate', 'rent', 'buy'
+    Column('country_code', String(2), primary_key=True),
+    Column('type', String(20), primary_key=True),  # 'flatrate', 'rent', 'buy'
 )
 
 # Movie <-> Cast (Person)
@@ -25,7 +25,7 @@ class Collection(Base, TimestampMixin):
     movies: Mapped[List["Movie"]] = relationship(
         "Movie",
         back_populates="collection",
-        lazy="selectin",
+        lazy="raise",
     )
     
     def __repr__(self) -> str:
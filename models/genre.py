@@ -23,7 +23,7 @@ class Genre(Base, TimestampMixin):
         "Movie",
         secondary="movie_genre_association",
         back_populates="genres",
-        lazy="selectin",
+        lazy="raise",
     )
     
     def __repr__(self) -> str:
@@ -23,7 +23,7 @@ class Keyword(Base, TimestampMixin):
         "Movie",
         secondary="movie_keyword_association",
         back_populates="keywords",
-        lazy="selectin",
+        lazy="raise",
     )
     
     def __repr__(self) -> str:
@@ -0,0 +1,42 @@
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, String, Float, JSON
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base, TimestampMixin
+
+
+class LetterboxdFilm(Base, TimestampMixin):
+    """Letterboxd film -> TMDb movie mapping, resolved once and shared by all users"""
+    
+    __tablename__ = 'letterboxd_films'
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    letterboxd_id: Mapped[Optional[str]] = mapped_column(String(32), unique=True, nullable=True, index=True)
+    film_slug: Mapped[Optional[str]] = mapped_column(String(255), unique=True, nullable=True, index=True)
+    letterboxd_url: Mapped[Optional[str]] = mapped_column(String(255), unique=True, nullable=True, index=True)  # CSV exports
+    tmdb_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)  # TMDb id, the movie may not be saved yet
+    confidence: Mapped[float] = mapped_column(Float, nullable=False)  # 0-1
+    match_method: Mapped[str] = mapped_column(String(20), nullable=False)  # 'exact_year', 'near_year', ...
+    
+    def __repr__(self) -> str:
+        return f"<LetterboxdFilm(letterboxd_id='{self.letterboxd_id}', tmdb_id={self.tmdb_id}, confidence={self.confidence})>"
+
+
+class LetterboxdMatchReview(Base, TimestampMixin):
+    """Low-confidence Letterboxd -> TMDb match, queued for a manual decision instead of being imported"""
+    
+    __tablename__ = 'letterboxd_match_reviews'
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    letterboxd_id: Mapped[Optional[str]] = mapped_column(String(32), unique=True, nullable=True, index=True)
+    film_slug: Mapped[Optional[str]] = mapped_column(String(255), unique=True, nullable=True, index=True)
+    letterboxd_url: Mapped[Optional[str]] = mapped_column(String(255), unique=True, nullable=True, index=True)  # CSV exports
+    title: Mapped[str] = mapped_column(String(500), nullable=False)
+    year: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    tmdb_id: Mapped[int] = mapped_column(Integer, nullable=False)  # best candidate
+    confidence: Mapped[float] = mapped_column(Float, nullable=False)  # 0-1
+    candidates: Mapped[List[Dict]] = mapped_column(JSON, nullable=False)  # [{tmdb_id, title, year, score}], best first
+    
+    def __repr__(self) -> str:
+        return f"<LetterboxdMatchReview(title='{self.title}', year={self.year}, tmdb_id={self.tmdb_id}, confidence={self.confidence:.2f})>"
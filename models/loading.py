@@ -0,0 +1,61 @@
+from typing import Dict, Tuple
+
+from sqlalchemy.orm import load_only, raiseload, selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
+
+from .movie import Movie
+from .genre import Genre
+from .keyword import Keyword
+from .person import Person
+from .production import ProductionCompany
+
+
+# Named loader option sets for Movie queries.
+#
+# Reverse collections (Genre.movies, User.ratings, ...) are lazy="raise", so
+# loading a movie never fans out into the rest of the catalog. Callers pick
+# the set that matches what they render:
+#   card     - list/grid views: core columns + genres
+#   detail   - a single movie page: everything except user ratings
+#   features - recommender feature extraction: ids of related entities only
+MOVIE_LOADERS: Dict[str, Tuple[LoaderOption, ...]] = {
+    "card": (
+        load_only(
+            Movie.id, Movie.tmdb_id, Movie.title, Movie.release_date,
+            Movie.poster_path, Movie.vote_average, Movie.popularity,
+        ),
+        selectinload(Movie.genres),
+        raiseload("*"),
+    ),
+    "detail": (
+        selectinload(Movie.collection),
+        selectinload(Movie.genres),
+        selectinload(Movie.keywords),
+        selectinload(Movie.production_companies),
+        selectinload(Movie.production_countries),
+        selectinload(Movie.spoken_languages),
+        selectinload(Movie.providers),
+        selectinload(Movie.cast),
+        selectinload(Movie.crew),
+        selectinload(Movie.videos),
+        selectinload(Movie.release_dates),
+        raiseload("*"),
+    ),
+    "features": (
+        load_only(Movie.id, Movie.tmdb_id),
+        selectinload(Movie.genres).load_only(Genre.id),
+        selectinload(Movie.keywords).load_only(Keyword.id),
+        selectinload(Movie.production_companies).load_only(ProductionCompany.id),
+        selectinload(Movie.cast).load_only(Person.id),
+        selectinload(Movie.crew).load_only(Person.id),
+        raiseload("*"),
+    ),
+}
+
+
+def movie_loader(name: str) -> Tuple[LoaderOption, ...]:
+    """Loader options of a named set, for `select(Movie).options(*movie_loader("card"))`"""
+    try:
+        return MOVIE_LOADERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown movie loader set '{name}', expected one of {sorted(MOVIE_LOADERS)}")
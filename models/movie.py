@@ -1,7 +1,7 @@
 from typing import List, Optional
 from datetime import date
 
-from sqlalchemy import Integer, String, Text, Float, BigInteger, Date, Boolean, ForeignKey
+from sqlalchemy import Integer, String, Text, Float, BigInteger, Date, Boolean, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base, TimestampMixin
@@ -66,6 +66,8 @@ class Movie(Base, TimestampMixin):
     )
     
     # ==================== RELATIONSHIPS ====================
+    # Reverse collections (genre.movies, user.ratings, ...) are lazy="raise";
+    # request what you need with the loader sets in models/loading.py.
     
     # Collection
     collection: Mapped[Optional["Collection"]] = relationship(
@@ -159,7 +161,13 @@ class Movie(Base, TimestampMixin):
         "UserMovieRating",
         back_populates="movie",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        lazy="raise",
+    )
+    
+    # Keyset pagination of listings: ORDER BY (popularity, id) / (release_date, id)
+    __table_args__ = (
+        Index('ix_movies_popularity_id', 'popularity', 'id'),
+        Index('ix_movies_release_date_id', 'release_date', 'id'),
     )
     
     def __repr__(self) -> str:
@@ -35,6 +35,7 @@ class Person(Base, TimestampMixin):
         secondary="movie_cast_association",
         back_populates="cast",
         viewonly=True,
+        lazy="raise",
     )
     
     movies_as_crew: Mapped[List["Movie"]] = relationship(
@@ -42,6 +43,7 @@ class Person(Base, TimestampMixin):
         secondary="movie_crew_association",
         back_populates="crew",
         viewonly=True,
+        lazy="raise",
     )
     
     def __repr__(self) -> str:
@@ -25,7 +25,7 @@ class ProductionCompany(Base, TimestampMixin):
         "Movie",
         secondary="movie_company_association",
         back_populates="production_companies",
-        lazy="selectin",
+        lazy="raise",
     )
     
     def __repr__(self) -> str:
@@ -45,7 +45,7 @@ class ProductionCountry(Base, TimestampMixin):
         "Movie",
         secondary="movie_country_association",
         back_populates="production_countries",
-        lazy="selectin",
+        lazy="raise",
     )
     
     def __repr__(self) -> str:
@@ -66,7 +66,7 @@ class SpokenLanguage(Base, TimestampMixin):
         "Movie",
         secondary="movie_language_association",
         back_populates="spoken_languages",
-        lazy="selectin",
+        lazy="raise",
     )
     
     def __repr__(self) -> str:
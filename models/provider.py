@@ -25,6 +25,7 @@ class Provider(Base, TimestampMixin):
         secondary="movie_provider_association",
         back_populates="providers",
         viewonly=True,
+        lazy="raise",
     )
     
     def __repr__(self) -> str:
@@ -1,7 +1,7 @@
 from typing import TYPE_CHECKING
 from datetime import datetime
 
-from sqlalchemy import Integer, ForeignKey, CheckConstraint, UniqueConstraint
+from sqlalchemy import Integer, Boolean, ForeignKey, CheckConstraint, UniqueConstraint, false
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base, TimestampMixin
@@ -30,6 +30,12 @@ class UserMovieRating(Base, TimestampMixin):
         index=True,
     )
     rating: Mapped[int] = mapped_column(Integer, nullable=False)
+    liked: Mapped[bool] = mapped_column(
+        Boolean,
+        default=False,
+        server_default=false(),
+        nullable=False,
+    )  # Letterboxd "like" (heart), used as an implicit signal
     
     # Relationships
     user: Mapped["User"] = relationship("User", back_populates="ratings")
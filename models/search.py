@@ -0,0 +1,37 @@
+from sqlalchemy import DDL, event
+
+from .movie import Movie
+
+
+# PostgreSQL search indexes over movies (see movie_search.py).
+#
+# Queries must repeat these expressions verbatim for the planner to use the
+# indexes. Text is accent-folded with unaccent, which is only STABLE, so the
+# index expressions go through the IMMUTABLE wrapper f_unaccent.
+SEARCH_DOCUMENT = (
+    "to_tsvector('simple', f_unaccent("
+    "coalesce(title, '') || ' ' || coalesce(original_title, '') || ' ' || coalesce(overview, '')))"
+)
+TITLE_KEY = "f_unaccent(lower(title))"
+ORIGINAL_TITLE_KEY = "f_unaccent(lower(original_title))"
+
+SEARCH_SETUP_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+    "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$",
+)
+
+SEARCH_INDEX_DDL = (
+    f"CREATE INDEX IF NOT EXISTS ix_movies_search_document ON movies USING gin (({SEARCH_DOCUMENT}))",
+    f"CREATE INDEX IF NOT EXISTS ix_movies_title_trgm ON movies USING gin (({TITLE_KEY}) gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS ix_movies_original_title_trgm ON movies USING gin (({ORIGINAL_TITLE_KEY}) gin_trgm_ops)",
+)
+
+# Created with the movies table; `python3 movie_search.py --create-indexes`
+# adds them to an existing database
+for statement in SEARCH_SETUP_DDL:
+    event.listen(Movie.__table__, "before_create", DDL(statement).execute_if(dialect="postgresql"))
+for statement in SEARCH_INDEX_DDL:
+    event.listen(Movie.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
@@ -0,0 +1,19 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import String, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base, TimestampMixin
+
+
+class SyncState(Base, TimestampMixin):
+    """Watermark of an incremental sync job (e.g. the TMDb change feed)"""
+    
+    __tablename__ = 'sync_state'
+    
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    watermark: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)  # synced up to (UTC)
+    
+    def __repr__(self) -> str:
+        return f"<SyncState(name='{self.name}', watermark={self.watermark})>"
@@ -24,7 +24,7 @@ class User(Base, TimestampMixin):
         "UserMovieRating",
         back_populates="user",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        lazy="raise",
     )
     
     def __repr__(self) -> str:
@@ -0,0 +1,298 @@
+import asyncio
+import re
+import sys
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import ProgrammingError
+
+from database import db_manager
+from models import (
+    Movie,
+    ORIGINAL_TITLE_KEY,
+    SEARCH_DOCUMENT,
+    SEARCH_INDEX_DDL,
+    SEARCH_SETUP_DDL,
+    TITLE_KEY,
+)
+
+TOKEN = re.compile(r"\w+")
+
+# pg_trgm's default similarity threshold (the % operator)
+MIN_SIMILARITY = 0.3
+
+
+def normalize(value: Optional[str]) -> str:
+    """Accent-folded, lower-cased, whitespace-collapsed text"""
+    decomposed = unicodedata.normalize("NFKD", value or "")
+    folded = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(folded.lower().split())
+
+
+def trigrams(value: str) -> Set[str]:
+    """pg_trgm-style trigrams of normalized text: each word padded as '  word '"""
+    grams: Set[str] = set()
+    for word in TOKEN.findall(value):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    """Shared trigrams over all trigrams, as pg_trgm's similarity()"""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def prefix_tsquery(query: str) -> Optional[str]:
+    """'amelie poul' -> 'amelie & poul:*' (the last word may be incomplete)"""
+    words = TOKEN.findall(normalize(query))
+    if not words:
+        return None
+    return " & ".join(words[:-1] + [f"{words[-1]}:*"])
+
+
+@dataclass
+class SearchHit:
+    """A warehouse movie matching a search"""
+    movie_id: int
+    tmdb_id: int
+    title: str
+    original_title: str
+    year: Optional[int]
+    popularity: float
+    similarity: float  # trigram similarity of the closer of title / original title
+
+
+def _rank(hits: Iterable[SearchHit], year: Optional[int], limit: int) -> List[SearchHit]:
+    """Closest titles first, then the exact year, then the most popular"""
+    return sorted(hits, key=lambda hit: (-hit.similarity, hit.year != year, -hit.popularity))[:limit]
+
+
+class TitleIndex:
+    """
+    In-process search index for databases without PostgreSQL's search
+    indexes (SQLite in tests and local runs).
+    
+    Titles are indexed by trigram, and words of the title, original title
+    and overview by word, so it answers the same fuzzy and prefix queries
+    as the PostgreSQL indexes: a movie matches when a title is at least
+    MIN_SIMILARITY similar to the query or it contains every query word
+    (the last one as a prefix).
+    """
+    
+    def __init__(self):
+        self.movies: Dict[int, Tuple[int, str, str, Optional[int], float, Set[str], Set[str], Set[str]]] = {}
+        self.grams: Dict[str, Set[int]] = defaultdict(set)
+        self.words: Dict[str, Set[int]] = defaultdict(set)
+    
+    def __len__(self) -> int:
+        return len(self.movies)
+    
+    def add(self, rows: Iterable[Tuple]) -> None:
+        """Index (id, tmdb_id, title, original_title, overview, release_date, popularity) rows, replacing earlier versions"""
+        for movie_id, tmdb_id, title, original_title, overview, release_date, popularity in rows:
+            self.remove(movie_id)
+            title_grams = trigrams(normalize(title))
+            original_grams = trigrams(normalize(original_title))
+            words = set(TOKEN.findall(normalize(f"{title} {original_title or ''} {overview or ''}")))
+            self.movies[movie_id] = (
+                tmdb_id, title, original_title or title,
+                release_date.year if release_date else None,
+                popularity or 0.0, title_grams, original_grams, words,
+            )
+            for gram in title_grams | original_grams:
+                self.grams[gram].add(movie_id)
+            for word in words:
+                self.words[word].add(movie_id)
+    
+    def remove(self, movie_id: int) -> None:
+        """Drop a movie and its trigram / word postings"""
+        indexed = self.movies.pop(movie_id, None)
+        if indexed is None:
+            return
+        *_, title_grams, original_grams, words = indexed
+        for postings, keys in ((self.grams, title_grams | original_grams), (self.words, words)):
+            for key in keys:
+                ids = postings.get(key)
+                if ids is not None:
+                    ids.discard(movie_id)
+                    if not ids:
+                        del postings[key]
+    
+    def search(self, query: str, year: Optional[int] = None, limit: int = 10) -> List[SearchHit]:
+        key = normalize(query)
+        query_grams = trigrams(key)
+        
+        # Similarity >= MIN_SIMILARITY needs at least that share of the query's trigrams
+        counts = Counter()
+        for gram in query_grams:
+            counts.update(self.grams.get(gram, ()))
+        needed = MIN_SIMILARITY * len(query_grams)
+        candidates = {movie_id for movie_id, count in counts.items() if count >= needed}
+        
+        words = TOKEN.findall(key)
+        if words:
+            *complete, prefix = words
+            matching = [self.words.get(word, set()) for word in complete]
+            matching.append(set().union(*(ids for word, ids in self.words.items() if word.startswith(prefix))))
+            candidates |= set.intersection(*matching)
+        
+        hits = []
+        for movie_id in candidates:
+            tmdb_id, title, original_title, movie_year, popularity, title_grams, original_grams, _ = self.movies[movie_id]
+            if year is not None and (movie_year is None or abs(movie_year - year) > 1):
+                continue
+            score = max(similarity(query_grams, title_grams), similarity(query_grams, original_grams))
+            hits.append(SearchHit(movie_id, tmdb_id, title, original_title, movie_year, popularity, score))
+        return _rank(hits, year, limit)
+
+
+class MovieSearch:
+    """
+    Search of the movies in the warehouse by title, original title and
+    overview: accent- and case-insensitive, typo tolerant (trigram
+    similarity) and prefix aware (full-text with a prefix on the last word).
+    
+    On PostgreSQL it queries the GIN indexes of models/search.py; elsewhere
+    it builds a TitleIndex on first use and keeps it current through `add`,
+    a TMDbService save and update listener.
+    """
+    
+    CANDIDATES = 50  # rows fetched from PostgreSQL before ranking
+    
+    def __init__(self):
+        self._index: Optional[TitleIndex] = None
+        self._index_lock = asyncio.Lock()
+        self.enabled = True
+    
+    @staticmethod
+    def _on_postgres() -> bool:
+        return db_manager.get_engine().dialect.name == "postgresql"
+    
+    async def search(self, query: str, year: Optional[int] = None, limit: int = 10) -> List[SearchHit]:
+        """Best matches of `query`, within ±1 year of `year` when given"""
+        if not self.enabled or not normalize(query):
+            return []
+        if self._on_postgres():
+            return await self._search_postgres(query, year, limit)
+        index = await self._title_index()
+        return index.search(query, year, limit)
+    
+    async def _search_postgres(self, query: str, year: Optional[int], limit: int) -> List[SearchHit]:
+        matches = [f"{TITLE_KEY} % q.key", f"{ORIGINAL_TITLE_KEY} % q.key"]
+        params = {"query": query, "limit": max(limit, self.CANDIDATES)}
+        tsquery = prefix_tsquery(query)
+        if tsquery:
+            matches.append(f"{SEARCH_DOCUMENT} @@ to_tsquery('simple', f_unaccent(:tsquery))")
+            params["tsquery"] = tsquery
+        year_filter = ""
+        if year is not None:
+            year_filter = "AND release_date BETWEEN :year_start AND :year_end"
+            params["year_start"], params["year_end"] = date(year - 1, 1, 1), date(year + 1, 12, 31)
+        
+        stmt = text(f"""
+            SELECT id, tmdb_id, title, original_title, release_date, popularity,
+                   greatest(similarity({TITLE_KEY}, q.key), similarity({ORIGINAL_TITLE_KEY}, q.key)) AS score
+            FROM movies, (SELECT f_unaccent(lower(:query)) AS key) AS q
+            WHERE ({" OR ".join(matches)}) {year_filter}
+            ORDER BY score DESC, popularity DESC NULLS LAST
+            LIMIT :limit
+        """)
+        try:
+            async with db_manager.get_session() as session:
+                rows = (await session.execute(stmt, params)).all()
+        except ProgrammingError as e:
+            # Extensions / indexes missing in a database created before them
+            print(f"⚠️  local search disabled, run `python3 movie_search.py --create-indexes`: {e}")
+            self.enabled = False
+            return []
+        
+        hits = [
+            SearchHit(
+                movie_id, tmdb_id, title, original_title or title,
+                release_date.year if release_date else None, popularity or 0.0, float(score),
+            )
+            for movie_id, tmdb_id, title, original_title, release_date, popularity, score in rows
+        ]
+        return _rank(hits, year, limit)
+    
+    async def _title_index(self) -> TitleIndex:
+        async with self._index_lock:
+            if self._index is None:
+                index = TitleIndex()
+                async with db_manager.get_session() as session:
+                    result = await session.stream(self._rows().execution_options(yield_per=10_000))
+                    async for chunk in result.partitions():
+                        index.add(chunk)
+                self._index = index
+            return self._index
+    
+    @staticmethod
+    def _rows():
+        return select(
+            Movie.id, Movie.tmdb_id, Movie.title, Movie.original_title,
+            Movie.overview, Movie.release_date, Movie.popularity,
+        )
+    
+    async def add(self, movie_ids: List[int]) -> None:
+        """Index newly saved or updated movies (no-op on PostgreSQL or before the first search)"""
+        if self._index is None or self._on_postgres():
+            return
+        async with db_manager.get_session() as session:
+            result = await session.execute(self._rows().where(Movie.id.in_(movie_ids)))
+            self._index.add(result.all())
+
+
+# Shared by the importers and the API of a process
+local_search = MovieSearch()
+
+
+async def search_local(query: str, year: Optional[int] = None, limit: int = 10) -> List[SearchHit]:
+    """Search the warehouse's movies (see MovieSearch)"""
+    return await local_search.search(query, year, limit)
+
+
+async def create_search_indexes():
+    """Create the search extensions, function and indexes in an existing PostgreSQL database"""
+    async with db_manager.get_engine().begin() as conn:
+        if conn.dialect.name != "postgresql":
+            print(f"ℹ️  {conn.dialect.name}: جستجوی محلی از ایندکس درون حافظه استفاده می‌کند")
+            return
+        for statement in SEARCH_SETUP_DDL + SEARCH_INDEX_DDL:
+            await conn.execute(text(statement))
+    print("✅ ایندکس‌های جستجو ساخته شدند")
+
+
+async def main():
+    """Main function"""
+    args = sys.argv[1:]
+    if not args:
+        print("استفاده:")
+        print("  python3 movie_search.py <query> [year]")
+        print("  python3 movie_search.py --create-indexes")
+        return
+    
+    try:
+        if args[0] == "--create-indexes":
+            await create_search_indexes()
+            return
+        
+        year = int(args[1]) if len(args) > 1 else None
+        hits = await search_local(args[0], year)
+        if not hits:
+            print("❌ نتیجه‌ای پیدا نشد")
+        for hit in hits:
+            print(f"  {hit.similarity:.2f}  {hit.title} ({hit.year or 'N/A'})  tmdb={hit.tmdb_id}")
+    finally:
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,520 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import Table, bindparam, delete, func, select, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import dialect_insert
+from models import (
+    Movie, Video, MovieReleaseDate,
+    movie_genre_association, movie_keyword_association,
+    movie_company_association, movie_country_association,
+    movie_language_association, movie_provider_association,
+    movie_cast_association, movie_crew_association,
+)
+from reference_resolver import (
+    ReferenceResolver, ENTITY_SPECS, MAX_CAST, MAX_CREW,
+    movie_references, watch_providers,
+)
+
+# Errors raised by building rows from a malformed TMDb payload
+INVALID_PAYLOAD = (KeyError, TypeError, ValueError, AttributeError)
+
+
+@dataclass
+class MovieSaveResult:
+    """Outcome of saving one TMDb payload"""
+    
+    tmdb_id: int
+    title: str = ""
+    movie_id: Optional[int] = None
+    created: bool = False
+    changed: bool = False  # an existing movie was modified by update_movies
+    error: Optional[str] = None
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.movie_id is not None
+
+
+def movie_row(movie_data: Dict) -> Dict[str, Any]:
+    """Column values of the movies table for a TMDb detail payload"""
+    return {
+        "tmdb_id": movie_data["id"],
+        "imdb_id": movie_data.get("imdb_id") or None,
+        "title": movie_data["title"],
+        "original_title": movie_data.get("original_title") or movie_data["title"],
+        "original_language": movie_data.get("original_language"),
+        "overview": movie_data.get("overview"),
+        "tagline": movie_data.get("tagline"),
+        "status": movie_data.get("status"),
+        "release_date": datetime.strptime(movie_data["release_date"], "%Y-%m-%d").date()
+            if movie_data.get("release_date") else None,
+        "runtime": movie_data.get("runtime"),
+        "budget": movie_data.get("budget", 0),
+        "revenue": movie_data.get("revenue", 0),
+        "popularity": movie_data.get("popularity", 0.0),
+        "vote_average": movie_data.get("vote_average", 0.0),
+        "vote_count": movie_data.get("vote_count", 0),
+        "poster_path": movie_data.get("poster_path"),
+        "backdrop_path": movie_data.get("backdrop_path"),
+        "homepage": movie_data.get("homepage") or None,
+        "adult": movie_data.get("adult", False),
+        "video": movie_data.get("video", False),
+    }
+
+
+def video_rows(movie_id: int, movie_data: Dict) -> List[Dict[str, Any]]:
+    """Rows of the videos table for a TMDb detail payload"""
+    return [
+        {
+            "movie_id": movie_id,
+            "tmdb_video_id": video_data["id"],
+            "key": video_data["key"],
+            "site": video_data["site"],
+            "type": video_data["type"],
+            "name": video_data["name"],
+            "size": video_data.get("size"),
+            "official": video_data.get("official", False),
+        }
+        for video_data in (movie_data.get("videos") or {}).get("results") or []
+    ]
+
+
+def _comparable(value: Any) -> Any:
+    """Normalize a value so payload and database values compare equal"""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        # SQLite returns naive UTC datetimes, PostgreSQL aware ones
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _truncate(value: Optional[str], length: int) -> Optional[str]:
+    return value[:length] if value else value
+
+
+def cast_rows(movie_id: int, movie_data: Dict, people: Dict[int, int]) -> List[Dict[str, Any]]:
+    """Rows of movie_cast_association; `people` maps TMDb person id -> persons.id"""
+    return [
+        {
+            "movie_id": movie_id,
+            "person_id": people[cast_data["id"]],
+            "character_name": _truncate(cast_data.get("character"), 255),
+            "cast_order": cast_data.get("order"),
+            "credit_id": cast_data.get("credit_id"),
+        }
+        for cast_data in ((movie_data.get("credits") or {}).get("cast") or [])[:MAX_CAST]
+        if cast_data["id"] in people
+    ]
+
+
+def crew_rows(movie_id: int, movie_data: Dict, people: Dict[int, int]) -> List[Dict[str, Any]]:
+    """Rows of movie_crew_association; `people` maps TMDb person id -> persons.id"""
+    return [
+        {
+            "movie_id": movie_id,
+            "person_id": people[crew_data["id"]],
+            "department": _truncate(crew_data.get("department"), 100),
+            "job": _truncate(crew_data.get("job"), 100),
+            "credit_id": crew_data.get("credit_id"),
+        }
+        for crew_data in ((movie_data.get("credits") or {}).get("crew") or [])[:MAX_CREW]
+        if crew_data["id"] in people
+    ]
+
+
+def provider_rows(movie_id: int, movie_data: Dict, providers: Dict[int, int]) -> List[Dict[str, Any]]:
+    """Rows of movie_provider_association; `providers` maps TMDb provider id -> providers.id"""
+    rows = {}
+    for country_code, offer_type, provider in watch_providers(movie_data):
+        provider_id = providers.get(provider["provider_id"])
+        if provider_id is not None:
+            rows[(provider_id, country_code, offer_type)] = {
+                "movie_id": movie_id,
+                "provider_id": provider_id,
+                "country_code": country_code,
+                "type": offer_type,
+            }
+    return list(rows.values())
+
+
+def release_date_rows(movie_id: int, movie_data: Dict) -> List[Dict[str, Any]]:
+    """Rows of movie_release_dates from the appended release_dates response"""
+    rows = []
+    for country in (movie_data.get("release_dates") or {}).get("results") or []:
+        for release in country.get("release_dates") or []:
+            released_at = release.get("release_date")
+            rows.append({
+                "movie_id": movie_id,
+                "country_code": country["iso_3166_1"],
+                "release_date": datetime.fromisoformat(released_at.replace("Z", "+00:00"))
+                    if released_at else None,
+                "certification": _truncate(release.get("certification"), 20) or None,
+                "release_type": release.get("type"),
+            })
+    return rows
+
+
+class MovieWriter:
+    """
+    Writes batches of TMDb movie payloads in a single transaction.
+    
+    Reference entities are resolved once for the whole batch, movie rows are
+    inserted with one multi-row statement, and every association table is
+    filled with one executemany per batch. If a bulk statement fails, it is
+    retried movie by movie inside savepoints so only the offending payloads
+    are reported as failed; their partially written rows are removed.
+    """
+    
+    CHUNK_SIZE = 500
+    
+    # (entity type, association table, entity key column)
+    ASSOCIATIONS = (
+        ("genre", movie_genre_association, "genre_id"),
+        ("keyword", movie_keyword_association, "keyword_id"),
+        ("company", movie_company_association, "company_id"),
+        ("country", movie_country_association, "country_code"),
+        ("language", movie_language_association, "language_code"),
+    )
+    
+    def __init__(self, session: AsyncSession):
+        self.session = session
+    
+    async def _insert_movies(self, rows: List[Dict]) -> Dict[int, int]:
+        """Insert movie rows, skipping ones that already exist: tmdb_id -> id"""
+        inserted = {}
+        for start in range(0, len(rows), self.CHUNK_SIZE):
+            stmt = (
+                dialect_insert(self.session, Movie)
+                .values(rows[start:start + self.CHUNK_SIZE])
+                .on_conflict_do_nothing(index_elements=["tmdb_id"])
+                .returning(Movie.tmdb_id, Movie.id)
+            )
+            result = await self.session.execute(stmt)
+            inserted.update(result.all())
+        return inserted
+    
+    async def _insert_isolated(
+        self,
+        insert_rows,
+        rows_by_movie: Dict[int, List[Dict]],
+        results: Dict[int, MovieSaveResult],
+    ) -> None:
+        """
+        Run `insert_rows` over all rows at once, falling back to one savepoint
+        per movie when the batch fails so only bad payloads are marked failed.
+        """
+        rows = [row for movie_rows in rows_by_movie.values() for row in movie_rows]
+        if not rows:
+            return
+        
+        try:
+            async with self.session.begin_nested():
+                await insert_rows(rows)
+            return
+        except SQLAlchemyError:
+            pass
+        
+        for tmdb_id, movie_rows in rows_by_movie.items():
+            if not movie_rows:
+                continue
+            try:
+                async with self.session.begin_nested():
+                    await insert_rows(movie_rows)
+            except SQLAlchemyError as e:
+                results[tmdb_id].error = str(e.orig if hasattr(e, "orig") else e)
+    
+    async def save_movies(self, payloads: List[Dict]) -> List[MovieSaveResult]:
+        """Save TMDb detail payloads; returns one result per payload, in order"""
+        results: Dict[int, MovieSaveResult] = {}
+        batch: Dict[int, Dict] = {}
+        for movie_data in payloads:
+            tmdb_id = movie_data.get("id")
+            if tmdb_id not in results:
+                results[tmdb_id] = MovieSaveResult(tmdb_id=tmdb_id, title=movie_data.get("title", ""))
+                batch[tmdb_id] = movie_data
+        
+        # Movies already in the warehouse are reported, not rewritten
+        existing = await self.session.execute(
+            select(Movie.tmdb_id, Movie.id).where(Movie.tmdb_id.in_([i for i in batch if i is not None]))
+        )
+        for tmdb_id, movie_id in existing:
+            results[tmdb_id].movie_id = movie_id
+            del batch[tmdb_id]
+        
+        # Build movie rows in Python first so malformed payloads fail alone
+        rows = {}
+        for tmdb_id, movie_data in batch.items():
+            try:
+                rows[tmdb_id] = self._checked_row(movie_data)
+            except INVALID_PAYLOAD as e:
+                results[tmdb_id].error = f"invalid payload: {e!r}"
+        if not rows:
+            return [results[movie_data.get("id")] for movie_data in payloads]
+        
+        refs = await ReferenceResolver(self.session).resolve_all(batch[i] for i in rows)
+        collections = refs["collection"]
+        for tmdb_id, row in rows.items():
+            collection = batch[tmdb_id].get("belongs_to_collection")
+            row["collection_id"] = collections.get(collection["id"]) if collection else None
+        
+        movie_ids: Dict[int, int] = {}
+        
+        async def insert_movies(movie_rows):
+            movie_ids.update(await self._insert_movies(movie_rows))
+        
+        await self._insert_isolated(insert_movies, {i: [row] for i, row in rows.items()}, results)
+        
+        for tmdb_id in rows:
+            result = results[tmdb_id]
+            if result.error:
+                continue
+            if tmdb_id in movie_ids:
+                result.movie_id = movie_ids[tmdb_id]
+                result.created = True
+            else:
+                # Inserted by a concurrent writer between our SELECT and INSERT
+                existing = await self.session.execute(select(Movie.id).where(Movie.tmdb_id == tmdb_id))
+                result.movie_id = existing.scalar_one_or_none()
+        
+        created = {i: batch[i] for i in rows if results[i].created}
+        await self._write_children(created, refs, results)
+        
+        # Drop movies whose child rows could not be written
+        failed = [results[i].movie_id for i in created if results[i].error]
+        if failed:
+            await self.session.execute(delete(Movie).where(Movie.id.in_(failed)))
+            for tmdb_id in created:
+                if results[tmdb_id].error:
+                    results[tmdb_id].movie_id = None
+                    results[tmdb_id].created = False
+        
+        return [results[movie_data.get("id")] for movie_data in payloads]
+    
+    async def _write_children(
+        self,
+        created: Dict[int, Dict],
+        refs: Dict[str, Dict[Any, Any]],
+        results: Dict[int, MovieSaveResult],
+    ) -> None:
+        """Bulk insert association and detail rows of newly created movies"""
+        references = {tmdb_id: movie_references(movie_data) for tmdb_id, movie_data in created.items()}
+        
+        for kind, table, column in self.ASSOCIATIONS:
+            key = ENTITY_SPECS[kind].payload_key
+            rows_by_movie = {}
+            for tmdb_id, movie_refs in references.items():
+                ref_ids = {
+                    refs[kind][item[key]]
+                    for item in movie_refs[kind]
+                    if item[key] in refs[kind]
+                }
+                movie_id = results[tmdb_id].movie_id
+                rows_by_movie[tmdb_id] = [{"movie_id": movie_id, column: ref_id} for ref_id in ref_ids]
+            
+            await self._insert_isolated(
+                lambda rows, table=table: self.session.execute(table.insert(), rows),
+                rows_by_movie,
+                results,
+            )
+        
+        # Credits, watch providers and release dates: one statement per table
+        people, providers = refs["person"], refs["provider"]
+        detail_tables = (
+            (movie_cast_association, lambda movie_id, data: cast_rows(movie_id, data, people)),
+            (movie_crew_association, lambda movie_id, data: crew_rows(movie_id, data, people)),
+            (movie_provider_association, lambda movie_id, data: provider_rows(movie_id, data, providers)),
+            (MovieReleaseDate.__table__, release_date_rows),
+        )
+        for table, build_rows in detail_tables:
+            await self._insert_isolated(
+                lambda rows, table=table: self.session.execute(table.insert(), rows),
+                {
+                    tmdb_id: build_rows(results[tmdb_id].movie_id, movie_data)
+                    for tmdb_id, movie_data in created.items()
+                },
+                results,
+            )
+        
+        await self._insert_isolated(
+            lambda rows: self.session.execute(
+                dialect_insert(self.session, Video).on_conflict_do_nothing(), rows
+            ),
+            {
+                tmdb_id: video_rows(results[tmdb_id].movie_id, movie_data)
+                for tmdb_id, movie_data in created.items()
+            },
+            results,
+        )
+    
+    @classmethod
+    def _checked_row(cls, movie_data: Dict) -> Dict[str, Any]:
+        """
+        Movie row of a payload, after building every reference entity and
+        child row it implies; a malformed genre, credit, provider, release
+        date or video raises here and fails its movie, not the whole batch.
+        """
+        refs = {}
+        for kind, payloads in movie_references(movie_data).items():
+            spec = ENTITY_SPECS[kind]
+            refs[kind] = {spec.build(payload)[spec.key]: 0 for payload in payloads}
+        cls._child_rows(0, movie_data, refs)
+        return movie_row(movie_data)
+    
+    @classmethod
+    def _child_rows(cls, movie_id: int, movie_data: Dict, refs: Dict[str, Dict[Any, Any]]) -> Dict[Table, List[Dict]]:
+        """Rows of every child table of one movie, as `_write_children` would insert them"""
+        movie_refs = movie_references(movie_data)
+        rows: Dict[Table, List[Dict]] = {}
+        for kind, table, column in cls.ASSOCIATIONS:
+            key = ENTITY_SPECS[kind].payload_key
+            ref_ids = {refs[kind][item[key]] for item in movie_refs[kind] if item[key] in refs[kind]}
+            rows[table] = [{"movie_id": movie_id, column: ref_id} for ref_id in ref_ids]
+        
+        rows[movie_cast_association] = cast_rows(movie_id, movie_data, refs["person"])
+        rows[movie_crew_association] = crew_rows(movie_id, movie_data, refs["person"])
+        rows[movie_provider_association] = provider_rows(movie_id, movie_data, refs["provider"])
+        rows[MovieReleaseDate.__table__] = release_date_rows(movie_id, movie_data)
+        rows[Video.__table__] = video_rows(movie_id, movie_data)
+        return rows
+    
+    async def update_movies(self, payloads: List[Dict]) -> List[MovieSaveResult]:
+        """
+        Apply fresh TMDb payloads as diffs; returns one result per payload, in order.
+        
+        Movies not in the warehouse yet are inserted by `save_movies`. For the
+        others only columns whose value changed are updated, and every child
+        table is diffed against the payload: rows that disappeared are
+        deleted, new rows inserted and unchanged rows left alone, so a
+        refresh that changed nothing writes nothing. `changed` is set on the
+        results of modified movies.
+        """
+        results: Dict[int, MovieSaveResult] = {}
+        batch: Dict[int, Dict] = {}
+        for movie_data in payloads:
+            tmdb_id = movie_data.get("id")
+            if tmdb_id not in results:
+                results[tmdb_id] = MovieSaveResult(tmdb_id=tmdb_id, title=movie_data.get("title", ""))
+                batch[tmdb_id] = movie_data
+        
+        movies = Movie.__table__
+        existing = await self.session.execute(
+            select(movies).where(movies.c.tmdb_id.in_([i for i in batch if i is not None]))
+        )
+        current = {row.tmdb_id: row._mapping for row in existing}
+        
+        new = [movie_data for tmdb_id, movie_data in batch.items() if tmdb_id not in current]
+        if new:
+            for result in await self.save_movies(new):
+                results[result.tmdb_id] = result
+        
+        rows = {}
+        for tmdb_id, row in current.items():
+            results[tmdb_id].movie_id = row["id"]
+            try:
+                rows[tmdb_id] = self._checked_row(batch[tmdb_id])
+            except INVALID_PAYLOAD as e:
+                results[tmdb_id].error = f"invalid payload: {e!r}"
+        if not rows:
+            return [results[movie_data.get("id")] for movie_data in payloads]
+        
+        refs = await ReferenceResolver(self.session).resolve_all(batch[i] for i in rows)
+        collections = refs["collection"]
+        for tmdb_id, row in rows.items():
+            collection = batch[tmdb_id].get("belongs_to_collection")
+            row["collection_id"] = collections.get(collection["id"]) if collection else None
+        
+        async def apply(items):
+            changed = await self._apply_diffs(items, current, refs)
+            for tmdb_id, _, _ in items:
+                results[tmdb_id].changed = tmdb_id in changed
+        
+        await self._insert_isolated(
+            apply,
+            {tmdb_id: [(tmdb_id, batch[tmdb_id], row)] for tmdb_id, row in rows.items()},
+            results,
+        )
+        return [results[movie_data.get("id")] for movie_data in payloads]
+    
+    async def _apply_diffs(
+        self,
+        items: List[Tuple[int, Dict, Dict]],
+        current: Dict[int, Any],
+        refs: Dict[str, Dict[Any, Any]],
+    ) -> Set[int]:
+        """Update changed columns and child rows of (tmdb_id, payload, movie row) items; returns changed tmdb ids"""
+        movies = Movie.__table__
+        changed: Set[int] = set()
+        
+        # Movie columns: one executemany per set of changed columns
+        updates: Dict[Tuple[str, ...], List[Dict]] = defaultdict(list)
+        for tmdb_id, _, row in items:
+            old = current[tmdb_id]
+            diff = {column: value for column, value in row.items() if _comparable(old[column]) != _comparable(value)}
+            if diff:
+                changed.add(tmdb_id)
+                updates[tuple(sorted(diff))].append(
+                    {"_movie_id": old["id"], **{f"_{column}": value for column, value in diff.items()}}
+                )
+        for columns, params in updates.items():
+            await self.session.execute(
+                update(movies)
+                .where(movies.c.id == bindparam("_movie_id"))
+                .values({**{column: bindparam(f"_{column}") for column in columns}, "updated_at": func.now()}),
+                params,
+            )
+        
+        # Child tables: compare full rows per table for all movies at once
+        tmdb_ids = {current[tmdb_id]["id"]: tmdb_id for tmdb_id, _, _ in items}
+        wanted: Dict[Table, List[Dict]] = defaultdict(list)
+        for tmdb_id, movie_data, _ in items:
+            for table, table_rows in self._child_rows(current[tmdb_id]["id"], movie_data, refs).items():
+                wanted[table].extend(table_rows)
+        
+        for table, table_rows in wanted.items():
+            for movie_id in await self._diff_rows(table, list(tmdb_ids), table_rows):
+                changed.add(tmdb_ids[movie_id])
+        return changed
+    
+    async def _diff_rows(self, table: Table, movie_ids: List[int], rows: List[Dict]) -> Set[int]:
+        """
+        Make the child rows of `movie_ids` in `table` equal to `rows`.
+        
+        Rows are compared on their data columns (surrogate ids and
+        timestamps excluded); stale rows are deleted by primary key and
+        missing ones inserted. Returns the movie ids that had differences.
+        """
+        primary_key = list(table.primary_key.columns)
+        columns = [column for column in table.c if column.name not in ("id", "created_at", "updated_at")]
+        movie_position = len(primary_key) + [column.name for column in columns].index("movie_id")
+        
+        wanted: Dict[Tuple, Dict] = {}
+        for row in rows:
+            wanted.setdefault(tuple(_comparable(row[column.name]) for column in columns), row)
+        
+        existing = await self.session.execute(
+            select(*primary_key, *columns).where(table.c.movie_id.in_(movie_ids))
+        )
+        kept, stale, changed = set(), [], set()
+        for record in existing:
+            key = tuple(_comparable(value) for value in record[len(primary_key):])
+            if key in wanted and key not in kept:
+                kept.add(key)
+            else:
+                stale.append(tuple(record[:len(primary_key)]))
+                changed.add(record[movie_position])
+        missing = [row for key, row in wanted.items() if key not in kept]
+        
+        if stale:
+            if len(primary_key) == 1:
+                condition = primary_key[0].in_([key[0] for key in stale])
+            else:
+                condition = tuple_(*primary_key).in_(stale)
+            await self.session.execute(delete(table).where(condition))
+        if missing:
+            await self.session.execute(dialect_insert(self.session, table).on_conflict_do_nothing(), missing)
+            changed.update(row["movie_id"] for row in missing)
+        return changed
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter.
+    
+    Tokens refill continuously at `rate` per second up to `capacity`, so
+    short bursts run at full speed while the long-run average never exceeds
+    `rate`. Waiters are served in FIFO order.
+    """
+    
+    def __init__(self, rate: float, capacity: int):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate must be positive and capacity at least 1")
+        
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    def _refill(self, now: float) -> None:
+        """Add the tokens accrued since the last update"""
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+    
+    async def acquire(self, tokens: int = 1) -> None:
+        """Wait until `tokens` tokens are available and take them"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+    
+    def pause(self, seconds: float) -> None:
+        """
+        Stop handing out tokens for `seconds` and empty the bucket.
+        
+        Used when the server signals throttling, so every caller sharing the
+        bucket backs off together instead of each retrying on its own.
+        """
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated_at = max(now, self._paused_until)
@@ -0,0 +1,42 @@
+
+from .features import FeatureMatrix, build_feature_matrix, extend_feature_matrix
+from .neighbors import NeighborIndex, NeighborRefresher, connect_neighbor_refresher
+from .collaborative import RatingMatrix, ItemItemRecommender, load_rating_matrix
+from .als import ALSRecommender, load_interactions
+from .catalog import Catalog, load_catalog
+from .service import BlendWeights, RecommendationResult, RecommendationService, load_collaborative
+from .ann import AnnIndex, embed, overview_matrix
+
+__all__ = [
+    # Content Features
+    "FeatureMatrix",
+    "build_feature_matrix",
+    "extend_feature_matrix",
+    
+    # Similar Movies
+    "NeighborIndex",
+    "NeighborRefresher",
+    "connect_neighbor_refresher",
+    
+    # Collaborative Filtering
+    "RatingMatrix",
+    "ItemItemRecommender",
+    "load_rating_matrix",
+    
+    # Matrix Factorization
+    "ALSRecommender",
+    "load_interactions",
+    
+    # Hybrid Recommendations
+    "Catalog",
+    "load_catalog",
+    "BlendWeights",
+    "RecommendationResult",
+    "RecommendationService",
+    "load_collaborative",
+    
+    # Approximate Nearest Neighbors
+    "AnnIndex",
+    "embed",
+    "overview_matrix",
+]
@@ -0,0 +1,385 @@
+import asyncio
+import json
+import re
+import sys
+import zlib
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_settings
+from database import db_manager
+from models import Movie
+from .catalog import Catalog, load_catalog
+from .features import FeatureMatrix, build_feature_matrix, tfidf_matrix
+from .neighbors import BLOCK_CELLS
+
+settings = get_settings()
+
+FORMAT_VERSION = 1
+EMBEDDING_DIM = 128
+# Non-zeros per token in the sparse random projection
+PROJECTION_NONZEROS = 8
+# Share of the embedding coming from metadata vs overview text
+METADATA_WEIGHT = 0.8
+TEXT_WEIGHT = 0.6
+PQ_CENTROIDS = 256
+TOKEN_PATTERN = re.compile(r"[^\W\d_]{3,}")
+STOPWORDS = frozenset(
+    "the and for with his her their they this that from into after when who has have are was "
+    "been will its but not one two all out about him them she he what where which while over "
+    "film movie story life".split()
+)
+
+
+def overview_matrix(movie_ids: np.ndarray, overviews: dict) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """TF-IDF of overview words, rows aligned with movie_ids: (matrix, tokens)"""
+    vocabulary = {}
+    rows, cols = [], []
+    for row, movie_id in enumerate(movie_ids.tolist()):
+        words = {
+            word for word in TOKEN_PATTERN.findall((overviews.get(movie_id) or "").lower())
+            if word not in STOPWORDS
+        }
+        rows.extend([row] * len(words))
+        cols.extend(vocabulary.setdefault(f"word:{word}", len(vocabulary)) for word in words)
+    
+    matrix, _ = tfidf_matrix(
+        np.asarray(rows, dtype=np.int64),
+        np.asarray(cols, dtype=np.int64),
+        (len(movie_ids), len(vocabulary)),
+    )
+    return matrix, np.asarray(list(vocabulary), dtype=str)
+
+
+def random_projection(tokens: np.ndarray, dim: int) -> sparse.csr_matrix:
+    """
+    Sparse random projection (tokens x dim) derived from token hashes.
+    
+    Every token gets PROJECTION_NONZEROS random +-1 entries, so the same
+    token always projects the same way and nothing has to be stored.
+    """
+    hashes = np.fromiter(
+        (zlib.crc32(f"{token}#{i}".encode("utf-8")) for token in tokens for i in range(PROJECTION_NONZEROS)),
+        dtype=np.int64,
+        count=len(tokens) * PROJECTION_NONZEROS,
+    )
+    signs = np.where((hashes >> 24) & 1, 1.0, -1.0).astype(np.float32) / np.sqrt(PROJECTION_NONZEROS)
+    projection = sparse.csr_matrix(
+        (signs, (np.repeat(np.arange(len(tokens)), PROJECTION_NONZEROS), hashes % dim)),
+        shape=(len(tokens), dim),
+    )
+    projection.sum_duplicates()
+    return projection
+
+
+def embed(
+    features: FeatureMatrix,
+    overviews: Optional[Tuple[sparse.csr_matrix, np.ndarray]] = None,
+    dim: int = EMBEDDING_DIM,
+) -> np.ndarray:
+    """
+    Dense unit vectors (float32, rows aligned with features.movie_ids).
+    
+    The TF-IDF metadata matrix and the overview word matrix are reduced
+    with hash-derived sparse random projections, which preserve cosine
+    similarity in expectation (Johnson-Lindenstrauss) without a fitted
+    model.
+    """
+    vectors = (features.matrix @ random_projection(features.features, dim)).toarray() * METADATA_WEIGHT
+    if overviews is not None:
+        text, tokens = overviews
+        vectors += (text @ random_projection(tokens, dim)).toarray() * TEXT_WEIGHT
+    
+    vectors = vectors.astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _kmeans(data: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Lloyd's k-means (squared L2); empty clusters are reseeded from random points"""
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _assign(data, centroids)
+        counts = np.bincount(assignment, minlength=k)
+        members = sparse.csr_matrix(
+            (np.ones(len(data), dtype=np.float32), (assignment, np.arange(len(data)))),
+            shape=(k, len(data)),
+        )
+        sums = members @ data
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+    return centroids
+
+
+def _assign(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid per row, computed in blocks to bound memory"""
+    squared = (centroids ** 2).sum(axis=1)
+    block = max(1, BLOCK_CELLS // max(len(centroids), 1))
+    assignment = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), block):
+        distances = squared - 2 * (data[start:start + block] @ centroids.T)
+        assignment[start:start + block] = distances.argmin(axis=1)
+    return assignment
+
+
+class AnnIndex:
+    """
+    IVF-PQ approximate nearest-neighbor index over unit movie vectors.
+    
+    Vectors are clustered into `nlist` inverted lists (coarse k-means);
+    within a list each vector's residual is product-quantized into
+    `subspaces` one-byte codes. A query scores only the `nprobe` closest
+    lists, and for inner product the per-subspace lookup table is the same
+    for every list, so a candidate costs `subspaces` table reads. The best
+    `rerank` candidates are rescored exactly against float16 copies of the
+    vectors.
+    
+    Entries are stored in list order with their filter attributes (adult,
+    original language, release year), so filters are masks over the probed
+    slices. Every array is a memory-mapped .npy file.
+    """
+    
+    ARRAYS = (
+        "centroids", "codebooks", "list_offsets", "codes", "movie_ids", "vectors",
+        "adult", "languages", "years", "language_codes",
+    )
+    
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        codebooks: np.ndarray,
+        list_offsets: np.ndarray,
+        codes: np.ndarray,
+        movie_ids: np.ndarray,
+        vectors: np.ndarray,
+        adult: np.ndarray,
+        languages: np.ndarray,
+        years: np.ndarray,
+        language_codes: np.ndarray,
+    ):
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self.list_offsets = list_offsets
+        self.codes = codes
+        self.movie_ids = movie_ids
+        self.vectors = vectors
+        self.adult = adult
+        self.languages = languages
+        self.years = years
+        self.language_codes = language_codes
+        self._id_order: Optional[np.ndarray] = None
+    
+    def __len__(self) -> int:
+        return len(self.movie_ids)
+    
+    @property
+    def subspaces(self) -> int:
+        return self.codebooks.shape[0]
+    
+    @classmethod
+    def build(
+        cls,
+        movie_ids: np.ndarray,
+        vectors: np.ndarray,
+        catalog: Optional[Catalog] = None,
+        nlist: Optional[int] = None,
+        subspaces: int = 16,
+        iterations: int = 15,
+        sample_size: int = 100_000,
+        seed: int = 0,
+    ) -> "AnnIndex":
+        """Train the coarse and product quantizers on a sample and encode every vector"""
+        n, dim = vectors.shape
+        if dim % subspaces:
+            raise ValueError(f"Dimension {dim} is not divisible by {subspaces} subspaces")
+        rng = np.random.default_rng(seed)
+        nlist = nlist or int(np.clip(4 * np.sqrt(n), 1, 65_536))
+        sample = vectors[rng.choice(n, min(n, max(sample_size, nlist * 40)), replace=False)]
+        
+        centroids = _kmeans(sample, nlist, iterations, rng)
+        assignment = _assign(vectors, centroids)
+        residuals = vectors - centroids[assignment]
+        
+        sub_dim = dim // subspaces
+        sample_residuals = residuals[rng.choice(n, min(n, sample_size), replace=False)]
+        codebooks = np.zeros((subspaces, PQ_CENTROIDS, sub_dim), dtype=np.float32)
+        codes = np.empty((n, subspaces), dtype=np.uint8)
+        for j in range(subspaces):
+            part = slice(j * sub_dim, (j + 1) * sub_dim)
+            trained = _kmeans(sample_residuals[:, part], PQ_CENTROIDS, iterations, rng)
+            codebooks[j, :len(trained)] = trained
+            codes[:, j] = _assign(residuals[:, part], trained)
+        
+        order = np.argsort(assignment, kind="stable")
+        list_offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1)).astype(np.int64)
+        
+        if catalog is not None:
+            rows = catalog.rows_of(movie_ids)
+            known = rows >= 0
+            safe = np.maximum(rows, 0)
+            adult = np.where(known, catalog.adult[safe], False)
+            languages = np.where(known, catalog.languages[safe], -1).astype(np.int16)
+            years = np.where(known, catalog.years()[safe], 0).astype(np.int16)
+            language_codes = np.asarray(catalog.language_codes)
+        else:
+            adult = np.zeros(n, dtype=bool)
+            languages = np.full(n, -1, dtype=np.int16)
+            years = np.zeros(n, dtype=np.int16)
+            language_codes = np.empty(0, dtype=str)
+        
+        return cls(
+            centroids.astype(np.float32),
+            codebooks,
+            list_offsets,
+            codes[order],
+            np.asarray(movie_ids, dtype=np.int64)[order],
+            vectors[order].astype(np.float16),
+            adult[order],
+            languages[order],
+            years[order],
+            language_codes,
+        )
+    
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 10,
+        nprobe: int = 64,
+        rerank: int = 500,
+        adult: Optional[bool] = False,
+        languages: Optional[Iterable[str]] = None,
+        years: Optional[Tuple[int, int]] = None,
+        exclude_movie_ids: Iterable[int] = (),
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-k (movie_id, cosine) for a query vector.
+        
+        `adult=None` disables the adult filter; `years` is an inclusive
+        (first, last) range and excludes undated movies.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        coarse = self.centroids @ query
+        nprobe = min(nprobe, len(coarse))
+        probed = np.argpartition(-coarse, nprobe - 1)[:nprobe]
+        
+        starts, stops = self.list_offsets[probed], self.list_offsets[probed + 1]
+        lengths = stops - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        base = np.repeat(coarse[probed], lengths)
+        
+        keep = np.ones(len(positions), dtype=bool)
+        if adult is not None:
+            keep &= self.adult[positions] == adult
+        if languages is not None:
+            codes = np.flatnonzero(np.isin(self.language_codes, list(languages)))
+            keep &= np.isin(self.languages[positions], codes)
+        if years is not None:
+            candidate_years = self.years[positions]
+            keep &= (candidate_years >= years[0]) & (candidate_years <= years[1])
+        exclude = np.asarray(list(exclude_movie_ids), dtype=np.int64)
+        if len(exclude):
+            keep &= ~np.isin(self.movie_ids[positions], exclude)
+        positions, base = positions[keep], base[keep]
+        if len(positions) == 0:
+            return []
+        
+        # Inner product with a residual = sum of per-subspace table entries
+        table = np.einsum("skd,sd->sk", self.codebooks, query.reshape(self.subspaces, -1))
+        approximate = base + table[np.arange(self.subspaces), self.codes[positions]].sum(axis=1)
+        
+        shortlist = min(max(rerank, k), len(positions))
+        best = np.argpartition(-approximate, shortlist - 1)[:shortlist]
+        positions = positions[best]
+        if rerank:
+            scores = self.vectors[positions].astype(np.float32) @ query
+        else:
+            scores = approximate[best]
+        
+        k = min(k, len(positions))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.movie_ids[positions[i]]), float(scores[i])) for i in top]
+    
+    def similar(self, movie_id: int, k: int = 10, **filters) -> List[Tuple[int, float]]:
+        """Nearest movies to an indexed movie, using its stored vector"""
+        if self._id_order is None:
+            self._id_order = np.argsort(self.movie_ids)
+        sorted_ids = self.movie_ids[self._id_order]
+        index = int(np.searchsorted(sorted_ids, movie_id))
+        if index >= len(sorted_ids) or sorted_ids[index] != movie_id:
+            return []
+        
+        position = self._id_order[index]
+        exclude = list(filters.pop("exclude_movie_ids", ())) + [movie_id]
+        query = self.vectors[position].astype(np.float32)
+        return self.search(query, k, exclude_movie_ids=exclude, **filters)
+    
+    def save(self, directory: str | Path) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        with open(directory / "meta.json", "w") as f:
+            json.dump({"version": FORMAT_VERSION, "size": len(self), "nlist": len(self.centroids)}, f)
+    
+    @classmethod
+    def load(cls, directory: str | Path, mmap: bool = True) -> "AnnIndex":
+        directory = Path(directory)
+        with open(directory / "meta.json") as f:
+            meta = json.load(f)
+        if meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported ANN index format {meta['version']}")
+        
+        mode = "r" if mmap else None
+        return cls(*(np.load(directory / f"{name}.npy", mmap_mode=mode) for name in cls.ARRAYS))
+
+
+async def load_overviews(session: AsyncSession) -> dict:
+    """movie id -> overview, streamed as plain tuples"""
+    overviews = {}
+    result = await session.stream(
+        select(Movie.id, Movie.overview).where(Movie.overview.is_not(None)).execution_options(yield_per=10_000)
+    )
+    async for chunk in result.partitions(10_000):
+        overviews.update(chunk)
+    return overviews
+
+
+async def main():
+    """
+    python -m recommender.ann build               - embed the catalog and build the index
+    python -m recommender.ann similar <movie_id>  - query the saved index
+    """
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    
+    try:
+        if command == "build":
+            async with db_manager.get_session() as session:
+                features = await build_feature_matrix(session)
+                overviews = await load_overviews(session)
+                catalog = await load_catalog(session)
+            vectors = embed(features, overview_matrix(features.movie_ids, overviews))
+            index = await asyncio.to_thread(AnnIndex.build, features.movie_ids, vectors, catalog)
+            index.save(settings.ANN_DIR)
+            print(f"✅ ANN index built for {len(index)} movies ({len(index.centroids)} lists)")
+        elif command == "similar" and len(sys.argv) > 2:
+            index = AnnIndex.load(settings.ANN_DIR)
+            for movie_id, score in index.similar(int(sys.argv[2]), k=10):
+                print(f"  🎬 {movie_id}: {score:.3f}")
+        else:
+            print(main.__doc__)
+    finally:
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,276 @@
+import asyncio
+import json
+from datetime import date
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_settings
+from database import db_manager
+from models import Movie, movie_provider_association
+from reference_resolver import PROVIDER_TYPES
+
+settings = get_settings()
+
+STREAM_CHUNK_SIZE = 100_000
+FORMAT_VERSION = 1
+EPOCH = date(1970, 1, 1)
+# release_days value of movies without a release date
+NO_DATE = np.iinfo(np.int32).min
+# Bayesian average: votes needed before a movie's own average dominates
+PRIOR_MIN_VOTES = 100
+
+
+def country_key(country_code: str, provider_id: int) -> int:
+    """Pack (country, provider) into one sortable int64"""
+    code = country_code.upper()
+    return (ord(code[0]) << 40) | (ord(code[1]) << 32) | int(provider_id)
+
+
+def to_days(value: date) -> int:
+    return (value - EPOCH).days
+
+
+class Catalog:
+    """
+    Column store of the movie attributes ranking and filtering need.
+    
+    Every array is aligned with `movie_ids` (sorted movies.id), so a filter
+    is a boolean mask and a prior is a gather. Watch providers are stored
+    inverted: `provider_keys` (sorted country/provider keys) index into
+    `provider_rows` through `provider_indptr`, so "on Netflix in DE" is one
+    slice instead of a scan over all offers.
+    """
+    
+    ARRAYS = (
+        "movie_ids", "popularity", "vote_average", "vote_count", "release_days", "adult",
+        "languages", "language_codes", "provider_keys", "provider_indptr", "provider_rows",
+        "provider_types",
+    )
+    
+    def __init__(
+        self,
+        movie_ids: np.ndarray,
+        popularity: np.ndarray,
+        vote_average: np.ndarray,
+        vote_count: np.ndarray,
+        release_days: np.ndarray,
+        adult: np.ndarray,
+        languages: np.ndarray,
+        language_codes: np.ndarray,
+        provider_keys: np.ndarray,
+        provider_indptr: np.ndarray,
+        provider_rows: np.ndarray,
+        provider_types: np.ndarray,
+    ):
+        self.movie_ids = movie_ids
+        self.popularity = popularity
+        self.vote_average = vote_average
+        self.vote_count = vote_count
+        self.release_days = release_days
+        self.adult = adult
+        self.languages = languages
+        self.language_codes = language_codes
+        self.provider_keys = provider_keys
+        self.provider_indptr = provider_indptr
+        self.provider_rows = provider_rows
+        self.provider_types = provider_types
+        self._prior: Optional[np.ndarray] = None
+        self._popular_order: Optional[np.ndarray] = None
+    
+    def __len__(self) -> int:
+        return len(self.movie_ids)
+    
+    def rows_of(self, movie_ids: Iterable[int]) -> np.ndarray:
+        """Catalog rows of the given movie ids, -1 where missing"""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        if len(self.movie_ids) == 0:
+            return np.full(len(movie_ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.movie_ids, movie_ids), len(self.movie_ids) - 1)
+        return np.where(self.movie_ids[rows] == movie_ids, rows, -1)
+    
+    @property
+    def prior(self) -> np.ndarray:
+        """
+        Popularity prior in [0, 1]: the mean of the rank-normalized
+        Bayesian vote average and the rank-normalized popularity.
+        """
+        if self._prior is None:
+            votes = self.vote_count.astype(np.float64)
+            mean = float(np.average(self.vote_average, weights=votes)) if votes.sum() > 0 else 0.0
+            rating = (votes * self.vote_average + PRIOR_MIN_VOTES * mean) / (votes + PRIOR_MIN_VOTES)
+            
+            def ranks(values: np.ndarray) -> np.ndarray:
+                # Dense ranks, so ties (e.g. unvoted movies) share a value
+                unique, inverse = np.unique(values, return_inverse=True)
+                return (inverse / max(len(unique) - 1, 1)).astype(np.float32)
+            
+            self._prior = (ranks(rating) + ranks(self.popularity)) / 2
+        return self._prior
+    
+    @property
+    def popular_order(self) -> np.ndarray:
+        """Catalog rows by descending prior"""
+        if self._popular_order is None:
+            self._popular_order = np.argsort(-self.prior, kind="stable")
+        return self._popular_order
+    
+    def provider_mask(
+        self,
+        provider_ids: Iterable[int],
+        country_code: str,
+        types: Optional[Iterable[str]] = None,
+    ) -> np.ndarray:
+        """Movies offered by any of the providers (providers.id) in a country"""
+        mask = np.zeros(len(self), dtype=bool)
+        type_codes = None if types is None else [PROVIDER_TYPES.index(t) for t in types]
+        for provider_id in provider_ids:
+            key = country_key(country_code, provider_id)
+            position = int(np.searchsorted(self.provider_keys, key))
+            if position == len(self.provider_keys) or self.provider_keys[position] != key:
+                continue
+            start, stop = self.provider_indptr[position], self.provider_indptr[position + 1]
+            rows = self.provider_rows[start:stop]
+            if type_codes is not None:
+                rows = rows[np.isin(self.provider_types[start:stop], type_codes)]
+            mask[rows] = True
+        return mask
+    
+    def release_mask(self, after: Optional[date] = None, before: Optional[date] = None) -> np.ndarray:
+        """Movies released in [after, before]; undated movies never match"""
+        mask = self.release_days != NO_DATE
+        if after is not None:
+            mask &= self.release_days >= to_days(after)
+        if before is not None:
+            mask &= self.release_days <= to_days(before)
+        return mask
+    
+    def language_mask(self, language_codes: Iterable[str]) -> np.ndarray:
+        """Movies whose original language is one of the codes"""
+        codes = np.flatnonzero(np.isin(self.language_codes, list(language_codes)))
+        return np.isin(self.languages, codes)
+    
+    def years(self) -> np.ndarray:
+        """Release year per movie, 0 when undated"""
+        dated = self.release_days != NO_DATE
+        years = np.zeros(len(self), dtype=np.int16)
+        years[dated] = self.release_days[dated].astype("datetime64[D]").astype("datetime64[Y]").astype(int) + 1970
+        return years
+    
+    def save(self, directory: str | Path) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        with open(directory / "meta.json", "w") as f:
+            json.dump({"version": FORMAT_VERSION, "size": len(self)}, f)
+    
+    @classmethod
+    def load(cls, directory: str | Path, mmap: bool = True) -> "Catalog":
+        directory = Path(directory)
+        with open(directory / "meta.json") as f:
+            meta = json.load(f)
+        if meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog format {meta['version']}")
+        
+        mode = "r" if mmap else None
+        return cls(*(np.load(directory / f"{name}.npy", mmap_mode=mode) for name in cls.ARRAYS))
+
+
+async def _stream(session: AsyncSession, stmt) -> List[tuple]:
+    rows: List[tuple] = []
+    result = await session.stream(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE))
+    async for chunk in result.partitions(STREAM_CHUNK_SIZE):
+        rows.extend(chunk)
+    return rows
+
+
+def _provider_index(
+    movie_rows: np.ndarray,
+    keys: np.ndarray,
+    types: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Group offers by country/provider key: (keys, indptr, rows, types)"""
+    order = np.lexsort((movie_rows, keys))
+    keys, movie_rows, types = keys[order], movie_rows[order], types[order]
+    unique_keys, starts = np.unique(keys, return_index=True)
+    indptr = np.append(starts, len(keys)).astype(np.int64)
+    return unique_keys, indptr, movie_rows.astype(np.int32), types.astype(np.int8)
+
+
+async def load_catalog(session: AsyncSession) -> Catalog:
+    """Read movies and their watch providers into a Catalog with two queries"""
+    movies = await _stream(session, select(
+        Movie.id,
+        Movie.popularity,
+        Movie.vote_average,
+        Movie.vote_count,
+        Movie.release_date,
+        Movie.adult,
+        Movie.original_language,
+    ).order_by(Movie.id))
+    
+    columns = list(zip(*movies)) if movies else [()] * 7
+    movie_ids = np.asarray(columns[0], dtype=np.int64)
+    language_codes, languages = np.unique(
+        np.asarray([code or "" for code in columns[6]], dtype=str), return_inverse=True
+    )
+    catalog_columns = dict(
+        movie_ids=movie_ids,
+        popularity=np.asarray([value or 0.0 for value in columns[1]], dtype=np.float32),
+        vote_average=np.asarray([value or 0.0 for value in columns[2]], dtype=np.float32),
+        vote_count=np.asarray([value or 0 for value in columns[3]], dtype=np.int32),
+        release_days=np.asarray(
+            [to_days(value) if value else NO_DATE for value in columns[4]], dtype=np.int32
+        ),
+        adult=np.asarray(columns[5], dtype=bool),
+        languages=languages.astype(np.int16),
+        language_codes=language_codes,
+    )
+    
+    offers = await _stream(session, select(
+        movie_provider_association.c.movie_id,
+        movie_provider_association.c.provider_id,
+        movie_provider_association.c.country_code,
+        movie_provider_association.c.type,
+    ))
+    if offers:
+        offer_movies, provider_ids, countries, types = zip(*offers)
+        rows = np.searchsorted(movie_ids, np.asarray(offer_movies, dtype=np.int64))
+        keys = np.asarray(
+            [country_key(country, provider) for country, provider in zip(countries, provider_ids)],
+            dtype=np.int64,
+        )
+        type_codes = np.asarray(
+            [PROVIDER_TYPES.index(t) if t in PROVIDER_TYPES else -1 for t in types], dtype=np.int8
+        )
+        provider_index = _provider_index(rows, keys, type_codes)
+    else:
+        provider_index = (
+            np.empty(0, dtype=np.int64),
+            np.zeros(1, dtype=np.int64),
+            np.empty(0, dtype=np.int32),
+            np.empty(0, dtype=np.int8),
+        )
+    
+    return Catalog(**catalog_columns, **dict(zip(
+        ("provider_keys", "provider_indptr", "provider_rows", "provider_types"), provider_index
+    )))
+
+
+async def main():
+    """Snapshot the movie catalog into CATALOG_DIR"""
+    try:
+        async with db_manager.get_session() as session:
+            catalog = await load_catalog(session)
+        catalog.save(settings.CATALOG_DIR)
+        print(f"✅ Catalog saved: {len(catalog)} movies, {len(catalog.provider_rows)} provider offers")
+    finally:
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
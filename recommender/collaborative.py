@@ -0,0 +1,279 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_settings
+from database import db_manager
+from models import UserMovieRating
+from .neighbors import BLOCK_CELLS, top_k_rows
+
+settings = get_settings()
+
+STREAM_CHUNK_SIZE = 100_000
+FORMAT_VERSION = 1
+
+
+def _save_csr(directory: Path, name: str, matrix: sparse.csr_matrix) -> None:
+    index_dtype = np.int32 if matrix.nnz < np.iinfo(np.int32).max else np.int64
+    np.save(directory / f"{name}_data.npy", matrix.data.astype(np.float32))
+    np.save(directory / f"{name}_indices.npy", matrix.indices.astype(index_dtype))
+    np.save(directory / f"{name}_indptr.npy", matrix.indptr.astype(index_dtype))
+
+
+def _load_csr(directory: Path, name: str, shape: Tuple[int, int], mmap: bool) -> sparse.csr_matrix:
+    mode = "r" if mmap else None
+    return sparse.csr_matrix(
+        (
+            np.load(directory / f"{name}_data.npy", mmap_mode=mode),
+            np.load(directory / f"{name}_indices.npy", mmap_mode=mode),
+            np.load(directory / f"{name}_indptr.npy", mmap_mode=mode),
+        ),
+        shape=shape,
+        copy=False,
+    )
+
+
+class RatingMatrix:
+    """Sparse user x item matrix of ratings with the id maps of both axes"""
+    
+    def __init__(self, matrix: sparse.csr_matrix, user_ids: np.ndarray, movie_ids: np.ndarray):
+        self.matrix = matrix
+        self.user_ids = user_ids
+        self.movie_ids = movie_ids
+    
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.matrix.shape
+    
+    def user_row(self, user_id: int) -> Optional[int]:
+        row = int(np.searchsorted(self.user_ids, user_id))
+        if row < len(self.user_ids) and self.user_ids[row] == user_id:
+            return row
+        return None
+    
+    @classmethod
+    def from_triples(cls, users: np.ndarray, movies: np.ndarray, ratings: np.ndarray) -> "RatingMatrix":
+        user_ids, user_rows = np.unique(users, return_inverse=True)
+        movie_ids, movie_cols = np.unique(movies, return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (ratings.astype(np.float32), (user_rows, movie_cols)),
+            shape=(len(user_ids), len(movie_ids)),
+        )
+        return cls(matrix, user_ids, movie_ids)
+
+
+async def load_rating_matrix(session: AsyncSession) -> RatingMatrix:
+    """
+    Stream user_movie_ratings into a sparse matrix with one query.
+    
+    Rows arrive in chunks as plain tuples (no ORM objects) and are packed
+    into compact int32/float32 arrays, so memory stays at ~12 bytes per
+    rating plus the final CSR matrix.
+    """
+    users, movies, ratings = [], [], []
+    stmt = select(
+        UserMovieRating.user_id, UserMovieRating.movie_id, UserMovieRating.rating
+    ).execution_options(yield_per=STREAM_CHUNK_SIZE)
+    
+    result = await session.stream(stmt)
+    async for chunk in result.partitions(STREAM_CHUNK_SIZE):
+        triples = np.asarray(chunk, dtype=np.int32).reshape(-1, 3)
+        users.append(triples[:, 0])
+        movies.append(triples[:, 1])
+        ratings.append(triples[:, 2].astype(np.float32))
+    
+    if not users:
+        return RatingMatrix(
+            sparse.csr_matrix((0, 0), dtype=np.float32),
+            np.empty(0, dtype=np.int32),
+            np.empty(0, dtype=np.int32),
+        )
+    return RatingMatrix.from_triples(np.concatenate(users), np.concatenate(movies), np.concatenate(ratings))
+
+
+class ItemItemRecommender:
+    """
+    Item-item collaborative filtering over user ratings.
+    
+    Ratings are centered on each user's mean, item similarities are the
+    shrunk cosine of the centered columns, and only the top `neighbors`
+    similarities per item are kept (sparse `similarity`, items x items).
+    A user's score for item j is their mean plus the similarity-weighted
+    average of their centered ratings over j's neighbors they have rated.
+    """
+    
+    MODEL = "item_item"  # meta.json "model", see RecommendationService.load
+    
+    def __init__(
+        self,
+        ratings: RatingMatrix,
+        similarity: sparse.csr_matrix,
+        user_means: np.ndarray,
+    ):
+        self.ratings = ratings
+        self.similarity = similarity
+        self.user_means = user_means
+    
+    @property
+    def movie_ids(self) -> np.ndarray:
+        return self.ratings.movie_ids
+    
+    @property
+    def rated(self) -> sparse.csr_matrix:
+        return self.ratings.matrix
+    
+    def user_row(self, user_id: int) -> Optional[int]:
+        return self.ratings.user_row(user_id)
+    
+    @staticmethod
+    def _center(matrix: sparse.csr_matrix) -> Tuple[sparse.csr_matrix, np.ndarray]:
+        counts = np.diff(matrix.indptr)
+        sums = np.asarray(matrix.sum(axis=1)).ravel()
+        means = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0).astype(np.float32)
+        
+        centered = matrix.copy().astype(np.float32)
+        centered.data -= np.repeat(means, counts)
+        return centered, means
+    
+    @classmethod
+    def fit(cls, ratings: RatingMatrix, neighbors: int = 50, shrinkage: float = 10.0) -> "ItemItemRecommender":
+        """Compute top-N item neighbors in column blocks to bound memory"""
+        centered, means = cls._center(ratings.matrix)
+        n_items = ratings.shape[1]
+        
+        items = centered.T.tocsr()  # items x users
+        binary = items.copy()
+        binary.data[:] = 1.0
+        norms = np.sqrt(np.asarray(items.multiply(items).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        
+        users_by_item = centered.tocsc()
+        binary_by_item = users_by_item.copy()
+        binary_by_item.data[:] = 1.0
+        
+        block = max(1, BLOCK_CELLS // max(n_items, 1))
+        rows, cols, values = [], [], []
+        for start in range(0, n_items, block):
+            stop = min(start + block, n_items)
+            dots = (items[start:stop] @ users_by_item).toarray()
+            co_counts = (binary[start:stop] @ binary_by_item).toarray()
+            
+            similarity = dots / np.outer(norms[start:stop], norms)
+            similarity *= co_counts / (co_counts + shrinkage)
+            similarity[np.arange(stop - start), np.arange(start, stop)] = 0.0
+            similarity[similarity <= 0] = -np.inf
+            
+            top_cols, top_values = top_k_rows(similarity.astype(np.float32), neighbors)
+            keep = np.isfinite(top_values)
+            rows.append(np.repeat(np.arange(start, stop), keep.sum(axis=1)))
+            cols.append(top_cols[keep])
+            values.append(top_values[keep])
+        
+        similarity = sparse.csr_matrix(
+            (
+                np.concatenate(values) if values else np.empty(0, dtype=np.float32),
+                (
+                    np.concatenate(rows) if rows else np.empty(0, dtype=np.int64),
+                    np.concatenate(cols) if cols else np.empty(0, dtype=np.int64),
+                ),
+            ),
+            shape=(n_items, n_items),
+            dtype=np.float32,
+        )
+        return cls(ratings, similarity, means)
+    
+    def recommend(self, user_id: int, k: int = 10, exclude_rated: bool = True) -> List[Tuple[int, float]]:
+        """Top-k (movie_id, predicted rating) for a user"""
+        row = self.ratings.user_row(user_id)
+        if row is None:
+            return []
+        
+        scores = self.score_user(row)
+        if exclude_rated:
+            rated = self.ratings.matrix.indices[
+                self.ratings.matrix.indptr[row]:self.ratings.matrix.indptr[row + 1]
+            ]
+            scores[rated] = -np.inf
+        
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ratings.movie_ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+    
+    def score_user(self, row: int) -> np.ndarray:
+        """Predicted ratings of a user (matrix row) for every item; -inf if unscorable"""
+        matrix = self.ratings.matrix
+        start, stop = matrix.indptr[row], matrix.indptr[row + 1]
+        rated = matrix.indices[start:stop]
+        centered = matrix.data[start:stop] - self.user_means[row]
+        
+        neighbors = self.similarity[rated]
+        numerator = neighbors.T @ centered
+        denominator = np.asarray(abs(neighbors).sum(axis=0)).ravel()
+        
+        scores = np.full(matrix.shape[1], -np.inf, dtype=np.float32)
+        scorable = denominator > 0
+        scores[scorable] = self.user_means[row] + numerator[scorable] / denominator[scorable]
+        return scores
+    
+    def save(self, directory: str | Path) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        _save_csr(directory, "ratings", self.ratings.matrix)
+        _save_csr(directory, "similarity", self.similarity)
+        np.save(directory / "user_ids.npy", self.ratings.user_ids.astype(np.int64))
+        np.save(directory / "movie_ids.npy", self.ratings.movie_ids.astype(np.int64))
+        np.save(directory / "user_means.npy", self.user_means.astype(np.float32))
+        with open(directory / "meta.json", "w") as f:
+            json.dump({"version": FORMAT_VERSION, "model": self.MODEL, "shape": list(self.ratings.shape)}, f)
+    
+    @classmethod
+    def load(cls, directory: str | Path, mmap: bool = True) -> "ItemItemRecommender":
+        directory = Path(directory)
+        with open(directory / "meta.json") as f:
+            meta = json.load(f)
+        if meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported item-item model format {meta['version']}")
+        
+        n_users, n_items = meta["shape"]
+        mode = "r" if mmap else None
+        ratings = RatingMatrix(
+            _load_csr(directory, "ratings", (n_users, n_items), mmap),
+            np.load(directory / "user_ids.npy", mmap_mode=mode),
+            np.load(directory / "movie_ids.npy", mmap_mode=mode),
+        )
+        return cls(
+            ratings,
+            _load_csr(directory, "similarity", (n_items, n_items), mmap),
+            np.load(directory / "user_means.npy", mmap_mode=mode),
+        )
+
+
+async def main():
+    """Train the item-item model from user_movie_ratings and save it to ITEM_ITEM_DIR"""
+    try:
+        async with db_manager.get_session() as session:
+            ratings = await load_rating_matrix(session)
+        model = await asyncio.to_thread(ItemItemRecommender.fit, ratings)
+        model.save(settings.ITEM_ITEM_DIR)
+        print(f"✅ Item-item model: {ratings.shape[0]} users x {ratings.shape[1]} movies, "
+              f"{ratings.matrix.nnz} ratings")
+        
+        if len(sys.argv) > 1:
+            for movie_id, score in model.recommend(int(sys.argv[1]), k=10):
+                print(f"  🎬 {movie_id}: {score:.2f}")
+    finally:
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
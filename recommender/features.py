@@ -0,0 +1,297 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_settings
+from database import db_manager
+from models import (
+    Movie,
+    movie_genre_association,
+    movie_keyword_association,
+    movie_company_association,
+    movie_cast_association,
+    movie_crew_association,
+)
+
+settings = get_settings()
+
+# Only billed leads and key creative roles carry signal; extras and
+# technical crew would only add noise and bloat the vocabulary.
+MAX_CAST_ORDER = 10
+CREW_JOBS = (
+    "Director",
+    "Screenplay",
+    "Writer",
+    "Novel",
+    "Director of Photography",
+    "Original Music Composer",
+    "Producer",
+)
+
+# (feature prefix, association table, entity column, extra filter)
+FEATURE_SOURCES = (
+    ("genre", movie_genre_association, "genre_id", None),
+    ("keyword", movie_keyword_association, "keyword_id", None),
+    ("company", movie_company_association, "company_id", None),
+    ("cast", movie_cast_association, "person_id",
+        movie_cast_association.c.cast_order < MAX_CAST_ORDER),
+    ("crew", movie_crew_association, "person_id",
+        movie_crew_association.c.job.in_(CREW_JOBS)),
+)
+
+STREAM_CHUNK_SIZE = 50_000
+FORMAT_VERSION = 1
+
+
+class FeatureMatrix:
+    """
+    TF-IDF weighted movie x feature matrix (SciPy CSR) with id maps.
+    
+    Rows are movies (sorted by movies.id), columns are tokens such as
+    "genre:18" or "cast:287". Rows are L2-normalized, so the dot product of
+    two rows is their cosine similarity.
+    """
+    
+    def __init__(
+        self,
+        matrix: sparse.csr_matrix,
+        movie_ids: np.ndarray,
+        features: np.ndarray,
+        idf: np.ndarray,
+    ):
+        self.matrix = matrix
+        self.movie_ids = movie_ids
+        self.features = features
+        self.idf = idf
+    
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.matrix.shape
+    
+    def row_of(self, movie_id: int) -> Optional[int]:
+        """Row index of a movie, or None when it is not in the matrix"""
+        row = int(np.searchsorted(self.movie_ids, movie_id))
+        if row < len(self.movie_ids) and self.movie_ids[row] == movie_id:
+            return row
+        return None
+    
+    def similar(self, movie_id: int, k: int = 10) -> List[Tuple[int, float]]:
+        """Top-k (movie_id, cosine) most similar movies, via one sparse product"""
+        row = self.row_of(movie_id)
+        if row is None:
+            return []
+        
+        scores = (self.matrix @ self.matrix[row].T).toarray().ravel()
+        scores[row] = -np.inf
+        
+        k = min(k, len(scores) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.movie_ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+    
+    def save(self, directory: str | Path) -> None:
+        """Persist as raw .npy arrays so `load` can memory-map them"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        
+        # SciPy downcasts index arrays to int32 when they fit, which would
+        # copy a memory-mapped int64 array on load
+        index_dtype = np.int32 if self.matrix.nnz < np.iinfo(np.int32).max else np.int64
+        np.save(directory / "data.npy", self.matrix.data.astype(np.float32))
+        np.save(directory / "indices.npy", self.matrix.indices.astype(index_dtype))
+        np.save(directory / "indptr.npy", self.matrix.indptr.astype(index_dtype))
+        np.save(directory / "movie_ids.npy", self.movie_ids.astype(np.int64))
+        np.save(directory / "features.npy", self.features.astype(str))
+        np.save(directory / "idf.npy", self.idf.astype(np.float32))
+        with open(directory / "meta.json", "w") as f:
+            json.dump({"version": FORMAT_VERSION, "shape": list(self.shape)}, f)
+    
+    @classmethod
+    def load(cls, directory: str | Path, mmap: bool = True) -> "FeatureMatrix":
+        """Load a saved matrix; with mmap the arrays are paged in on demand"""
+        directory = Path(directory)
+        with open(directory / "meta.json") as f:
+            meta = json.load(f)
+        if meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported feature matrix format {meta['version']}")
+        
+        mode = "r" if mmap else None
+        matrix = sparse.csr_matrix(
+            (
+                np.load(directory / "data.npy", mmap_mode=mode),
+                np.load(directory / "indices.npy", mmap_mode=mode),
+                np.load(directory / "indptr.npy", mmap_mode=mode),
+            ),
+            shape=tuple(meta["shape"]),
+            copy=False,
+        )
+        return cls(
+            matrix,
+            np.load(directory / "movie_ids.npy", mmap_mode=mode),
+            np.load(directory / "features.npy"),
+            np.load(directory / "idf.npy"),
+        )
+
+
+def tfidf_matrix(
+    rows: np.ndarray,
+    cols: np.ndarray,
+    shape: Tuple[int, int],
+    idf: Optional[np.ndarray] = None,
+) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """
+    Binary occurrence matrix from (row, col) pairs, weighted by smoothed IDF
+    and L2-normalized per row. Returns (matrix, idf).
+    """
+    counts = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+        shape=shape,
+    )
+    counts.sum_duplicates()
+    counts.data[:] = 1.0
+    
+    if idf is None:
+        document_frequency = np.bincount(counts.indices, minlength=shape[1])
+        idf = (np.log((1 + shape[0]) / (1 + document_frequency)) + 1).astype(np.float32)
+    
+    weighted = counts.multiply(idf[np.newaxis, :]).tocsr()
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    weighted = sparse.diags(1 / norms).astype(np.float32) @ weighted
+    return weighted.tocsr(), idf
+
+
+async def _stream_pairs(session: AsyncSession, stmt) -> Tuple[np.ndarray, np.ndarray]:
+    """Stream (movie_id, entity_id) pairs into two int64 arrays without ORM objects"""
+    movie_ids: List[np.ndarray] = []
+    entity_ids: List[np.ndarray] = []
+    
+    result = await session.stream(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE))
+    async for chunk in result.partitions(STREAM_CHUNK_SIZE):
+        pairs = np.asarray(chunk, dtype=np.int64).reshape(-1, 2)
+        movie_ids.append(pairs[:, 0])
+        entity_ids.append(pairs[:, 1])
+    
+    if not movie_ids:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(movie_ids), np.concatenate(entity_ids)
+
+
+def _source_statement(table, column: str, condition, movie_ids=None):
+    stmt = select(table.c.movie_id, table.c[column])
+    if condition is not None:
+        stmt = stmt.where(condition)
+    if movie_ids is not None:
+        stmt = stmt.where(table.c.movie_id.in_(movie_ids))
+    return stmt
+
+
+async def build_feature_matrix(session: AsyncSession) -> FeatureMatrix:
+    """Read the catalog and its associations and build the TF-IDF matrix"""
+    result = await session.execute(select(Movie.id).order_by(Movie.id))
+    movie_ids = np.asarray(result.scalars().all(), dtype=np.int64)
+    
+    rows, cols, features = [], [], []
+    for prefix, table, column, condition in FEATURE_SOURCES:
+        pair_movies, pair_entities = await _stream_pairs(
+            session, _source_statement(table, column, condition)
+        )
+        entities, entity_cols = np.unique(pair_entities, return_inverse=True)
+        
+        rows.append(np.searchsorted(movie_ids, pair_movies))
+        cols.append(entity_cols + len(features))
+        features.extend(f"{prefix}:{entity_id}" for entity_id in entities)
+    
+    matrix, idf = tfidf_matrix(
+        np.concatenate(rows) if rows else np.empty(0, dtype=np.int64),
+        np.concatenate(cols) if cols else np.empty(0, dtype=np.int64),
+        (len(movie_ids), len(features)),
+    )
+    return FeatureMatrix(matrix, movie_ids, np.asarray(features, dtype=str), idf)
+
+
+async def extend_feature_matrix(
+    session: AsyncSession,
+    features: FeatureMatrix,
+    movie_ids: List[int],
+) -> FeatureMatrix:
+    """
+    Add rows for new movies without rebuilding the whole matrix.
+    
+    Existing IDF weights are kept; tokens first seen on the new movies get
+    the IDF of a feature occurring once. A periodic full rebuild refreshes
+    the weights of the whole catalog.
+    """
+    new_ids = np.setdiff1d(np.asarray(movie_ids, dtype=np.int64), features.movie_ids)
+    if len(new_ids) == 0:
+        return features
+    
+    vocabulary: Dict[str, int] = {token: col for col, token in enumerate(features.features)}
+    tokens = list(features.features)
+    n_movies = len(features.movie_ids) + len(new_ids)
+    new_idf = np.float32(np.log((1 + n_movies) / 2) + 1)
+    extra_idf: List[float] = []
+    
+    rows, cols = [], []
+    for prefix, table, column, condition in FEATURE_SOURCES:
+        for start in range(0, len(new_ids), 1000):
+            chunk = new_ids[start:start + 1000].tolist()
+            pair_movies, pair_entities = await _stream_pairs(
+                session, _source_statement(table, column, condition, chunk)
+            )
+            for movie_id, entity_id in zip(pair_movies.tolist(), pair_entities.tolist()):
+                token = f"{prefix}:{entity_id}"
+                if token not in vocabulary:
+                    vocabulary[token] = len(tokens)
+                    tokens.append(token)
+                    extra_idf.append(new_idf)
+                rows.append(int(np.searchsorted(new_ids, movie_id)))
+                cols.append(vocabulary[token])
+    
+    idf = np.concatenate([features.idf, np.asarray(extra_idf, dtype=np.float32)])
+    new_matrix, _ = tfidf_matrix(
+        np.asarray(rows, dtype=np.int64),
+        np.asarray(cols, dtype=np.int64),
+        (len(new_ids), len(tokens)),
+        idf=idf,
+    )
+    old = features.matrix
+    old_matrix = sparse.csr_matrix(
+        (old.data, old.indices, old.indptr),
+        shape=(old.shape[0], len(tokens)),
+    )
+    
+    matrix = sparse.vstack([old_matrix, new_matrix], format="csr")
+    ids = np.concatenate([features.movie_ids, new_ids])
+    order = np.argsort(ids, kind="stable")
+    if np.any(order != np.arange(len(ids))):
+        matrix, ids = matrix[order], ids[order]
+    
+    return FeatureMatrix(matrix, ids, np.asarray(tokens, dtype=str), idf)
+
+
+async def main():
+    """Build the feature matrix and save it to FEATURES_DIR (or argv[1])"""
+    output = sys.argv[1] if len(sys.argv) > 1 else settings.FEATURES_DIR
+    
+    try:
+        async with db_manager.get_session() as session:
+            features = await build_feature_matrix(session)
+        features.save(output)
+        print(f"✅ Feature matrix {features.shape[0]} x {features.shape[1]} "
+              f"({features.matrix.nnz} non-zeros) saved to {output}")
+    finally:
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,268 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from config import get_settings
+from database import db_manager
+from models import Movie
+from .features import FeatureMatrix, build_feature_matrix, extend_feature_matrix
+
+settings = get_settings()
+
+DEFAULT_K = 50
+# Cells of the dense similarity block computed at once (float32 => 128 MB)
+BLOCK_CELLS = 32 * 1024 * 1024
+FORMAT_VERSION = 1
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of the k best scores per row, best first"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return (np.empty((scores.shape[0], 0), dtype=np.int64),
+                np.empty((scores.shape[0], 0), dtype=np.float32))
+    
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-values, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+class NeighborIndex:
+    """
+    Precomputed top-K content neighbors per movie.
+    
+    `neighbor_ids[i]` holds the movie ids most similar to `movie_ids[i]`
+    (cosine over the feature matrix), best first, padded with -1. Arrays are
+    saved as .npy files and memory-mapped, so "more like this" is a binary
+    search plus one row read.
+    """
+    
+    def __init__(self, movie_ids: np.ndarray, neighbor_ids: np.ndarray, scores: np.ndarray):
+        self.movie_ids = movie_ids
+        self.neighbor_ids = neighbor_ids
+        self.scores = scores
+    
+    @property
+    def k(self) -> int:
+        return self.neighbor_ids.shape[1]
+    
+    def __len__(self) -> int:
+        return len(self.movie_ids)
+    
+    @classmethod
+    def build(cls, features: FeatureMatrix, k: int = DEFAULT_K) -> "NeighborIndex":
+        """Full O(n^2) rebuild, computed in row blocks to bound memory"""
+        n = features.shape[0]
+        matrix = features.matrix
+        transposed = matrix.T.tocsc()
+        block = max(1, BLOCK_CELLS // max(n, 1))
+        
+        neighbor_rows = np.full((n, k), -1, dtype=np.int64)
+        scores = np.full((n, k), -np.inf, dtype=np.float32)
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            similarity = (matrix[start:stop] @ transposed).toarray()
+            similarity[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+            
+            cols, values = top_k_rows(similarity, k)
+            neighbor_rows[start:stop, :cols.shape[1]] = cols
+            scores[start:stop, :values.shape[1]] = values
+        
+        neighbor_ids = np.where(
+            np.isfinite(scores), features.movie_ids[np.maximum(neighbor_rows, 0)], -1
+        )
+        return cls(features.movie_ids.copy(), neighbor_ids, scores)
+    
+    def lookup(self, movie_id: int, k: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(movie_id, cosine) of the nearest neighbors of a movie"""
+        row = int(np.searchsorted(self.movie_ids, movie_id))
+        if row >= len(self.movie_ids) or self.movie_ids[row] != movie_id:
+            return []
+        
+        ids, scores = self.neighbor_ids[row, :k], self.scores[row, :k]
+        return [(int(i), float(s)) for i, s in zip(ids, scores) if i >= 0 and s > 0]
+    
+    def refresh(self, features: FeatureMatrix, new_movie_ids: List[int]) -> None:
+        """
+        Add new movies without a full rebuild.
+        
+        Only the new rows are scored against the catalog (O(new x n)); the
+        existing rows whose K-th neighbor is beaten by a new movie merge it
+        into their list, everything else is left untouched.
+        """
+        new_ids = np.setdiff1d(np.asarray(new_movie_ids, dtype=np.int64), self.movie_ids)
+        new_ids = new_ids[np.isin(new_ids, features.movie_ids)]
+        if len(new_ids) == 0:
+            return
+        
+        matrix = features.matrix
+        transposed = matrix.T.tocsc()
+        new_rows = np.searchsorted(features.movie_ids, new_ids)
+        existing_rows = np.searchsorted(features.movie_ids, self.movie_ids)
+        existing_rows = np.minimum(existing_rows, len(features.movie_ids) - 1)
+        present = np.flatnonzero(features.movie_ids[existing_rows] == self.movie_ids)
+        
+        neighbor_ids = np.array(self.neighbor_ids)
+        scores = np.array(self.scores)
+        new_neighbors = np.full((len(new_ids), self.k), -1, dtype=np.int64)
+        new_scores = np.full((len(new_ids), self.k), -np.inf, dtype=np.float32)
+        
+        block = max(1, BLOCK_CELLS // features.shape[0])
+        for start in range(0, len(new_ids), block):
+            stop = min(start + block, len(new_ids))
+            rows = new_rows[start:stop]
+            similarity = (matrix[rows] @ transposed).toarray()
+            similarity[np.arange(len(rows)), rows] = -np.inf
+            
+            # Neighbor lists of the new movies
+            cols, values = top_k_rows(similarity, self.k)
+            new_neighbors[start:stop, :cols.shape[1]] = features.movie_ids[cols]
+            new_scores[start:stop, :values.shape[1]] = values
+            
+            # Existing lists whose K-th neighbor a new movie beats
+            candidates = similarity[:, existing_rows[present]].T
+            beats = candidates.max(axis=1) > scores[present, -1]
+            displaced, candidates = present[beats], candidates[beats]
+            if len(displaced) == 0:
+                continue
+            
+            merged_scores = np.hstack([scores[displaced], candidates])
+            merged_ids = np.hstack([
+                neighbor_ids[displaced],
+                np.broadcast_to(new_ids[start:stop], candidates.shape),
+            ])
+            cols, values = top_k_rows(merged_scores, self.k)
+            neighbor_ids[displaced] = np.take_along_axis(merged_ids, cols, axis=1)
+            scores[displaced] = values
+        
+        new_neighbors[~np.isfinite(new_scores)] = -1
+        neighbor_ids[~np.isfinite(scores)] = -1
+        
+        movie_ids = np.concatenate([self.movie_ids, new_ids])
+        order = np.argsort(movie_ids, kind="stable")
+        self.movie_ids = movie_ids[order]
+        self.neighbor_ids = np.vstack([neighbor_ids, new_neighbors])[order]
+        self.scores = np.vstack([scores, new_scores])[order]
+    
+    def save(self, directory: str | Path) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "movie_ids.npy", self.movie_ids.astype(np.int64))
+        np.save(directory / "neighbor_ids.npy", self.neighbor_ids.astype(np.int64))
+        np.save(directory / "scores.npy", self.scores.astype(np.float32))
+        with open(directory / "meta.json", "w") as f:
+            json.dump({"version": FORMAT_VERSION, "k": self.k, "size": len(self)}, f)
+    
+    @classmethod
+    def load(cls, directory: str | Path, mmap: bool = True) -> "NeighborIndex":
+        directory = Path(directory)
+        with open(directory / "meta.json") as f:
+            meta = json.load(f)
+        if meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported neighbor index format {meta['version']}")
+        
+        mode = "r" if mmap else None
+        return cls(
+            np.load(directory / "movie_ids.npy", mmap_mode=mode),
+            np.load(directory / "neighbor_ids.npy", mmap_mode=mode),
+            np.load(directory / "scores.npy", mmap_mode=mode),
+        )
+
+
+class NeighborRefresher:
+    """
+    Save listener for TMDbService that keeps the saved feature matrix and
+    neighbor index current.
+    
+    New movie ids are buffered and applied in batches, because every refresh
+    rewrites the index files; call `flush()` when an import finishes.
+    """
+    
+    def __init__(
+        self,
+        features_dir: str | Path = None,
+        index_dir: str | Path = None,
+        batch_size: int = 500,
+    ):
+        self.features_dir = Path(features_dir or settings.FEATURES_DIR)
+        self.index_dir = Path(index_dir or settings.NEIGHBORS_DIR)
+        self.batch_size = batch_size
+        self.pending: List[int] = []
+    
+    def connect(self, service: Any) -> "NeighborRefresher":
+        """Refresh on the saves of a TMDbService"""
+        if self not in service.save_listeners:
+            service.save_listeners.append(self)
+        return self
+    
+    async def __call__(self, movie_ids: List[int]) -> None:
+        self.pending.extend(movie_ids)
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+    
+    async def flush(self) -> None:
+        if not self.pending:
+            return
+        movie_ids, self.pending = self.pending, []
+        
+        features = FeatureMatrix.load(self.features_dir, mmap=False)
+        async with db_manager.get_session() as session:
+            features = await extend_feature_matrix(session, features, movie_ids)
+        
+        index = NeighborIndex.load(self.index_dir, mmap=False)
+        await asyncio.to_thread(index.refresh, features, movie_ids)
+        
+        features.save(self.features_dir)
+        index.save(self.index_dir)
+        print(f"✅ Neighbor index refreshed with {len(movie_ids)} movies")
+
+
+def connect_neighbor_refresher(service: Any) -> Optional[NeighborRefresher]:
+    """
+    NeighborRefresher registered on the saves of a batch process (imports,
+    sync, bootstrap). None when no neighbor index has been built yet: there
+    is nothing to refresh until `python -m recommender.neighbors build` runs.
+    """
+    refresher = NeighborRefresher()
+    if not (refresher.features_dir / "meta.json").exists() or not (refresher.index_dir / "meta.json").exists():
+        return None
+    return refresher.connect(service)
+
+
+async def main():
+    """
+    python -m recommender.neighbors build    - full rebuild of features + index
+    python -m recommender.neighbors refresh  - add movies missing from the index
+    """
+    command = sys.argv[1] if len(sys.argv) > 1 else "refresh"
+    
+    try:
+        if command == "build":
+            async with db_manager.get_session() as session:
+                features = await build_feature_matrix(session)
+            index = await asyncio.to_thread(NeighborIndex.build, features)
+            features.save(settings.FEATURES_DIR)
+            index.save(settings.NEIGHBORS_DIR)
+            print(f"✅ Neighbor index built for {len(index)} movies")
+        elif command == "refresh":
+            index = NeighborIndex.load(settings.NEIGHBORS_DIR)
+            async with db_manager.get_session() as session:
+                result = await session.execute(select(Movie.id))
+                movie_ids = np.asarray(result.scalars().all(), dtype=np.int64)
+            refresher = NeighborRefresher()
+            refresher.pending = np.setdiff1d(movie_ids, index.movie_ids).tolist()
+            await refresher.flush()
+        else:
+            print(main.__doc__)
+    finally:
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,314 @@
+import json
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import Deque, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from config import get_settings
+from .als import ALSRecommender
+from .catalog import Catalog
+from .collaborative import ItemItemRecommender
+from .neighbors import NeighborIndex
+
+settings = get_settings()
+
+CollaborativeModel = Union[ALSRecommender, ItemItemRecommender]
+
+
+def load_collaborative(directory: Union[str, Path]) -> CollaborativeModel:
+    """Load a saved collaborative model of either kind, as recorded in its meta.json"""
+    directory = Path(directory)
+    with open(directory / "meta.json") as f:
+        meta = json.load(f)
+    # Artifacts saved before "model" was recorded: only ALS stores factors
+    kind = meta.get("model") or ("als" if "factors" in meta else "item_item")
+    models = {model.MODEL: model for model in (ALSRecommender, ItemItemRecommender)}
+    if kind not in models:
+        raise ValueError(f"Unknown collaborative model '{kind}' in {directory}")
+    return models[kind].load(directory)
+
+
+@dataclass
+class BlendWeights:
+    """Relative weight of each score source in the final ranking"""
+    content: float = 0.4
+    collaborative: float = 0.4
+    popularity: float = 0.2
+
+
+@dataclass
+class RecommendationResult:
+    """Ranked movies plus the milliseconds spent in each stage"""
+    movie_ids: np.ndarray
+    scores: np.ndarray
+    timings: Dict[str, float] = field(default_factory=dict)
+    
+    def items(self) -> List[Tuple[int, float]]:
+        return [(int(movie_id), float(score)) for movie_id, score in zip(self.movie_ids, self.scores)]
+
+
+def _normalize(values: np.ndarray) -> np.ndarray:
+    """Min-max scale finite values to [0, 1]; non-finite become 0"""
+    finite = np.isfinite(values)
+    if not finite.any():
+        return np.zeros(len(values), dtype=np.float32)
+    low, high = values[finite].min(), values[finite].max()
+    scaled = np.zeros(len(values), dtype=np.float32)
+    scaled[finite] = (values[finite] - low) / (high - low) if high > low else 1.0
+    return scaled
+
+
+class RecommendationService:
+    """
+    Hybrid recommender over the catalog snapshot.
+    
+    A request runs four vectorized stages:
+    
+    - filters: provider / release-date / exclusion masks over the catalog
+    - candidates: content neighbors of the user's seeds, the collaborative
+      top-N and the filtered popularity head
+    - scoring: content, collaborative and popularity scores of the
+      candidates, each min-max normalized and blended with `weights`
+    - ranking: `argpartition` of the blended scores
+    
+    Per-stage milliseconds are returned with every result and kept for the
+    last `history` requests (see `latency_report`).
+    """
+    
+    CANDIDATES_PER_SOURCE = 500
+    SEED_LIMIT = 50
+    
+    def __init__(
+        self,
+        catalog: Catalog,
+        neighbors: Optional[NeighborIndex] = None,
+        collaborative: Optional[CollaborativeModel] = None,
+        weights: Optional[BlendWeights] = None,
+        history: int = 1000,
+    ):
+        self.catalog = catalog
+        self.neighbors = neighbors
+        self.collaborative = collaborative
+        self.weights = weights or BlendWeights()
+        self.stage_times: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=history))
+        
+        # Catalog row of every collaborative item, and the reverse map
+        self._model_rows = None
+        self._catalog_to_model = None
+        if collaborative is not None:
+            self._model_rows = catalog.rows_of(collaborative.movie_ids)
+            self._catalog_to_model = np.full(len(catalog), -1, dtype=np.int64)
+            known = self._model_rows >= 0
+            self._catalog_to_model[self._model_rows[known]] = np.flatnonzero(known)
+        
+        # Computed once here so the first request does not pay for the sort
+        self.popular_order = catalog.popular_order
+    
+    @classmethod
+    def load(
+        cls,
+        catalog_dir: Union[str, Path] = None,
+        neighbors_dir: Union[str, Path] = None,
+        model_dir: Union[str, Path] = None,
+        **kwargs,
+    ) -> "RecommendationService":
+        """
+        Memory-map the saved artifacts. Missing neighbor or collaborative
+        artifacts disable that source instead of failing.
+        """
+        catalog = Catalog.load(catalog_dir or settings.CATALOG_DIR)
+        
+        neighbors_dir = Path(neighbors_dir or settings.NEIGHBORS_DIR)
+        neighbors = NeighborIndex.load(neighbors_dir) if (neighbors_dir / "meta.json").exists() else None
+        
+        collaborative = None
+        if model_dir is not None:
+            directories = [Path(model_dir)]
+        else:
+            directories = [Path(settings.ALS_DIR), Path(settings.ITEM_ITEM_DIR)]
+        for directory in directories:
+            if (directory / "meta.json").exists():
+                collaborative = load_collaborative(directory)
+                break
+        
+        return cls(catalog, neighbors, collaborative, **kwargs)
+    
+    def recommend(
+        self,
+        user_id: Optional[int] = None,
+        seed_movie_ids: Iterable[int] = (),
+        k: int = 20,
+        provider_ids: Optional[Iterable[int]] = None,
+        country_code: str = "US",
+        provider_types: Optional[Iterable[str]] = None,
+        released_after: Optional[date] = None,
+        released_before: Optional[date] = None,
+        exclude_movie_ids: Iterable[int] = (),
+    ) -> RecommendationResult:
+        """
+        Top-k movies for a user and/or a set of seed movies.
+        
+        Movies the user has rated are never returned. Without a user or
+        seeds the result is the filtered popularity ranking.
+        """
+        seed_movie_ids = list(seed_movie_ids)
+        timings: Dict[str, float] = {}
+        clock = time.perf_counter()
+        
+        def lap(stage: str) -> None:
+            nonlocal clock
+            now = time.perf_counter()
+            timings[stage] = (now - clock) * 1000
+            clock = now
+        
+        started = clock
+        
+        # 1. Filters
+        allowed = None
+        if provider_ids is not None:
+            allowed = self.catalog.provider_mask(provider_ids, country_code, provider_types)
+        if released_after is not None or released_before is not None:
+            release = self.catalog.release_mask(released_after, released_before)
+            allowed = release if allowed is None else allowed & release
+        
+        user_row = None
+        if self.collaborative is not None and user_id is not None:
+            user_row = self.collaborative.user_row(user_id)
+        excluded = self.catalog.rows_of(exclude_movie_ids)
+        seed_rows, seed_weights = self._seeds(user_row, seed_movie_ids)
+        if user_row is not None:
+            rated = self.collaborative.rated
+            rated_rows = self._model_rows[rated.indices[rated.indptr[user_row]:rated.indptr[user_row + 1]]]
+            excluded = np.concatenate([excluded, rated_rows])
+        excluded = np.concatenate([excluded, self.catalog.rows_of(seed_movie_ids)])
+        excluded = excluded[excluded >= 0]
+        lap("filters")
+        
+        # 2. Candidates
+        content_rows, content_scores = self._content_scores(seed_rows, seed_weights)
+        model_scores = self.collaborative.score_user(user_row) if user_row is not None else None
+        pools = [content_rows, self._popular_candidates(allowed)]
+        if model_scores is not None:
+            pools.append(self._collaborative_candidates(model_scores, allowed))
+        candidates = np.unique(np.concatenate(pools))
+        keep = ~np.isin(candidates, excluded)
+        if allowed is not None:
+            keep &= allowed[candidates]
+        candidates = candidates[keep]
+        lap("candidates")
+        
+        # 3. Scoring
+        sources = []
+        if len(content_rows):
+            position = np.minimum(np.searchsorted(content_rows, candidates), len(content_rows) - 1)
+            content = np.where(content_rows[position] == candidates, content_scores[position], 0.0)
+            sources.append((self.weights.content, _normalize(content)))
+        if model_scores is not None:
+            model_index = self._catalog_to_model[candidates]
+            collaborative = np.where(model_index >= 0, model_scores[np.maximum(model_index, 0)], -np.inf)
+            sources.append((self.weights.collaborative, _normalize(collaborative)))
+        sources.append((self.weights.popularity, self.catalog.prior[candidates]))
+        
+        total_weight = sum(weight for weight, _ in sources) or 1.0
+        blended = np.zeros(len(candidates), dtype=np.float32)
+        for weight, values in sources:
+            blended += (weight / total_weight) * values
+        lap("scoring")
+        
+        # 4. Ranking
+        k = min(k, len(candidates))
+        if k > 0:
+            top = np.argpartition(-blended, k - 1)[:k]
+            top = top[np.argsort(-blended[top], kind="stable")]
+        else:
+            top = np.empty(0, dtype=np.int64)
+        result = RecommendationResult(self.catalog.movie_ids[candidates[top]], blended[top], timings)
+        lap("ranking")
+        
+        timings["total"] = (time.perf_counter() - started) * 1000
+        for stage, elapsed in timings.items():
+            self.stage_times[stage].append(elapsed)
+        return result
+    
+    def _seeds(self, user_row: Optional[int], seed_movie_ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Catalog rows and weights of the movies content similarity starts from"""
+        rows = [self.catalog.rows_of(seed_movie_ids)]
+        weights = [np.ones(len(rows[0]), dtype=np.float32)]
+        
+        if user_row is not None:
+            rated = self.collaborative.rated
+            start, stop = rated.indptr[user_row], rated.indptr[user_row + 1]
+            ratings = np.asarray(rated.data[start:stop], dtype=np.float32)
+            items = rated.indices[start:stop]
+            # The user's favourites, weighted by how far above their mean they are
+            liked = ratings > ratings.mean() if len(ratings) > 1 else ratings > 0
+            order = np.argsort(-ratings[liked], kind="stable")[:self.SEED_LIMIT]
+            rows.append(self._model_rows[items[liked][order]])
+            weights.append(ratings[liked][order] / max(float(ratings.max()), 1.0))
+        
+        rows, weights = np.concatenate(rows), np.concatenate(weights)
+        known = rows >= 0
+        return rows[known], weights[known]
+    
+    def _content_scores(self, seed_rows: np.ndarray, seed_weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted catalog rows reachable from the seeds and their summed weighted similarity"""
+        if self.neighbors is None or len(seed_rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        
+        seed_ids = self.catalog.movie_ids[seed_rows]
+        index_rows = np.minimum(np.searchsorted(self.neighbors.movie_ids, seed_ids), len(self.neighbors) - 1)
+        present = self.neighbors.movie_ids[index_rows] == seed_ids
+        index_rows, seed_weights = index_rows[present], seed_weights[present]
+        
+        neighbor_ids = np.asarray(self.neighbors.neighbor_ids[index_rows])
+        similarity = np.asarray(self.neighbors.scores[index_rows]) * seed_weights[:, None]
+        valid = (neighbor_ids >= 0) & (similarity > 0)
+        rows = self.catalog.rows_of(neighbor_ids[valid])
+        similarity = similarity[valid][rows >= 0]
+        rows = rows[rows >= 0]
+        
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        return unique_rows, np.bincount(inverse, weights=similarity).astype(np.float32)
+    
+    def _collaborative_candidates(self, model_scores: np.ndarray, allowed: Optional[np.ndarray]) -> np.ndarray:
+        """Catalog rows of the best collaborative scores that pass the filters"""
+        scores = np.where(self._model_rows >= 0, model_scores, -np.inf)
+        if allowed is not None:
+            scores = np.where(allowed[np.maximum(self._model_rows, 0)], scores, -np.inf)
+        
+        n = min(self.CANDIDATES_PER_SOURCE, len(scores))
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, n - 1)[:n]
+        return self._model_rows[top[np.isfinite(scores[top])]]
+    
+    def _popular_candidates(self, allowed: Optional[np.ndarray]) -> np.ndarray:
+        """Head of the popularity order that passes the filters"""
+        order = self.popular_order
+        n = self.CANDIDATES_PER_SOURCE
+        if allowed is None:
+            return order[:n]
+        
+        # Scan the order in growing windows instead of masking the whole catalog
+        window = n * 4
+        while True:
+            head = order[:window]
+            passing = head[allowed[head]]
+            if len(passing) >= n or window >= len(order):
+                return passing[:n]
+            window *= 4
+    
+    def latency_report(self) -> Dict[str, Dict[str, float]]:
+        """p50 / p99 / max milliseconds per stage over the recent requests"""
+        return {
+            stage: {
+                "p50": float(np.percentile(samples, 50)),
+                "p99": float(np.percentile(samples, 99)),
+                "max": float(np.max(samples)),
+            }
+            for stage, samples in self.stage_times.items() if samples
+        }
@@ -0,0 +1,305 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event, select, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import (
+    Genre, Keyword, Person, ProductionCompany, ProductionCountry,
+    SpokenLanguage, Collection, Provider,
+)
+
+
+@dataclass(frozen=True)
+class EntitySpec:
+    """How a TMDb reference entity maps onto its table"""
+    
+    model: type
+    key: str  # natural key column (tmdb_id / iso_code)
+    payload_key: str  # key field in the TMDb payload
+    build: Callable[[Dict], Dict[str, Any]]  # TMDb payload -> column values
+
+
+ENTITY_SPECS: Dict[str, EntitySpec] = {
+    "collection": EntitySpec(Collection, "tmdb_id", "id", lambda d: {
+        "tmdb_id": d["id"],
+        "name": d["name"],
+        "poster_path": d.get("poster_path"),
+        "backdrop_path": d.get("backdrop_path"),
+        "overview": d.get("overview"),
+    }),
+    "genre": EntitySpec(Genre, "tmdb_id", "id", lambda d: {
+        "tmdb_id": d["id"],
+        "name": d["name"],
+    }),
+    "keyword": EntitySpec(Keyword, "tmdb_id", "id", lambda d: {
+        "tmdb_id": d["id"],
+        "name": d["name"],
+    }),
+    "person": EntitySpec(Person, "tmdb_id", "id", lambda d: {
+        "tmdb_id": d["id"],
+        "name": d["name"],
+        "profile_path": d.get("profile_path"),
+        "gender": d.get("gender"),
+        "known_for_department": d.get("known_for_department"),
+    }),
+    "company": EntitySpec(ProductionCompany, "tmdb_id", "id", lambda d: {
+        "tmdb_id": d["id"],
+        "name": d["name"],
+        "logo_path": d.get("logo_path"),
+        "origin_country": d.get("origin_country") or None,
+    }),
+    "country": EntitySpec(ProductionCountry, "iso_code", "iso_3166_1", lambda d: {
+        "iso_code": d["iso_3166_1"],
+        "name": d["name"],
+    }),
+    "language": EntitySpec(SpokenLanguage, "iso_code", "iso_639_1", lambda d: {
+        "iso_code": d["iso_639_1"],
+        "name": d["name"],
+        "english_name": d.get("english_name"),
+    }),
+    "provider": EntitySpec(Provider, "tmdb_provider_id", "provider_id", lambda d: {
+        "tmdb_provider_id": d["provider_id"],
+        "name": d["provider_name"],
+        "logo_path": d.get("logo_path"),
+    }),
+}
+
+# Number of cast / crew members kept per movie
+MAX_CAST = 20
+MAX_CREW = 20
+
+
+# Offer types listed per country in the watch/providers response
+PROVIDER_TYPES = ("flatrate", "free", "ads", "rent", "buy")
+
+
+def watch_providers(movie_data: Dict) -> Iterator[Tuple[str, str, Dict]]:
+    """(country_code, offer type, provider payload) for every watch provider offer"""
+    countries = (movie_data.get("watch/providers") or {}).get("results") or {}
+    for country_code, offers in countries.items():
+        for offer_type in PROVIDER_TYPES:
+            for provider in offers.get(offer_type) or []:
+                yield country_code, offer_type, provider
+
+
+def movie_references(movie_data: Dict) -> Dict[str, List[Dict]]:
+    """Reference entity payloads of one TMDb movie, grouped by entity type"""
+    credits = movie_data.get("credits") or {}
+    collection = movie_data.get("belongs_to_collection")
+    
+    return {
+        "collection": [collection] if collection else [],
+        "genre": movie_data.get("genres") or [],
+        "keyword": (movie_data.get("keywords") or {}).get("keywords") or [],
+        "person": (credits.get("cast") or [])[:MAX_CAST] + (credits.get("crew") or [])[:MAX_CREW],
+        "company": movie_data.get("production_companies") or [],
+        "country": movie_data.get("production_countries") or [],
+        "language": movie_data.get("spoken_languages") or [],
+        "provider": [provider for _, _, provider in watch_providers(movie_data)],
+    }
+
+
+def collect_references(movies: Iterable[Dict]) -> Dict[str, Dict[Any, Dict]]:
+    """Deduplicated reference payloads across movies: type -> {key: payload}"""
+    collected: Dict[str, Dict[Any, Dict]] = {kind: {} for kind in ENTITY_SPECS}
+    
+    for movie_data in movies:
+        for kind, payloads in movie_references(movie_data).items():
+            payload_key = ENTITY_SPECS[kind].payload_key
+            for payload in payloads:
+                collected[kind].setdefault(payload[payload_key], payload)
+    
+    return collected
+
+
+# Identity cache capacity per entity type (None = unbounded, for small tables)
+IDENTITY_CACHE_SIZES: Dict[str, Optional[int]] = {
+    "collection": 20_000,
+    "genre": None,
+    "keyword": 100_000,
+    "person": 200_000,
+    "company": 50_000,
+    "country": None,
+    "language": None,
+    "provider": None,
+}
+
+# Small tables loaded whole on first use
+WARM_KINDS = ("genre", "country", "language", "provider")
+
+# session.info key of identities inserted by the session's open transaction
+PENDING_IDENTITIES = "reference_identities"
+
+
+class IdentityCache:
+    """
+    Process-wide natural key -> primary key map per reference entity type.
+    
+    Each type is an LRU bounded by IDENTITY_CACHE_SIZES. Only committed
+    rows are cached: keys inserted by a session wait in its `info` and are
+    published by the `after_commit` event, or dropped on rollback, so a
+    rolled back insert can never leave a dangling primary key here. Call
+    `clear()` after dropping or truncating the reference tables.
+    """
+    
+    def __init__(self, sizes: Dict[str, Optional[int]] = IDENTITY_CACHE_SIZES):
+        self.sizes = sizes
+        self._entries: Dict[str, OrderedDict] = {kind: OrderedDict() for kind in ENTITY_SPECS}
+        self.warmed = False
+        self.hits = 0
+        self.misses = 0
+    
+    def get_many(self, kind: str, keys: Iterable[Any]) -> Tuple[Dict[Any, Any], List[Any]]:
+        """(cached key -> pk, keys not cached)"""
+        entries = self._entries[kind]
+        found, missing = {}, []
+        for key in keys:
+            pk = entries.get(key)
+            if pk is None:
+                missing.append(key)
+            else:
+                entries.move_to_end(key)
+                found[key] = pk
+        self.hits += len(found)
+        self.misses += len(missing)
+        return found, missing
+    
+    def put_many(self, kind: str, identities: Dict[Any, Any]) -> None:
+        entries = self._entries[kind]
+        for key, pk in identities.items():
+            entries[key] = pk
+            entries.move_to_end(key)
+        size = self.sizes.get(kind)
+        if size is not None:
+            while len(entries) > size:
+                entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        for entries in self._entries.values():
+            entries.clear()
+        self.warmed = False
+    
+    async def warm(self, session: AsyncSession, kinds: Iterable[str] = WARM_KINDS) -> None:
+        """Load every row of the small reference tables"""
+        for kind in kinds:
+            spec = ENTITY_SPECS[kind]
+            result = await session.execute(
+                select(getattr(spec.model, spec.key), inspect(spec.model).primary_key[0])
+            )
+            self.put_many(kind, dict(result.all()))
+        self.warmed = True
+
+
+identity_cache = IdentityCache()
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_identities(session: Session) -> None:
+    pending = session.info.pop(PENDING_IDENTITIES, None)
+    for kind, identities in (pending or {}).items():
+        identity_cache.put_many(kind, identities)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_identities(session: Session) -> None:
+    session.info.pop(PENDING_IDENTITIES, None)
+
+
+class ReferenceResolver:
+    """
+    Resolves TMDb reference entities to primary keys in bulk.
+    
+    Each entity type costs one `SELECT ... WHERE key IN (...)` plus, for
+    missing rows, one `INSERT ... ON CONFLICT DO NOTHING RETURNING`, instead
+    of a SELECT and flush per item. Conflicting inserts from concurrent
+    importers are harmless: rows another writer inserted first are picked up
+    by a final re-select.
+    
+    Keys found in the process-wide `identity_cache` (or inserted earlier in
+    the session's open transaction) never reach the database.
+    """
+    
+    CHUNK_SIZE = 1000
+    
+    def __init__(self, session: AsyncSession, cache: IdentityCache = identity_cache):
+        self.session = session
+        self.cache = cache
+    
+    def _pending(self, kind: str) -> Dict[Any, Any]:
+        """Identities this session inserted in its open transaction"""
+        return self.session.info.setdefault(PENDING_IDENTITIES, {}).setdefault(kind, {})
+    
+    async def _select_keys(self, spec: EntitySpec, keys: List[Any]) -> Dict[Any, Any]:
+        key_column = getattr(spec.model, spec.key)
+        pk_column = inspect(spec.model).primary_key[0]
+        
+        resolved = {}
+        for start in range(0, len(keys), self.CHUNK_SIZE):
+            chunk = keys[start:start + self.CHUNK_SIZE]
+            result = await self.session.execute(
+                select(key_column, pk_column).where(key_column.in_(chunk))
+            )
+            resolved.update(result.all())
+        return resolved
+    
+    async def _insert_missing(self, spec: EntitySpec, rows: List[Dict]) -> Dict[Any, Any]:
+        key_column = getattr(spec.model, spec.key)
+        pk_column = inspect(spec.model).primary_key[0]
+        
+        inserted = {}
+        for start in range(0, len(rows), self.CHUNK_SIZE):
+            stmt = (
+                dialect_insert(self.session, spec.model)
+                .values(rows[start:start + self.CHUNK_SIZE])
+                .on_conflict_do_nothing()
+                .returning(key_column, pk_column)
+            )
+            result = await self.session.execute(stmt)
+            inserted.update(result.all())
+        return inserted
+    
+    async def resolve(self, kind: str, payloads: Dict[Any, Dict]) -> Dict[Any, Any]:
+        """Map natural keys of one entity type to primary keys, inserting missing rows"""
+        if not payloads:
+            return {}
+        
+        spec = ENTITY_SPECS[kind]
+        resolved, uncached = self.cache.get_many(kind, payloads)
+        pending = self._pending(kind)
+        for key in uncached:
+            if key in pending:
+                resolved[key] = pending[key]
+        uncached = [key for key in uncached if key not in resolved]
+        if not uncached:
+            return resolved
+        
+        # Rows that exist are committed (or ours, and then in `pending`)
+        selected = await self._select_keys(spec, uncached)
+        self.cache.put_many(kind, selected)
+        resolved.update(selected)
+        
+        missing = [spec.build(payloads[key]) for key in uncached if key not in resolved]
+        if missing:
+            inserted = await self._insert_missing(spec, missing)
+            pending.update(inserted)
+            resolved.update(inserted)
+            
+            # Rows skipped by ON CONFLICT were inserted by someone else meanwhile
+            unresolved = [key for key in uncached if key not in resolved]
+            if unresolved:
+                selected = await self._select_keys(spec, unresolved)
+                self.cache.put_many(kind, selected)
+                resolved.update(selected)
+        
+        return resolved
+    
+    async def resolve_all(self, movies: Iterable[Dict]) -> Dict[str, Dict[Any, Any]]:
+        """Resolve every reference entity of the given movies: type -> {key: pk}"""
+        if not self.cache.warmed:
+            await self.cache.warm(self.session)
+        collected = collect_references(movies)
+        return {kind: await self.resolve(kind, payloads) for kind, payloads in collected.items()}
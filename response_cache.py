@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+# Endpoint prefix -> TTL in seconds (first match wins, None = never cache)
+DEFAULT_TTLS: Tuple[Tuple[str, Optional[int]], ...] = (
+    ("movie/changes", None),
+    ("search/", 24 * 3600),
+    ("movie/", 7 * 24 * 3600),
+    ("genre/", 30 * 24 * 3600),
+    ("configuration", 30 * 24 * 3600),
+)
+DEFAULT_TTL = 24 * 3600
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache for TMDb JSON responses.
+    
+    Entries are keyed by a hash of the endpoint plus normalized params
+    (with `api_key` excluded), expire per endpoint class, and the directory
+    is kept under `max_bytes` by evicting least recently used entries.
+    """
+    
+    EXCLUDED_PARAMS = {"api_key"}
+    
+    def __init__(
+        self,
+        directory: str | Path,
+        max_bytes: int = 512 * 1024 * 1024,
+        ttls: Tuple[Tuple[str, Optional[int]], ...] = DEFAULT_TTLS,
+        default_ttl: Optional[int] = DEFAULT_TTL,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, Tuple[int, float]]] = None  # key -> (size, last used)
+        self._total_bytes = 0
+    
+    def ttl_for(self, endpoint: str) -> Optional[int]:
+        """TTL of the endpoint class the endpoint belongs to"""
+        for prefix, ttl in self.ttls:
+            if endpoint.startswith(prefix):
+                return ttl
+        return self.default_ttl
+    
+    def key_for(self, endpoint: str, params: Dict[str, Any]) -> str:
+        """Stable hash of endpoint and params, independent of param order"""
+        normalized = {
+            k: str(v) for k, v in params.items()
+            if k not in self.EXCLUDED_PARAMS and v is not None
+        }
+        payload = json.dumps([endpoint.strip("/"), normalized], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+    
+    def _load_index(self) -> Dict[str, Tuple[int, float]]:
+        """Scan the cache directory once to learn entry sizes and ages"""
+        if self._index is None:
+            self._index = {}
+            self._total_bytes = 0
+            if self.directory.exists():
+                for path in self.directory.glob("*/*.json"):
+                    stat = path.stat()
+                    self._index[path.stem] = (stat.st_size, stat.st_mtime)
+                    self._total_bytes += stat.st_size
+        return self._index
+    
+    def get(self, endpoint: str, params: Dict[str, Any], ignore_ttl: bool = False) -> Optional[Dict]:
+        """Cached response, or None when missing or expired"""
+        ttl = self.ttl_for(endpoint)
+        if ttl is None and not ignore_ttl:
+            return None
+        
+        key = self.key_for(endpoint, params)
+        path = self._path(key)
+        with self._lock:
+            index = self._load_index()
+            if key not in index:
+                return None
+            
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._remove(key)
+                return None
+            
+            if not ignore_ttl and time.time() - entry["stored_at"] > ttl:
+                return None
+            
+            # Touch the file so LRU order survives restarts
+            now = time.time()
+            os.utime(path, (now, now))
+            index[key] = (index[key][0], now)
+            return entry["data"]
+    
+    def set(self, endpoint: str, params: Dict[str, Any], data: Dict) -> None:
+        """Store a response and evict old entries if over budget"""
+        if self.ttl_for(endpoint) is None:
+            return
+        
+        key = self.key_for(endpoint, params)
+        path = self._path(key)
+        body = json.dumps(
+            {"endpoint": endpoint, "stored_at": time.time(), "data": data},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        
+        with self._lock:
+            index = self._load_index()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+            
+            if key in index:
+                self._total_bytes -= index[key][0]
+            index[key] = (len(body), time.time())
+            self._total_bytes += len(body)
+            self._evict()
+    
+    def _remove(self, key: str) -> None:
+        size, _ = self._index.pop(key, (0, 0.0))
+        self._total_bytes -= size
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+    
+    def _evict(self) -> None:
+        """Drop least recently used entries down to 90% of the budget"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        
+        target = self.max_bytes * 0.9
+        for key, _ in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= target:
+                break
+            self._remove(key)
+    
+    def clear(self) -> None:
+        """Remove every cached response"""
+        with self._lock:
+            for key in list(self._load_index()):
+                self._remove(key)
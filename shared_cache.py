@@ -0,0 +1,362 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from config import get_settings
+from database import db_manager
+from models import Movie, movie_loader
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # only needed for CACHE_BACKEND=redis
+    aioredis = None
+
+settings = get_settings()
+
+
+class CacheBackend:
+    """Byte-string key/value store with optional per-key TTLs (seconds)"""
+    
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        raise NotImplementedError
+    
+    async def set_many(self, items: Dict[str, bytes], ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+    
+    async def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Set `key` only if it is absent; returns whether it was set"""
+        raise NotImplementedError
+    
+    async def delete(self, keys: List[str]) -> None:
+        raise NotImplementedError
+    
+    async def incr(self, key: str) -> int:
+        raise NotImplementedError
+    
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """Per-process LRU with expiry, bounded to `max_entries` keys"""
+    
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Tuple[Optional[float], bytes]] = OrderedDict()
+    
+    def _get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+    
+    def _set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        self._entries[key] = (time.monotonic() + ttl if ttl else None, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self._get(key) for key in keys]
+    
+    async def set_many(self, items: Dict[str, bytes], ttl: Optional[float] = None) -> None:
+        for key, value in items.items():
+            self._set(key, value, ttl)
+    
+    async def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        if self._get(key) is not None:
+            return False
+        self._set(key, value, ttl)
+        return True
+    
+    async def delete(self, keys: List[str]) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+    
+    async def incr(self, key: str) -> int:
+        value = int(self._get(key) or 0) + 1
+        self._set(key, str(value).encode(), None)
+        return value
+
+
+class RedisBackend(CacheBackend):
+    """
+    Redis (or any server speaking its protocol) shared by all processes.
+    
+    `client` may be any `redis.asyncio.Redis`-compatible object, e.g. a
+    local stand-in such as fakeredis; otherwise one is created from `url`.
+    Keys are namespaced with `prefix`.
+    """
+    
+    def __init__(self, url: Optional[str] = None, client: Any = None, prefix: str = "movie_warehouse:"):
+        if client is None:
+            if aioredis is None:
+                raise RuntimeError("The Redis cache backend needs the 'redis' package (pip install redis)")
+            client = aioredis.from_url(url or settings.REDIS_URL)
+        self.client = client
+        self.prefix = prefix
+    
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        return await self.client.mget([self.prefix + key for key in keys])
+    
+    async def set_many(self, items: Dict[str, bytes], ttl: Optional[float] = None) -> None:
+        if not items:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+        await pipe.execute()
+    
+    async def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        return bool(await self.client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None, nx=True))
+    
+    async def delete(self, keys: List[str]) -> None:
+        if keys:
+            await self.client.delete(*[self.prefix + key for key in keys])
+    
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(self.prefix + key)
+    
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class SharedCache:
+    """
+    JSON values over a CacheBackend with stampede protection.
+    
+    Misses are single-flight: keys another task of this process is already
+    loading are awaited rather than loaded again. `get_or_load` also takes
+    a short lock in the backend, so processes sharing a Redis backend do
+    not recompute the same expensive value at once.
+    """
+    
+    LOCK_TTL = 10.0  # seconds a loader may hold the lock
+    LOCK_POLL = 0.05
+    
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._inflight: Dict[str, asyncio.Future] = {}
+    
+    async def close(self) -> None:
+        await self.backend.close()
+    
+    async def get_many_or_load(
+        self,
+        keys: List[str],
+        load: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+        ttl: Optional[float] = None,
+        store: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Values of `keys`; misses are loaded with one `load(missing_keys)` call
+        and stored (store=False when `load` stores them itself). Keys `load`
+        does not return are left out (and not cached).
+        """
+        values: Dict[str, Any] = {}
+        missing = []
+        for key, blob in zip(keys, await self.backend.get_many(keys)):
+            if blob is None:
+                missing.append(key)
+            else:
+                values[key] = json.loads(blob)
+        if not missing:
+            return values
+        
+        waiting = {key: self._inflight[key] for key in missing if key in self._inflight}
+        to_load = [key for key in missing if key not in waiting]
+        
+        if to_load:
+            future = asyncio.get_running_loop().create_future()
+            for key in to_load:
+                self._inflight[key] = future
+            loaded = None
+            try:
+                loaded = await load(to_load)
+                if store:
+                    await self._store(loaded, ttl)
+            finally:
+                for key in to_load:
+                    self._inflight.pop(key, None)
+                # None tells waiters to load for themselves
+                future.set_result(loaded)
+            values.update(loaded)
+        
+        retry = []
+        for key, future in waiting.items():
+            shared = await asyncio.shield(future)
+            if shared is None:
+                retry.append(key)
+            elif key in shared:
+                values[key] = shared[key]
+        if retry:
+            values.update(await self.get_many_or_load(retry, load, ttl, store))
+        return values
+    
+    async def _store(self, values: Dict[str, Any], ttl: Optional[float]) -> None:
+        await self.backend.set_many({key: json.dumps(value).encode() for key, value in values.items()}, ttl)
+    
+    async def get_or_load(self, key: str, load: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """Value of `key`, computed by `load()` on a miss"""
+        
+        async def load_locked(keys: List[str]) -> Dict[str, Any]:
+            lock = f"lock:{key}"
+            acquired = await self.backend.add(lock, b"1", self.LOCK_TTL)
+            if not acquired:
+                # Another process is computing it: wait for its result, or
+                # for its lock to go away without one
+                deadline = time.monotonic() + self.LOCK_TTL
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(self.LOCK_POLL)
+                    [blob] = await self.backend.get_many([key])
+                    if blob is not None:
+                        return {key: json.loads(blob)}
+                    acquired = await self.backend.add(lock, b"1", self.LOCK_TTL)
+                    if acquired:
+                        break
+            try:
+                if acquired:
+                    # Stored by a process that held the lock since our miss
+                    [blob] = await self.backend.get_many([key])
+                    if blob is not None:
+                        return {key: json.loads(blob)}
+                
+                # Stored before the lock is released, so the next holder finds it
+                values = {key: await load()}
+                await self._store(values, ttl)
+                return values
+            finally:
+                # Past the deadline we load without the lock: it is not ours to drop
+                if acquired:
+                    await self.backend.delete([lock])
+        
+        values = await self.get_many_or_load([key], load_locked, ttl, store=False)
+        return values[key]
+    
+    async def delete(self, keys: Iterable[str]) -> None:
+        await self.backend.delete(list(keys))
+
+
+def create_cache(backend: Optional[str] = None) -> SharedCache:
+    """SharedCache on the backend named by `backend` or CACHE_BACKEND ('memory' / 'redis')"""
+    backend = backend or settings.CACHE_BACKEND
+    if backend == "memory":
+        return SharedCache(MemoryBackend(settings.CACHE_MAX_ENTRIES))
+    if backend == "redis":
+        return SharedCache(RedisBackend(settings.REDIS_URL))
+    raise ValueError(f"Unknown cache backend '{backend}', expected 'memory' or 'redis'")
+
+
+def movie_card(movie: Movie) -> Dict[str, Any]:
+    """Serializable card of a movie loaded with movie_loader("card")"""
+    return {
+        "id": movie.id,
+        "tmdb_id": movie.tmdb_id,
+        "title": movie.title,
+        "year": movie.release_date.year if movie.release_date else None,
+        "poster_path": movie.poster_path,
+        "vote_average": movie.vote_average,
+        "genres": [genre.name for genre in movie.genres],
+    }
+
+
+class MovieCache:
+    """
+    Movie cards, movie pages and per-user recommendation lists on a
+    SharedCache.
+    
+    Cards and pages are keyed by movie id and dropped by
+    `invalidate_movies`. A user's recommendation lists are keyed by a
+    per-user generation number plus a hash of the request parameters;
+    `invalidate_user` bumps the generation, which retires every list of
+    that user at once (the old entries simply expire).
+    
+    `invalidate_movies` matches the TMDbService save / update listener
+    signature and `invalidate_user` the LetterboxdImporter rating listener
+    one; `connect` registers both.
+    """
+    
+    def __init__(
+        self,
+        cache: SharedCache,
+        card_ttl: float = None,
+        recommendation_ttl: float = None,
+    ):
+        self.cache = cache
+        self.card_ttl = card_ttl or settings.CACHE_CARD_TTL
+        self.recommendation_ttl = recommendation_ttl or settings.CACHE_RECOMMENDATION_TTL
+    
+    async def cards(self, movie_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Cards of the movies that exist, keyed by movie id"""
+        movie_ids = list(dict.fromkeys(movie_ids))
+        
+        async def load(keys: List[str]) -> Dict[str, Any]:
+            ids = [int(key.rsplit(":", 1)[1]) for key in keys]
+            async with db_manager.get_session() as session:
+                result = await session.execute(
+                    select(Movie).options(*movie_loader("card")).where(Movie.id.in_(ids))
+                )
+                return {f"card:{movie.id}": movie_card(movie) for movie in result.scalars()}
+        
+        values = await self.cache.get_many_or_load([f"card:{movie_id}" for movie_id in movie_ids], load, self.card_ttl)
+        return {
+            movie_id: values[f"card:{movie_id}"]
+            for movie_id in movie_ids if f"card:{movie_id}" in values
+        }
+    
+    async def detail(self, movie_id: int, load: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Cached movie page built by `load()`, which raises for a missing movie so misses are not cached"""
+        return await self.cache.get_or_load(f"detail:{movie_id}", load, self.card_ttl)
+    
+    async def recommendations(self, user_id: int, params: Dict[str, Any], compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached result of `compute()` for a user and request parameters"""
+        [generation] = await self.cache.backend.get_many([f"recs_gen:{user_id}"])
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        key = f"recs:{user_id}:{int(generation or 0)}:{digest}"
+        return await self.cache.get_or_load(key, compute, self.recommendation_ttl)
+    
+    def connect(self, service: Any, importers: Iterable[Any] = ()) -> "MovieCache":
+        """Invalidate on the saves / updates of a TMDbService and the rating flushes of LetterboxdImporters"""
+        for listeners in (service.save_listeners, service.update_listeners):
+            if self.invalidate_movies not in listeners:
+                listeners.append(self.invalidate_movies)
+        for importer in importers:
+            if self.invalidate_user not in importer.rating_listeners:
+                importer.rating_listeners.append(self.invalidate_user)
+        return self
+    
+    async def close(self) -> None:
+        await self.cache.close()
+    
+    async def invalidate_movies(self, movie_ids: List[int]) -> None:
+        await self.cache.delete(
+            f"{kind}:{movie_id}" for movie_id in movie_ids for kind in ("card", "detail")
+        )
+    
+    async def invalidate_user(self, user_id: int, movie_ids: Optional[List[int]] = None) -> None:
+        await self.cache.backend.incr(f"recs_gen:{user_id}")
+
+
+def connect_movie_cache(service: Any, importers: Iterable[Any] = ()) -> Optional[MovieCache]:
+    """
+    MovieCache invalidated by the writes of a batch process (imports, sync,
+    bootstrap), so API processes stop serving the old cards, pages and
+    recommendation lists. Only a shared backend is visible to them: with
+    the per-process memory backend there is nothing to invalidate and
+    None is returned.
+    """
+    if settings.CACHE_BACKEND == "memory":
+        return None
+    return MovieCache(create_cache()).connect(service, importers)
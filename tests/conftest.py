@@ -0,0 +1,73 @@
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+# The modules live at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Services built by the tests never read or write the on-disk response cache
+os.environ["TMDB_CACHE_DIR"] = ""
+
+from database import db_manager  # noqa: E402
+from models import Base  # noqa: E402
+from tmdb_service import TMDbService  # noqa: E402
+
+
+class StatementCounter:
+    """Counts the SQL statements an engine sends to the database"""
+    
+    def __init__(self):
+        self.count = 0
+    
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+@pytest_asyncio.fixture
+async def engine():
+    """Fresh in-memory SQLite database with every table"""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def sessionmaker(engine):
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+@pytest.fixture
+def statements(engine):
+    """StatementCounter attached to the engine"""
+    counter = StatementCounter()
+    event.listen(engine.sync_engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(engine.sync_engine, "before_cursor_execute", counter)
+
+
+@pytest_asyncio.fixture
+async def warehouse():
+    """Points the application's db_manager at a fresh in-memory SQLite database"""
+    db_manager._engine = create_async_engine("sqlite+aiosqlite://")
+    db_manager._sessionmaker = None
+    async with db_manager.get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield db_manager
+    await db_manager.close()
+    db_manager._engine = db_manager._sessionmaker = None
+
+
+@pytest_asyncio.fixture
+async def service():
+    """TMDbService whose every request fails: the tests only write"""
+    service = TMDbService(api_key="test", transport=httpx.MockTransport(lambda request: httpx.Response(404)), cache=None)
+    yield service
+    await service.close()
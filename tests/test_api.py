@@ -0,0 +1,77 @@
+import base64
+import json
+from datetime import date
+
+import pytest
+import pytest_asyncio
+from aiohttp.test_utils import TestClient, TestServer
+from sqlalchemy import insert
+
+from api import create_app, encode_cursor
+from database import db_manager
+from models import Movie
+from shared_cache import MemoryBackend, MovieCache, SharedCache
+
+
+def raw_cursor(*parts) -> str:
+    return base64.urlsafe_b64encode(json.dumps(parts).encode()).decode().rstrip("=")
+
+
+@pytest_asyncio.fixture
+async def client(warehouse):
+    # The recommendation endpoints are not exercised: skip loading artifacts
+    app = create_app(cache=MovieCache(SharedCache(MemoryBackend())), recommender=object())
+    async with TestClient(TestServer(app)) as client:
+        yield client
+
+
+async def add_movie(tmdb_id: int, popularity: float) -> int:
+    async with db_manager.get_session() as session:
+        result = await session.execute(insert(Movie).returning(Movie.id), [{
+            "tmdb_id": tmdb_id,
+            "title": f"Film {tmdb_id}",
+            "original_title": f"Film {tmdb_id}",
+            "release_date": date(2001, 1, 1),
+            "popularity": popularity,
+        }])
+        return result.scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_missing_movie_is_not_cached(client):
+    response = await client.get("/movies/1")
+    assert response.status == 404
+    
+    movie_id = await add_movie(10, 1.0)
+    response = await client.get(f"/movies/{movie_id}")
+    assert response.status == 200
+    assert (await response.json())["title"] == "Film 10"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cursor", [
+    raw_cursor("popularity", "x", 1),
+    raw_cursor("popularity", True, 1),
+    raw_cursor("popularity", None, 1),
+    raw_cursor("popularity", 1.5, "1"),
+    raw_cursor("release_date", 1.5, 1),
+    raw_cursor("release_date", "2001-01-01", 1),  # cursor of another sort
+    "not base64 json",
+])
+async def test_invalid_cursor_is_rejected(client, cursor):
+    response = await client.get("/movies", params={"sort": "popularity", "cursor": cursor})
+    assert response.status == 400
+
+
+@pytest.mark.asyncio
+async def test_cursor_continues_listing(client):
+    for tmdb_id in range(1, 6):
+        await add_movie(tmdb_id, float(tmdb_id))
+    
+    response = await client.get("/movies", params={"limit": 2})
+    page = await response.json()
+    assert [movie["tmdb_id"] for movie in page["results"]] == [5, 4]
+    assert page["next_cursor"] == encode_cursor("popularity", 4.0, page["results"][-1]["id"])
+    
+    response = await client.get("/movies", params={"limit": 2, "cursor": page["next_cursor"]})
+    assert [movie["tmdb_id"] for movie in (await response.json())["results"]] == [3, 2]
@@ -0,0 +1,71 @@
+import gzip
+import json
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from catalog_bootstrap import CatalogBootstrap
+from database import db_manager
+from models import Movie
+from response_cache import ResponseCache
+from tmdb_service import TMDbService
+
+# Daily ID export lines: (id, popularity, adult)
+EXPORT = [(1, 5.0, False), (2, 50.0, False), (3, 0.5, False), (4, 20.0, False), (5, 9.0, False), (6, 80.0, True)]
+MISSING = {4}  # in the export, but TMDb has no details
+
+
+@pytest.fixture
+def export(tmp_path):
+    path = tmp_path / "movie_ids_05_15_2026.json.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for tmdb_id, popularity, adult in EXPORT:
+            line = {"id": tmdb_id, "original_title": f"Film {tmdb_id}", "popularity": popularity, "adult": adult, "video": False}
+            f.write(json.dumps(line) + "\n")
+        f.write("not json\n")
+    return path
+
+
+@pytest.mark.asyncio
+async def test_bootstrap_from_export(warehouse, export, tmp_path):
+    requested = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        tmdb_id = int(request.url.path.rsplit("/", 1)[1])
+        requested.append(tmdb_id)
+        if tmdb_id in MISSING:
+            return httpx.Response(404)
+        return httpx.Response(200, json={
+            "id": tmdb_id,
+            "title": f"Film {tmdb_id}",
+            "release_date": "2001-04-25",
+            "genres": [{"id": 18, "name": "Drama"}],
+        })
+    
+    cache = ResponseCache(tmp_path / "cache")
+    service = TMDbService(api_key="test", transport=httpx.MockTransport(handler), cache=cache)
+    await service.save_movie({"id": 5, "title": "Film 5"})
+    
+    bootstrap = CatalogBootstrap(service, workers=1, batch_size=2)
+    try:
+        await bootstrap.run(export, min_popularity=1.0)
+    finally:
+        await bootstrap.close()
+        await service.close()
+    
+    # Most popular first; adult, unpopular and saved ids are never requested
+    assert requested == [2, 4, 1]
+    assert bootstrap.stats == {
+        "in_export": 4,
+        "already_saved": 1,
+        "fetched": 2,
+        "saved": 2,
+        "missing": 1,
+        "errors": 0,
+    }
+    async with db_manager.get_session() as session:
+        assert set(await session.scalars(select(Movie.tmdb_id))) == {1, 2, 5}
+    
+    # Payloads read once are kept out of the response cache
+    assert not list((tmp_path / "cache").glob("*/*.json"))
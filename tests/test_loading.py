@@ -0,0 +1,104 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from models import (
+    Collection,
+    Genre,
+    Keyword,
+    Movie,
+    Person,
+    ProductionCompany,
+    movie_cast_association,
+    movie_company_association,
+    movie_crew_association,
+    movie_genre_association,
+    movie_keyword_association,
+    movie_loader,
+)
+
+# Statements emitted for one movie, whatever the catalog size:
+# the movie row plus one selectin query per loaded relationship
+EXPECTED_STATEMENTS = {
+    None: 9,  # session.get(Movie, id) with the mapper's default loaders
+    "card": 2,
+    "detail": 12,
+    "features": 6,
+}
+
+
+async def seed(sessionmaker, count: int) -> None:
+    """Add `count` movies sharing collections, genres, keywords, people and companies with the rest of the catalog"""
+    async with sessionmaker() as session:
+        if not await session.scalar(select(func.count()).select_from(Genre)):
+            await session.execute(insert(Genre), [{"tmdb_id": i, "name": f"Genre {i}"} for i in range(1, 6)])
+            await session.execute(insert(Keyword), [{"tmdb_id": i, "name": f"Keyword {i}"} for i in range(1, 21)])
+            await session.execute(insert(Person), [{"tmdb_id": i, "name": f"Person {i}"} for i in range(1, 51)])
+            await session.execute(insert(ProductionCompany), [{"tmdb_id": i, "name": f"Company {i}"} for i in range(1, 11)])
+            await session.execute(insert(Collection), [{"tmdb_id": i, "name": f"Collection {i}"} for i in range(1, 4)])
+        
+        start = (await session.scalar(select(func.max(Movie.tmdb_id)))) or 0
+        tmdb_ids = range(start + 1, start + count + 1)
+        await session.execute(insert(Movie), [
+            {
+                "tmdb_id": tmdb_id,
+                "title": f"Film {tmdb_id}",
+                "original_title": f"Film {tmdb_id}",
+                "release_date": date(2000, 1, 1),
+                "collection_id": tmdb_id % 3 + 1,
+            }
+            for tmdb_id in tmdb_ids
+        ])
+        movie_ids = (await session.scalars(select(Movie.id).where(Movie.tmdb_id.in_(tmdb_ids)))).all()
+        
+        for table, column, size, per_movie in (
+            (movie_genre_association, "genre_id", 5, 2),
+            (movie_keyword_association, "keyword_id", 20, 3),
+            (movie_cast_association, "person_id", 50, 4),
+            (movie_crew_association, "person_id", 50, 2),
+            (movie_company_association, "company_id", 10, 1),
+        ):
+            await session.execute(insert(table), [
+                {"movie_id": movie_id, column: (movie_id * 7 + offset) % size + 1}
+                for movie_id in movie_ids
+                for offset in range(per_movie)
+            ])
+        await session.commit()
+
+
+async def statements_for_one_movie(sessionmaker, statements, loader) -> int:
+    async with sessionmaker() as session:
+        movie_id = await session.scalar(select(Movie.id).order_by(Movie.id).limit(1))
+    
+    async with sessionmaker() as session:
+        before = statements.count
+        options = movie_loader(loader) if loader else ()
+        movie = await session.get(Movie, movie_id, options=options)
+        assert movie is not None
+        # Nothing fanned out into other movies of the catalog
+        assert [obj for obj in session.identity_map.values() if isinstance(obj, Movie)] == [movie]
+        return statements.count - before
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("loader", list(EXPECTED_STATEMENTS))
+async def test_loading_one_movie_is_constant_as_catalog_grows(sessionmaker, statements, loader):
+    await seed(sessionmaker, 60)
+    small = await statements_for_one_movie(sessionmaker, statements, loader)
+    
+    # 10x the catalog, beyond one selectin IN batch (500 ids)
+    await seed(sessionmaker, 540)
+    large = await statements_for_one_movie(sessionmaker, statements, loader)
+    
+    assert small == large == EXPECTED_STATEMENTS[loader]
+
+
+@pytest.mark.asyncio
+async def test_reverse_collections_are_not_loaded(sessionmaker):
+    await seed(sessionmaker, 20)
+    async with sessionmaker() as session:
+        movie = await session.get(Movie, 1, options=movie_loader("detail"))
+        assert len(movie.genres) == 2
+        with pytest.raises(Exception, match="lazy='raise'"):
+            movie.genres[0].movies
@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import inspect, text
+
+from init_db import migrate_database
+from models import User
+
+
+async def columns(warehouse, table: str) -> set:
+    async with warehouse.get_engine().connect() as conn:
+        return await conn.run_sync(lambda sync: {column["name"] for column in inspect(sync).get_columns(table)})
+
+
+@pytest.mark.asyncio
+async def test_migrate_adds_liked_to_existing_ratings(warehouse, service):
+    movie = await service.save_movie({"id": 194, "title": "Amelie", "release_date": "2001-04-25"})
+    async with warehouse.get_session() as session:
+        user = User(username="old")
+        session.add(user)
+    
+    # A ratings table from before the liked column, with a rating in it
+    async with warehouse.get_engine().begin() as conn:
+        await conn.execute(text("ALTER TABLE user_movie_ratings DROP COLUMN liked"))
+        await conn.execute(text(
+            "INSERT INTO user_movie_ratings (user_id, movie_id, rating, created_at, updated_at) "
+            "VALUES (:user_id, :movie_id, 9, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+        ), {"user_id": user.id, "movie_id": movie.id})
+    
+    await migrate_database()
+    
+    assert "liked" in await columns(warehouse, "user_movie_ratings")
+    async with warehouse.get_engine().connect() as conn:
+        assert (await conn.execute(text("SELECT rating, liked FROM user_movie_ratings"))).all() == [(9, False)]
+    
+    # A second run has nothing left to do
+    await migrate_database()
+
+
+def providers(*countries) -> dict:
+    return {"results": {country: {"flatrate": [{"provider_id": 8, "provider_name": "Netflix"}]} for country in countries}}
+
+
+@pytest.mark.asyncio
+async def test_migrate_upgrades_provider_key_columns_and_indexes(warehouse, service):
+    await service.save_movie({"id": 1, "title": "Old", "watch/providers": providers("US")})
+    
+    # Tables as created before watch providers were stored per country and type
+    async with warehouse.get_engine().begin() as conn:
+        await conn.execute(text("ALTER TABLE movie_provider_association RENAME TO providers_backup"))
+        await conn.execute(text(
+            "CREATE TABLE movie_provider_association ("
+            "movie_id INTEGER NOT NULL REFERENCES movies (id) ON DELETE CASCADE, "
+            "provider_id INTEGER NOT NULL REFERENCES providers (id) ON DELETE CASCADE, "
+            "country_code VARCHAR(2) NOT NULL, type VARCHAR(20) NOT NULL, "
+            "PRIMARY KEY (movie_id, provider_id))"
+        ))
+        await conn.execute(text("INSERT INTO movie_provider_association SELECT * FROM providers_backup"))
+        await conn.execute(text("DROP TABLE providers_backup"))
+        await conn.execute(text("DROP INDEX ix_movies_popularity_id"))
+        await conn.execute(text("DROP INDEX ix_letterboxd_films_letterboxd_url"))
+        await conn.execute(text("ALTER TABLE letterboxd_films DROP COLUMN letterboxd_url"))
+    
+    await migrate_database()
+    
+    async with warehouse.get_engine().connect() as conn:
+        schema = await conn.run_sync(lambda sync: {
+            "primary_key": inspect(sync).get_pk_constraint("movie_provider_association")["constrained_columns"],
+            "movies": {index["name"] for index in inspect(sync).get_indexes("movies")},
+            "letterboxd_films": {index["name"] for index in inspect(sync).get_indexes("letterboxd_films")},
+        })
+        rows = (await conn.execute(text("SELECT country_code, type FROM movie_provider_association"))).all()
+    assert schema["primary_key"] == ["movie_id", "provider_id", "country_code", "type"]
+    assert "ix_movies_popularity_id" in schema["movies"]
+    assert "ix_letterboxd_films_letterboxd_url" in schema["letterboxd_films"]
+    assert "letterboxd_url" in await columns(warehouse, "letterboxd_films")
+    assert rows == [("US", "flatrate")]
+    
+    # One provider in several countries no longer collides
+    movie = await service.save_movie({"id": 2, "title": "New", "watch/providers": providers("US", "FR")})
+    assert movie is not None
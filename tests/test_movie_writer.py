@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import func, select
+
+from database import db_manager
+from models import Movie
+
+
+def movie_details(tmdb_id: int, **fields) -> dict:
+    return {
+        "id": tmdb_id,
+        "title": f"Film {tmdb_id}",
+        "release_date": "2001-04-25",
+        "genres": [{"id": 18, "name": "Drama"}],
+        "credits": {"cast": [{"id": tmdb_id, "name": f"Actor {tmdb_id}", "character": "Lead", "order": 0}]},
+        **fields,
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("bad", [
+    {"genres": [{"name": "NoId"}]},
+    {"credits": {"cast": [{"name": "NoId"}]}},
+    {"production_companies": [{"id": 7}]},
+    {"watch/providers": {"results": {"US": {"flatrate": [{"provider_name": "NoId"}]}}}},
+    {"release_dates": {"results": [{"iso_3166_1": "US", "release_dates": [{"release_date": "soon"}]}]}},
+    {"videos": {"results": [{"id": "v1"}]}},
+    {"credits": ["cast"]},
+])
+async def test_malformed_payload_fails_alone(warehouse, service, bad):
+    results = await service.save_movies([movie_details(1), movie_details(2, **bad), movie_details(3)])
+    
+    assert [result.ok for result in results] == [True, False, True]
+    assert results[1].error.startswith("invalid payload")
+    async with db_manager.get_session() as session:
+        assert await session.scalar(select(func.count()).select_from(Movie)) == 2
+    
+    # The good movies were written whole
+    updated = await service.update_movies([movie_details(1), movie_details(2, **bad), movie_details(3)])
+    assert [result.changed for result in updated] == [False, False, False]
+    assert updated[1].error.startswith("invalid payload")
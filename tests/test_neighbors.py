@@ -0,0 +1,44 @@
+import pytest
+
+from database import db_manager
+from recommender import NeighborIndex, NeighborRefresher, build_feature_matrix
+
+
+def movie_details(tmdb_id: int) -> dict:
+    # Movies sharing a genre and keyword are neighbors
+    return {
+        "id": tmdb_id,
+        "title": f"Film {tmdb_id}",
+        "original_title": f"Film {tmdb_id}",
+        "release_date": "2001-04-25",
+        "genres": [{"id": 18 + tmdb_id % 3, "name": f"Genre {tmdb_id % 3}"}],
+        "keywords": {"keywords": [{"id": 100 + tmdb_id % 4, "name": f"keyword {tmdb_id % 4}"}]},
+    }
+
+
+@pytest.mark.asyncio
+async def test_saved_movies_refresh_the_saved_index(warehouse, service, tmp_path):
+    saved = await service.save_movies([movie_details(tmdb_id) for tmdb_id in range(1, 13)])
+    async with db_manager.get_session() as session:
+        features = await build_feature_matrix(session)
+    features.save(tmp_path / "features")
+    NeighborIndex.build(features, k=5).save(tmp_path / "neighbors")
+    
+    refresher = NeighborRefresher(tmp_path / "features", tmp_path / "neighbors", batch_size=4).connect(service)
+    
+    # A full batch is applied as soon as it is saved, the rest on flush()
+    results = await service.save_movies([movie_details(tmdb_id) for tmdb_id in range(13, 17)])
+    first = sorted({result.movie_id for result in results})
+    assert refresher.pending == []
+    assert set(first) <= set(NeighborIndex.load(tmp_path / "neighbors").movie_ids.tolist())
+    
+    movie = await service.save_movie(movie_details(17))
+    assert refresher.pending == [movie.id]
+    await refresher.flush()
+    
+    index = NeighborIndex.load(tmp_path / "neighbors")
+    assert len(index) == 17
+    neighbors = [movie_id for movie_id, _ in index.lookup(movie.id)]
+    assert neighbors and set(neighbors) <= set(index.movie_ids.tolist())
+    # Film 5 has the same genre and keyword as Film 17
+    assert index.lookup(saved[4].movie_id, 1) == [(movie.id, pytest.approx(1.0))]
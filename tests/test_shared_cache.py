@@ -0,0 +1,204 @@
+import asyncio
+import time
+
+import pytest
+
+from import_letterbox_json import LetterboxdImporter
+from shared_cache import MemoryBackend, MovieCache, RedisBackend, SharedCache
+
+
+def movie_details(tmdb_id: int, title: str) -> dict:
+    return {
+        "id": tmdb_id,
+        "title": title,
+        "original_title": title,
+        "release_date": "2001-04-25",
+        "overview": "",
+        "popularity": 10.0,
+        "genres": [{"id": 18, "name": "Drama"}],
+    }
+
+
+async def page(title: str) -> dict:
+    return {"title": title}
+
+
+@pytest.mark.asyncio
+async def test_update_evicts_cards_and_pages(warehouse, service):
+    movie_cache = MovieCache(SharedCache(MemoryBackend())).connect(service)
+    movie = await service.save_movie(movie_details(194, "Amelie"))
+    
+    assert (await movie_cache.cards([movie.id]))[movie.id]["title"] == "Amelie"
+    assert await movie_cache.detail(movie.id, lambda: page("Amelie")) == {"title": "Amelie"}
+    
+    await service.update_movies([movie_details(194, "Amélie")])
+    
+    assert (await movie_cache.cards([movie.id]))[movie.id]["title"] == "Amélie"
+    assert await movie_cache.detail(movie.id, lambda: page("Amélie")) == {"title": "Amélie"}
+
+
+@pytest.mark.asyncio
+async def test_rating_flush_retires_recommendations(warehouse, service):
+    importer = LetterboxdImporter("cache_test", service=service)
+    movie_cache = MovieCache(SharedCache(MemoryBackend())).connect(service, [importer])
+    movie = await service.save_movie(movie_details(194, "Amelie"))
+    user = importer.user = await importer.get_or_create_user()
+    
+    computed = []
+    
+    async def compute():
+        computed.append(1)
+        return [movie.id]
+    
+    await movie_cache.recommendations(user.id, {"k": 20}, compute)
+    await movie_cache.recommendations(user.id, {"k": 20}, compute)
+    assert len(computed) == 1
+    
+    await importer.add_rating(movie, 4.5, liked=True)
+    await importer.flush_ratings()
+    
+    await movie_cache.recommendations(user.id, {"k": 20}, compute)
+    assert len(computed) == 2
+
+
+class LocalRedis:
+    """In-process stand-in for the subset of redis.asyncio.Redis that RedisBackend uses"""
+    
+    def __init__(self):
+        self.values = {}
+    
+    def _get(self, key):
+        value, expires_at = self.values.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.values[key]
+            return None
+        return value
+    
+    async def mget(self, keys):
+        return [self._get(key) for key in keys]
+    
+    async def set(self, key, value, px=None, nx=False):
+        if nx and self._get(key) is not None:
+            return None
+        self.values[key] = (value, time.monotonic() + px / 1000 if px else None)
+        return True
+    
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+    
+    async def incr(self, key):
+        value = int(self._get(key) or 0) + 1
+        self.values[key] = (str(value).encode(), None)
+        return value
+    
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+    
+    async def aclose(self):
+        pass
+
+
+class _Pipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+    
+    def set(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+    
+    async def execute(self):
+        return [await self.client.set(*args, **kwargs) for args, kwargs in self.commands]
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_with_local_stand_in():
+    client = LocalRedis()
+    cache = SharedCache(RedisBackend(client=client, prefix="test:"))
+    movie_cache = MovieCache(cache)
+    
+    calls = []
+    
+    async def load():
+        calls.append(1)
+        return {"title": "Amelie"}
+    
+    assert await movie_cache.detail(7, load) == {"title": "Amelie"}
+    assert await movie_cache.detail(7, load) == {"title": "Amelie"}
+    assert len(calls) == 1
+    assert "test:detail:7" in client.values
+    assert "test:lock:detail:7" not in client.values
+    
+    await movie_cache.invalidate_movies([7])
+    await movie_cache.detail(7, load)
+    assert len(calls) == 2
+    
+    await movie_cache.invalidate_user(3)
+    await movie_cache.invalidate_user(3)
+    assert await cache.backend.get_many(["recs_gen:3"]) == [b"2"]
+    
+    assert await cache.backend.add("lock:x", b"1", ttl=0.01)
+    assert not await cache.backend.add("lock:x", b"1", ttl=0.01)
+    time.sleep(0.02)
+    assert await cache.backend.add("lock:x", b"1", ttl=0.01)
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_lock_held_by_another_process_is_left_alone():
+    backend = MemoryBackend()
+    cache = SharedCache(backend)
+    cache.LOCK_TTL, cache.LOCK_POLL = 0.05, 0.01
+    
+    # Another process is computing the value and outlives our wait
+    assert await backend.add("lock:page", b"other", ttl=10)
+    
+    async def load():
+        return "ours"
+    
+    assert await cache.get_or_load("page", load) == "ours"
+    assert await backend.get_many(["lock:page", "page"]) == [b"other", b'"ours"']
+
+
+@pytest.mark.asyncio
+async def test_value_stored_before_the_lock_is_taken_is_not_recomputed():
+    class RacingBackend(MemoryBackend):
+        async def add(self, key, value, ttl=None):
+            # Another process stores the value between our miss and our lock
+            await self.set_many({"page": b'"theirs"'})
+            return await super().add(key, value, ttl)
+    
+    backend = RacingBackend()
+    cache = SharedCache(backend)
+    calls = []
+    
+    async def load():
+        calls.append(1)
+        return "ours"
+    
+    assert await cache.get_or_load("page", load) == "theirs"
+    assert calls == []
+    assert await backend.get_many(["lock:page"]) == [None]
+
+
+@pytest.mark.asyncio
+async def test_waiter_takes_over_a_released_lock():
+    backend = MemoryBackend()
+    cache = SharedCache(backend)
+    cache.LOCK_POLL = 0.01
+    assert await backend.add("lock:page", b"other", ttl=10)
+    
+    async def release():
+        # The holder failed: its lock goes away without a value
+        await asyncio.sleep(0.03)
+        await backend.delete(["lock:page"])
+    
+    async def load():
+        return "ours"
+    
+    releasing = asyncio.create_task(release())
+    started = time.monotonic()
+    assert await cache.get_or_load("page", load) == "ours"
+    assert time.monotonic() - started < cache.LOCK_TTL / 2
+    await releasing
+    assert await backend.get_many(["lock:page", "page"]) == [None, b'"ours"']
@@ -0,0 +1,40 @@
+import httpx
+import pytest
+
+import tmdb_service
+from rate_limiter import TokenBucket
+from tmdb_service import TMDbService
+
+
+class RecordingBucket(TokenBucket):
+    def __init__(self):
+        super().__init__(rate=1000, capacity=1000)
+        self.pauses = []
+    
+    def pause(self, seconds: float) -> None:
+        self.pauses.append(seconds)
+
+
+@pytest.mark.asyncio
+async def test_throttled_worker_waits_as_long_as_the_shared_pause(monkeypatch):
+    sleeps = []
+    
+    async def sleep(seconds):
+        sleeps.append(seconds)
+    
+    monkeypatch.setattr(tmdb_service.asyncio, "sleep", sleep)
+    responses = iter([httpx.Response(429), httpx.Response(429), httpx.Response(200, json={"id": 1})])
+    bucket = RecordingBucket()
+    service = TMDbService(
+        api_key="test",
+        transport=httpx.MockTransport(lambda request: next(responses)),
+        cache=None,
+        rate_limiter=bucket,
+    )
+    try:
+        assert await service.get_movie_details(1) == {"id": 1}
+    finally:
+        await service.close()
+    
+    assert len(sleeps) == 2
+    assert bucket.pauses == sleeps
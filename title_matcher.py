@@ -0,0 +1,360 @@
+import asyncio
+import sys
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import delete, insert, or_, select, update
+
+from config import get_settings
+from database import db_manager
+from models import LetterboxdFilm, LetterboxdMatchReview, Movie
+from movie_search import MIN_SIMILARITY, normalize, trigrams
+
+settings = get_settings()
+
+# Trigrams are hashed into a fixed column space, so no vocabulary is kept
+N_FEATURES = 1 << 20
+
+# Year agreement by |candidate year - entry year| (0, 1, 2; further is 0).
+# A year unknown on either side scores UNKNOWN_YEAR.
+YEAR_SCORES = np.array([1.0, 0.6, 0.2], dtype=np.float32)
+UNKNOWN_YEAR = 0.5
+
+
+@dataclass
+class MatchWeights:
+    """Relative weight of each signal in a candidate's score (sums to 1)"""
+    title: float = 0.65
+    year: float = 0.25
+    popularity: float = 0.10
+
+
+@dataclass
+class Match:
+    """Best candidate of a title / year query"""
+    index: int  # position in the scored candidates (row of a CandidateIndex)
+    tmdb_id: int
+    title: str
+    year: Optional[int]
+    score: float  # weighted score, 0-1
+    confidence: float  # score discounted by the runner-up's closeness, 0-1
+    method: str  # 'exact_year', 'near_year', 'other_year' or 'no_year'
+    runners_up: List[Dict] = field(default_factory=list)  # next best {tmdb_id, title, year, score}
+    
+    def ranked(self) -> List[Dict]:
+        """The best candidate and the runners-up, as stored with a review"""
+        best = {"tmdb_id": self.tmdb_id, "title": self.title, "year": self.year, "score": round(self.score, 3)}
+        return [best] + self.runners_up
+
+
+def trigram_matrix(titles: Sequence[Optional[str]]) -> sparse.csr_matrix:
+    """Binary (titles x N_FEATURES) matrix of the hashed trigrams of normalized titles"""
+    indptr = [0]
+    indices: List[int] = []
+    for title in titles:
+        columns = {zlib.crc32(gram.encode()) & (N_FEATURES - 1) for gram in trigrams(normalize(title))}
+        indices.extend(sorted(columns))
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    return sparse.csr_matrix(
+        (data, np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(titles), N_FEATURES),
+    )
+
+
+def jaccard(queries: sparse.csr_matrix, candidates: sparse.csr_matrix) -> sparse.csr_matrix:
+    """Trigram similarity of every query / candidate pair sharing a trigram (sparse)"""
+    shared = (queries @ candidates.T).tocsr()
+    query_sizes = np.asarray(queries.sum(axis=1)).ravel()
+    candidate_sizes = np.asarray(candidates.sum(axis=1)).ravel()
+    rows = np.repeat(np.arange(shared.shape[0]), np.diff(shared.indptr))
+    shared.data = shared.data / (query_sizes[rows] + candidate_sizes[shared.indices] - shared.data)
+    return shared
+
+
+def _year(candidate: Dict) -> int:
+    """Release year of a TMDb result, 0 when unknown"""
+    try:
+        return int((candidate.get('release_date') or '')[:4])
+    except ValueError:
+        return 0
+
+
+def _popularity_scores(popularity: np.ndarray) -> np.ndarray:
+    """log-scaled popularity in [0, 1]"""
+    scaled = np.log1p(np.maximum(popularity, 0.0))
+    top = scaled.max() if len(scaled) else 0.0
+    return (scaled / top).astype(np.float32) if top > 0 else np.zeros(len(scaled), dtype=np.float32)
+
+
+class TitleMatcher:
+    """
+    Scores title / year candidates on normalized-title similarity (the
+    closer of title and original title), year distance and popularity.
+    
+    Candidates are scored as arrays. The confidence of the best one is its
+    score, discounted when the runner-up is close: a lead of CLEAR_MARGIN
+    or more keeps the full score, a tie halves it. Matches below
+    `review_threshold` should be reviewed rather than used.
+    """
+    
+    CLEAR_MARGIN = 0.15
+    
+    def __init__(self, weights: Optional[MatchWeights] = None, review_threshold: Optional[float] = None):
+        self.weights = weights or MatchWeights()
+        self.review_threshold = settings.MATCH_REVIEW_THRESHOLD if review_threshold is None else review_threshold
+    
+    def needs_review(self, match: Match) -> bool:
+        return match.confidence < self.review_threshold
+    
+    def combine(
+        self,
+        title_similarity: np.ndarray,
+        candidate_years: np.ndarray,
+        query_years: np.ndarray,
+        popularity: np.ndarray,
+    ) -> np.ndarray:
+        """Weighted score of candidates (years are 0 when unknown)"""
+        distance = np.abs(candidate_years - query_years)
+        known = (candidate_years > 0) & (query_years > 0)
+        year_score = np.where(
+            distance < len(YEAR_SCORES), YEAR_SCORES[np.minimum(distance, len(YEAR_SCORES) - 1)], 0.0
+        )
+        year_score = np.where(known, year_score, UNKNOWN_YEAR)
+        return (
+            self.weights.title * title_similarity
+            + self.weights.year * year_score
+            + self.weights.popularity * popularity
+        ).astype(np.float32)
+    
+    def confidence(self, best: float, runner_up: float) -> float:
+        lead = min(max(best - runner_up, 0.0) / self.CLEAR_MARGIN, 1.0)
+        return best * (0.5 + 0.5 * lead)
+    
+    @staticmethod
+    def method(query_year: Optional[int], candidate_year: int) -> str:
+        if not query_year or not candidate_year:
+            return "no_year"
+        distance = abs(candidate_year - query_year)
+        return "exact_year" if distance == 0 else "near_year" if distance == 1 else "other_year"
+    
+    def best(self, title: str, year: Optional[int], candidates: List[Dict]) -> Optional[Match]:
+        """Best of TMDb search results (dicts with id, title, original_title, release_date, popularity)"""
+        if not candidates:
+            return None
+        query = trigram_matrix([title])
+        similarity = jaccard(query, trigram_matrix([c.get('title') for c in candidates])).toarray()[0]
+        original = jaccard(query, trigram_matrix([c.get('original_title') or c.get('title') for c in candidates])).toarray()[0]
+        years = np.array([_year(c) for c in candidates], dtype=np.int32)
+        popularity = _popularity_scores(np.array([c.get('popularity') or 0.0 for c in candidates], dtype=np.float32))
+        scores = self.combine(np.maximum(similarity, original), years, np.int32(year or 0), popularity)
+        
+        order = np.argsort(-scores, kind="stable")
+        best = int(order[0])
+        runner_up = float(scores[order[1]]) if len(order) > 1 else 0.0
+        return Match(
+            index=best,
+            tmdb_id=candidates[best]['id'],
+            title=candidates[best].get('title', ''),
+            year=int(years[best]) or None,
+            score=float(scores[best]),
+            confidence=self.confidence(float(scores[best]), runner_up),
+            method=self.method(year, int(years[best])),
+            runners_up=[
+                {"tmdb_id": candidates[i]['id'], "title": candidates[i].get('title', ''),
+                 "year": int(years[i]) or None, "score": round(float(scores[i]), 3)}
+                for i in order[1:5]
+            ],
+        )
+
+
+class CandidateIndex:
+    """
+    Trigram matrices of the warehouse's movies, for matching a batch of
+    Letterboxd entries in one vectorized pass.
+    
+    Trigrams found in more than `max_df` of the titles ("the", " th", ...)
+    are dropped from both sides: they say little about a match and would
+    make every query share a trigram with most of the catalog.
+    """
+    
+    def __init__(
+        self,
+        movie_ids: np.ndarray,
+        tmdb_ids: np.ndarray,
+        titles: List[str],
+        original_titles: List[str],
+        years: np.ndarray,
+        popularity: np.ndarray,
+        max_df: float = 0.02,
+    ):
+        self.movie_ids = movie_ids
+        self.tmdb_ids = tmdb_ids
+        self.titles = titles
+        self.years = years
+        self.popularity = _popularity_scores(popularity)
+        
+        title_matrix = trigram_matrix(titles)
+        original_matrix = trigram_matrix(original_titles)
+        document_frequency = np.bincount(
+            np.concatenate([title_matrix.indices, original_matrix.indices]), minlength=N_FEATURES
+        )
+        self.keep = sparse.diags((document_frequency <= max(max_df * len(titles), 1)).astype(np.float32))
+        self.title_matrix = (title_matrix @ self.keep).tocsr()
+        self.original_matrix = (original_matrix @ self.keep).tocsr()
+        self.title_matrix.eliminate_zeros()
+        self.original_matrix.eliminate_zeros()
+    
+    def __len__(self) -> int:
+        return len(self.movie_ids)
+    
+    @classmethod
+    async def load(cls, **kwargs) -> "CandidateIndex":
+        """Index every movie in the warehouse"""
+        async with db_manager.get_session() as session:
+            result = await session.stream(
+                select(
+                    Movie.id, Movie.tmdb_id, Movie.title, Movie.original_title,
+                    Movie.release_date, Movie.popularity,
+                ).execution_options(yield_per=10_000)
+            )
+            rows = [row async for row in result]
+        columns = list(zip(*rows)) if rows else [()] * 6
+        return cls(
+            movie_ids=np.asarray(columns[0], dtype=np.int64),
+            tmdb_ids=np.asarray(columns[1], dtype=np.int64),
+            titles=list(columns[2]),
+            original_titles=[original or title for title, original in zip(columns[2], columns[3])],
+            years=np.asarray([value.year if value else 0 for value in columns[4]], dtype=np.int32),
+            popularity=np.asarray([value or 0.0 for value in columns[5]], dtype=np.float32),
+            **kwargs,
+        )
+    
+    def match(
+        self,
+        queries: Sequence[Tuple[str, Optional[int]]],
+        matcher: TitleMatcher,
+        chunk_size: int = 512,
+    ) -> List[Optional[Match]]:
+        """Best movie of each (title, year) query, None when no title is similar enough"""
+        matches: List[Optional[Match]] = []
+        for start in range(0, len(queries), chunk_size):
+            matches.extend(self._match_chunk(queries[start:start + chunk_size], matcher))
+        return matches
+    
+    def _match_chunk(self, queries: Sequence[Tuple[str, Optional[int]]], matcher: TitleMatcher) -> List[Optional[Match]]:
+        query_matrix = (trigram_matrix([title for title, _ in queries]) @ self.keep).tocsr()
+        query_matrix.eliminate_zeros()
+        similarity = jaccard(query_matrix, self.title_matrix).maximum(jaccard(query_matrix, self.original_matrix)).tocsr()
+        similarity.data[similarity.data < MIN_SIMILARITY] = 0
+        similarity.eliminate_zeros()
+        
+        rows = np.repeat(np.arange(len(queries)), np.diff(similarity.indptr))
+        columns = similarity.indices
+        query_years = np.array([year or 0 for _, year in queries], dtype=np.int32)
+        scores = matcher.combine(similarity.data, self.years[columns], query_years[rows], self.popularity[columns])
+        
+        # Candidates of each query, best first: the first two of a row are the best and the runner-up
+        order = np.lexsort((-scores, rows))
+        rows, columns, scores = rows[order], columns[order], scores[order]
+        starts = np.searchsorted(rows, np.arange(len(queries)))
+        ends = np.searchsorted(rows, np.arange(len(queries)), side="right")
+        
+        matches: List[Optional[Match]] = []
+        for query, (start, end) in enumerate(zip(starts, ends)):
+            if start == end:
+                matches.append(None)
+                continue
+            best = int(columns[start])
+            runner_up = float(scores[start + 1]) if end - start > 1 else 0.0
+            matches.append(Match(
+                index=best,
+                tmdb_id=int(self.tmdb_ids[best]),
+                title=self.titles[best],
+                year=int(self.years[best]) or None,
+                score=float(scores[start]),
+                confidence=matcher.confidence(float(scores[start]), runner_up),
+                method=matcher.method(queries[query][1], int(self.years[best])),
+                runners_up=[
+                    {"tmdb_id": int(self.tmdb_ids[c]), "title": self.titles[c],
+                     "year": int(self.years[c]) or None, "score": round(float(s), 3)}
+                    for c, s in zip(columns[start + 1:min(end, start + 5)], scores[start + 1:min(end, start + 5)])
+                ],
+            ))
+        return matches
+
+
+async def pending_reviews() -> List[LetterboxdMatchReview]:
+    """Low-confidence matches waiting for a decision, least confident first"""
+    async with db_manager.get_session() as session:
+        result = await session.execute(select(LetterboxdMatchReview).order_by(LetterboxdMatchReview.confidence))
+        return list(result.scalars())
+
+
+async def accept_review(key: str, tmdb_id: int) -> bool:
+    """
+    Resolve a review (by Letterboxd id, film slug or Letterboxd URI) to
+    `tmdb_id`: the film is mapped with confidence 1.0, replacing any
+    mapping it already has, and the next import of it uses the mapping.
+    """
+    keys = ("letterboxd_id", "film_slug", "letterboxd_url")
+    async with db_manager.get_session() as session:
+        review = (await session.execute(
+            select(LetterboxdMatchReview).where(
+                or_(*(getattr(LetterboxdMatchReview, column) == key for column in keys))
+            )
+        )).scalar_one_or_none()
+        if review is None:
+            return False
+        
+        values = {column: getattr(review, column) for column in keys}
+        decision = {"tmdb_id": tmdb_id, "confidence": 1.0, "match_method": "manual"}
+        updated = await session.execute(
+            update(LetterboxdFilm)
+            .where(or_(*(getattr(LetterboxdFilm, column) == value for column, value in values.items() if value)))
+            .values(**decision)
+        )
+        if not updated.rowcount:
+            await session.execute(insert(LetterboxdFilm), [{**values, **decision}])
+        await session.execute(delete(LetterboxdMatchReview).where(LetterboxdMatchReview.id == review.id))
+    return True
+
+
+async def main():
+    """Main function"""
+    args = sys.argv[1:]
+    if not args or args[0] not in ("reviews", "accept"):
+        print("استفاده:")
+        print("  python3 title_matcher.py reviews                              # تطابق‌های در انتظار بازبینی")
+        print("  python3 title_matcher.py accept <letterboxd_id|slug|url> <tmdb_id>")
+        print("\nبعد از تأیید، import را با --retry-failed دوباره اجرا کنید")
+        return
+    
+    try:
+        if args[0] == "reviews":
+            reviews = await pending_reviews()
+            if not reviews:
+                print("✅ تطابقی برای بازبینی وجود ندارد")
+            for review in reviews:
+                key = review.letterboxd_id or review.film_slug or review.letterboxd_url
+                print(f"\n🔍 {review.title} ({review.year or 'N/A'})  [{key}]")
+                for candidate in review.candidates:
+                    print(
+                        f"    {candidate['score']:.2f}  {candidate['title']} ({candidate['year'] or 'N/A'})"
+                        f"  tmdb={candidate['tmdb_id']}"
+                    )
+                print(f"    اطمینان: {review.confidence:.2f}")
+        else:
+            if await accept_review(args[1], int(args[2])):
+                print(f"✅ {args[1]} → TMDb {args[2]}")
+            else:
+                print(f"❌ بازبینی پیدا نشد: {args[1]}")
+    finally:
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
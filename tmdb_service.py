@@ -1,52 +1,162 @@
 import asyncio
+import random
 import httpx
-from typing import Optional, Dict, Any, List
-from datetime import datetime
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+from datetime import date, datetime, timezone
+from email.utils import parsedate_to_datetime
 
 from config import get_settings
 from database import db_manager
-from models import (
-    Movie, Genre, Keyword, Person, ProductionCompany,
-    ProductionCountry, SpokenLanguage, Provider, Video,
-    MovieReleaseDate, Collection
-)
+from rate_limiter import TokenBucket
+from response_cache import ResponseCache
+from models import Movie, movie_loader
+from movie_writer import MovieWriter, MovieSaveResult
 
 settings = get_settings()
 
 
+class TMDbRequestError(Exception):
+    """خطای درخواست TMDb پس از اتمام همه تلاش‌ها"""
+
+
 class TMDbService:
     """سرویس مدیریت API های TMDb"""
     
     BASE_URL = "https://api.themoviedb.org/3"
     
-    def __init__(self, api_key: str = None):
+    # کدهایی که نشان‌دهنده خطای موقت هستند و ارزش تلاش مجدد دارند
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+    
+    def __init__(
+        self,
+        api_key: str = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        cache: Optional[ResponseCache] = None,
+        offline: Optional[bool] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
         self.api_key = api_key or settings.TMDB_API_KEY
-        if not self.api_key:
+        self.offline = settings.TMDB_OFFLINE if offline is None else offline
+        if not self.api_key and not self.offline:
             raise ValueError("❌ TMDB_API_KEY تنظیم نشده است!")
         
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # کش پاسخ‌ها روی دیسک (TMDB_CACHE_DIR خالی = غیرفعال)
+        if cache is None and settings.TMDB_CACHE_DIR:
+            cache = ResponseCache(
+                settings.TMDB_CACHE_DIR,
+                max_bytes=settings.TMDB_CACHE_MAX_MB * 1024 * 1024,
+            )
+        self.cache = cache
+        
+        # transport قابل جایگزینی است (مثلاً httpx.MockTransport برای اجرای آفلاین)
+        self.client = httpx.AsyncClient(timeout=30.0, transport=transport)
+        
+        # توابعی که پس از ذخیره فیلم‌های جدید با شناسه‌های آن‌ها صدا زده می‌شوند
+        self.save_listeners: List[Callable[[List[int]], Awaitable[None]]] = []
+        
+        # توابعی که پس از تغییر فیلم‌های موجود (update_movies) صدا زده می‌شوند
+        self.update_listeners: List[Callable[[List[int]], Awaitable[None]]] = []
+        
+        # همه درخواست‌ها از یک محدودکننده مشترک عبور می‌کنند
+        self.rate_limiter = rate_limiter or TokenBucket(
+            rate=settings.TMDB_RATE_LIMIT,
+            capacity=settings.TMDB_RATE_BURST,
+        )
+        self.max_retries = settings.TMDB_MAX_RETRIES
+        self.backoff_base = settings.TMDB_BACKOFF_BASE
+        self.backoff_max = settings.TMDB_BACKOFF_MAX
     
     async def close(self):
         """بستن کلاینت HTTP"""
         await self.client.aclose()
     
-    async def _request(self, endpoint: str, params: Dict = None) -> Dict:
-        """درخواست به API"""
-        if params is None:
-            params = {}
-        params['api_key'] = self.api_key
+    def _retry_after(self, response: httpx.Response) -> Optional[float]:
+        """خواندن هدر Retry-After (ثانیه یا تاریخ HTTP)"""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
         
-        url = f"{self.BASE_URL}/{endpoint}"
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
         
         try:
-            response = await self.client.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPError as e:
-            print(f"❌ خطا در درخواست: {e}")
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    
+    def _backoff(self, attempt: int) -> float:
+        """تاخیر نمایی با jitter کامل"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    async def _request(self, endpoint: str, params: Dict = None, fresh: bool = False, store: bool = True) -> Dict:
+        """
+        درخواست به API (ابتدا از کش، در حالت آفلاین فقط از کش)
+        fresh=True کش را نمی‌خواند ولی پاسخ تازه را در آن می‌نویسد
+        store=False پاسخ تازه را در کش نمی‌نویسد (پاسخ‌هایی که فقط یک بار خوانده می‌شوند)
+        """
+        params = dict(params or {})
+        
+        if self.cache and (not fresh or self.offline):
+            cached = await asyncio.to_thread(self.cache.get, endpoint, params, self.offline)
+            if cached is not None:
+                return cached
+        
+        if self.offline:
+            print(f"📴 حالت آفلاین: پاسخ {endpoint} در کش نیست")
             return {}
+        
+        data = await self._fetch(endpoint, params)
+        if data and self.cache and store:
+            await asyncio.to_thread(self.cache.set, endpoint, params, data)
+        return data
+    
+    async def _fetch(self, endpoint: str, params: Dict) -> Dict:
+        """درخواست به API (با محدودیت نرخ و تلاش مجدد برای 429/5xx)"""
+        params = dict(params)
+        params['api_key'] = self.api_key
+        
+        url = f"{self.BASE_URL}/{endpoint}"
+        error: Optional[Exception] = None
+        
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            
+            try:
+                response = await self.client.get(url, params=params)
+            except httpx.TransportError as e:
+                error = e
+                delay = self._backoff(attempt)
+            else:
+                if response.status_code not in self.RETRY_STATUS_CODES:
+                    try:
+                        response.raise_for_status()
+                        return response.json()
+                    except httpx.HTTPError as e:
+                        print(f"❌ خطا در درخواست: {e}")
+                        return {}
+                
+                error = httpx.HTTPStatusError(
+                    f"{response.status_code} for {endpoint}",
+                    request=response.request,
+                    response=response,
+                )
+                # یک تاخیر (با یک jitter) هم برای توقف مشترک و هم برای همین کارگر
+                retry_after = self._retry_after(response)
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                if response.status_code == 429:
+                    # همه کارگرها با هم عقب می‌کشند
+                    self.rate_limiter.pause(delay)
+            
+            if attempt == self.max_retries:
+                break
+            
+            print(f"⏳ تلاش مجدد {endpoint} پس از {delay:.1f} ثانیه ({error})")
+            await asyncio.sleep(delay)
+        
+        raise TMDbRequestError(f"{endpoint} failed after {self.max_retries + 1} attempts: {error}")
     
     async def search_movie(self, query: str, language: str = "en-US") -> List[Dict]:
         """جستجوی فیلم"""
@@ -57,259 +167,94 @@ class TMDbService:
         })
         return data.get('results', [])
     
-    async def get_movie_details(self, movie_id: int, language: str = "en-US") -> Dict:
-        """دریافت جزئیات کامل فیلم"""
+    async def get_movie_details(
+        self,
+        movie_id: int,
+        language: str = "en-US",
+        fresh: bool = False,
+        store: bool = True,
+    ) -> Dict:
+        """دریافت جزئیات کامل فیلم (fresh=True بدون خواندن از کش، store=False بدون نوشتن در کش)"""
         print(f"📥 دریافت اطلاعات فیلم ID: {movie_id}")
         return await self._request(
             f"movie/{movie_id}",
             {
                 "language": language,
                 "append_to_response": "credits,keywords,videos,release_dates,watch/providers"
-            }
+            },
+            fresh=fresh,
+            store=store,
         )
     
-    async def get_or_create_genre(self, session, genre_data: Dict) -> Genre:
-        """دریافت یا ساخت ژانر"""
-        result = await session.execute(
-            select(Genre).where(Genre.tmdb_id == genre_data['id'])
-        )
-        genre = result.scalar_one_or_none()
-        
-        if not genre:
-            genre = Genre(
-                tmdb_id=genre_data['id'],
-                name=genre_data['name']
-            )
-            session.add(genre)
-            await session.flush()
-        
-        return genre
+    async def get_movie_changes(self, start_date: date, end_date: date, page: int = 1) -> Dict:
+        """شناسه فیلم‌های تغییر کرده در یک بازه (حداکثر ۱۴ روز)"""
+        return await self._request("movie/changes", {
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "page": page,
+        })
     
-    async def get_or_create_keyword(self, session, keyword_data: Dict) -> Keyword:
-        """دریافت یا ساخت کلیدواژه"""
-        result = await session.execute(
-            select(Keyword).where(Keyword.tmdb_id == keyword_data['id'])
-        )
-        keyword = result.scalar_one_or_none()
-        
-        if not keyword:
-            keyword = Keyword(
-                tmdb_id=keyword_data['id'],
-                name=keyword_data['name']
-            )
-            session.add(keyword)
-            await session.flush()
-        
-        return keyword
+    async def _notify_saved(self, results: List[MovieSaveResult]):
+        """اطلاع‌رسانی فیلم‌های تازه ذخیره شده به listener ها"""
+        movie_ids = list({result.movie_id for result in results if result.created})
+        await self._notify(self.save_listeners, movie_ids)
     
-    async def get_or_create_person(self, session, person_data: Dict) -> Person:
-        """دریافت یا ساخت شخص (بازیگر/کارگردان)"""
-        result = await session.execute(
-            select(Person).where(Person.tmdb_id == person_data['id'])
-        )
-        person = result.scalar_one_or_none()
-        
-        if not person:
-            person = Person(
-                tmdb_id=person_data['id'],
-                name=person_data['name'],
-                profile_path=person_data.get('profile_path'),
-                gender=person_data.get('gender')
-            )
-            session.add(person)
-            await session.flush()
-        
-        return person
-    
-    async def get_or_create_company(self, session, company_data: Dict) -> ProductionCompany:
-        """دریافت یا ساخت شرکت تولیدی"""
-        result = await session.execute(
-            select(ProductionCompany).where(ProductionCompany.tmdb_id == company_data['id'])
-        )
-        company = result.scalar_one_or_none()
-        
-        if not company:
-            company = ProductionCompany(
-                tmdb_id=company_data['id'],
-                name=company_data['name'],
-                logo_path=company_data.get('logo_path'),
-                origin_country=company_data.get('origin_country')
-            )
-            session.add(company)
-            await session.flush()
-        
-        return company
+    async def _notify_updated(self, results: List[MovieSaveResult]):
+        """اطلاع‌رسانی فیلم‌های موجودی که تغییر کرده‌اند به listener ها"""
+        movie_ids = list({result.movie_id for result in results if result.changed and not result.created})
+        await self._notify(self.update_listeners, movie_ids)
     
-    async def get_or_create_country(self, session, country_data: Dict) -> ProductionCountry:
-        """دریافت یا ساخت کشور"""
-        # FIXED: Changed iso_3166_1 to iso_code
-        result = await session.execute(
-            select(ProductionCountry).where(ProductionCountry.iso_code == country_data['iso_3166_1'])
-        )
-        country = result.scalar_one_or_none()
-        
-        if not country:
-            country = ProductionCountry(
-                iso_code=country_data['iso_3166_1'],
-                name=country_data['name']
-            )
-            session.add(country)
-            await session.flush()
+    async def _notify(self, listeners: List[Callable[[List[int]], Awaitable[None]]], movie_ids: List[int]):
+        if not movie_ids:
+            return
         
-        return country
+        for listener in listeners:
+            try:
+                await listener(movie_ids)
+            except Exception as e:
+                print(f"⚠️  خطا در listener ذخیره: {e}")
     
-    async def get_or_create_language(self, session, language_data: Dict) -> SpokenLanguage:
-        """دریافت یا ساخت زبان"""
-        # FIXED: Changed iso_639_1 to iso_code
-        result = await session.execute(
-            select(SpokenLanguage).where(SpokenLanguage.iso_code == language_data['iso_639_1'])
-        )
-        language = result.scalar_one_or_none()
-        
-        if not language:
-            language = SpokenLanguage(
-                iso_code=language_data['iso_639_1'],
-                name=language_data['name'],
-                english_name=language_data.get('english_name')
-            )
-            session.add(language)
-            await session.flush()
+    async def save_movies(self, movies_data: List[Dict]) -> List[MovieSaveResult]:
+        """ذخیره دسته‌ای فیلم‌ها در یک تراکنش (نتیجه جداگانه برای هر فیلم)"""
+        async with db_manager.get_session() as session:
+            results = await MovieWriter(session).save_movies(movies_data)
+        await self._notify_saved(results)
         
-        return language
+        unique = {id(result): result for result in results}.values()
+        saved = sum(1 for result in unique if result.created)
+        failed = sum(1 for result in unique if result.error)
+        print(f"💾 {saved} فیلم جدید ذخیره شد، {failed} خطا، {len(unique) - saved - failed} تکراری")
+        return results
     
-    async def get_or_create_collection(self, session, collection_data: Dict) -> Collection:
-        """دریافت یا ساخت مجموعه"""
-        result = await session.execute(
-            select(Collection).where(Collection.tmdb_id == collection_data['id'])
-        )
-        collection = result.scalar_one_or_none()
-        
-        if not collection:
-            collection = Collection(
-                tmdb_id=collection_data['id'],
-                name=collection_data['name'],
-                poster_path=collection_data.get('poster_path'),
-                backdrop_path=collection_data.get('backdrop_path'),
-                overview=collection_data.get('overview')
-            )
-            session.add(collection)
-            await session.flush()
-        
-        return collection
+    async def update_movies(self, movies_data: List[Dict]) -> List[MovieSaveResult]:
+        """اعمال تغییرات جزئیات تازه روی فیلم‌های موجود (فقط ستون‌ها و ردیف‌های تغییر کرده)"""
+        async with db_manager.get_session() as session:
+            results = await MovieWriter(session).update_movies(movies_data)
+        await self._notify_saved(results)
+        await self._notify_updated(results)
+        return results
     
     async def save_movie(self, movie_data: Dict) -> Optional[Movie]:
         """ذخیره کامل اطلاعات فیلم"""
         
         async with db_manager.get_session() as session:
             try:
-                # چک کردن اینکه فیلم قبلاً وجود داره یا نه
-                result = await session.execute(
-                    select(Movie).where(Movie.tmdb_id == movie_data['id'])
-                )
-                existing_movie = result.scalar_one_or_none()
-                
-                if existing_movie:
-                    print(f"⚠️  فیلم '{movie_data['title']}' قبلاً در دیتابیس وجود دارد")
-                    return existing_movie
-                
-                print(f"💾 در حال ذخیره فیلم: {movie_data['title']}")
-                
-                # ساخت فیلم
-                movie = Movie(
-                    tmdb_id=movie_data['id'],
-                    imdb_id=movie_data.get('imdb_id'),
-                    title=movie_data['title'],
-                    original_title=movie_data.get('original_title'),
-                    original_language=movie_data.get('original_language'),
-                    overview=movie_data.get('overview'),
-                    tagline=movie_data.get('tagline'),
-                    status=movie_data.get('status'),
-                    release_date=datetime.strptime(movie_data['release_date'], '%Y-%m-%d').date() 
-                        if movie_data.get('release_date') else None,
-                    runtime=movie_data.get('runtime'),
-                    budget=movie_data.get('budget', 0),
-                    revenue=movie_data.get('revenue', 0),
-                    popularity=movie_data.get('popularity', 0.0),
-                    vote_average=movie_data.get('vote_average', 0.0),
-                    vote_count=movie_data.get('vote_count', 0),
-                    poster_path=movie_data.get('poster_path'),
-                    backdrop_path=movie_data.get('backdrop_path'),
-                    homepage=movie_data.get('homepage'),
-                    adult=movie_data.get('adult', False)
-                )
-                
-                # اضافه کردن Collection
-                if movie_data.get('belongs_to_collection'):
-                    collection = await self.get_or_create_collection(
-                        session, 
-                        movie_data['belongs_to_collection']
-                    )
-                    movie.collection_id = collection.id
-                
-                # اضافه کردن ژانرها
-                if movie_data.get('genres'):
-                    for genre_data in movie_data['genres']:
-                        genre = await self.get_or_create_genre(session, genre_data)
-                        movie.genres.append(genre)
-                
-                # اضافه کردن کلیدواژه‌ها
-                if movie_data.get('keywords', {}).get('keywords'):
-                    for keyword_data in movie_data['keywords']['keywords']:
-                        keyword = await self.get_or_create_keyword(session, keyword_data)
-                        movie.keywords.append(keyword)
+                [result] = await MovieWriter(session).save_movies([movie_data])
                 
-                # اضافه کردن شرکت‌های تولیدی
-                if movie_data.get('production_companies'):
-                    for company_data in movie_data['production_companies']:
-                        company = await self.get_or_create_company(session, company_data)
-                        movie.production_companies.append(company)
+                if result.error:
+                    print(f"❌ خطا در ذخیره فیلم '{result.title}': {result.error}")
+                    return None
                 
-                # اضافه کردن کشورها
-                if movie_data.get('production_countries'):
-                    for country_data in movie_data['production_countries']:
-                        country = await self.get_or_create_country(session, country_data)
-                        movie.production_countries.append(country)
-                
-                # اضافه کردن زبان‌ها
-                if movie_data.get('spoken_languages'):
-                    for language_data in movie_data['spoken_languages']:
-                        language = await self.get_or_create_language(session, language_data)
-                        movie.spoken_languages.append(language)
-                
-                # اضافه کردن بازیگران (Cast)
-                if movie_data.get('credits', {}).get('cast'):
-                    for i, cast_data in enumerate(movie_data['credits']['cast'][:20]):  # فقط 20 نفر اول
-                        person = await self.get_or_create_person(session, cast_data)
-                        movie.cast.append(person)
-                
-                # اضافه کردن عوامل (Crew)
-                if movie_data.get('credits', {}).get('crew'):
-                    for crew_data in movie_data['credits']['crew'][:20]:  # فقط 20 نفر اول
-                        person = await self.get_or_create_person(session, crew_data)
-                        movie.crew.append(person)
-                
-                # اضافه کردن ویدیوها (تریلرها)
-                if movie_data.get('videos', {}).get('results'):
-                    for video_data in movie_data['videos']['results']:
-                        video = Video(
-                            tmdb_video_id=video_data['id'],
-                            key=video_data['key'],
-                            site=video_data['site'],
-                            type=video_data['type'],
-                            name=video_data['name'],
-                            size=video_data.get('size'),
-                            official=video_data.get('official', False),
-                            movie=movie
-                        )
-                        session.add(video)
-                
-                session.add(movie)
                 await session.commit()
-                await session.refresh(movie)
+                movie = await session.get(Movie, result.movie_id, options=movie_loader("detail"))
                 
-                print(f"✅ فیلم '{movie.title}' با موفقیت ذخیره شد!")
+                if result.created:
+                    print(f"✅ فیلم '{movie.title}' با موفقیت ذخیره شد!")
+                    await self._notify_saved([result])
+                else:
+                    print(f"⚠️  فیلم '{movie.title}' قبلاً در دیتابیس وجود دارد")
                 return movie
-                
+            
             except Exception as e:
                 await session.rollback()
                 print(f"❌ خطا در ذخیره فیلم: {e}")
@@ -319,6 +264,13 @@ class TMDbService:
     
     async def search_and_save_movie(self, query: str) -> Optional[Movie]:
         """جستجو و ذخیره فیلم"""
+        try:
+            return await self._search_and_save_movie(query)
+        except TMDbRequestError as e:
+            print(f"❌ خطا در ارتباط با TMDb: {e}")
+            return None
+    
+    async def _search_and_save_movie(self, query: str) -> Optional[Movie]:
         # جستجوی فیلم
         results = await self.search_movie(query)
         